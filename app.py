@@ -3,7 +3,9 @@ Twitter 自动发推系统主入口
 基于 Flask 框架，提供 Web API 和定时任务功能
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import json
+import math
 import signal
 import sys
 import os
@@ -14,10 +16,18 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.config_loader import config_loader
 from utils.logger import logger
 from utils.proxy import proxy_manager
+from utils.transport import transport_manager
+from utils.circuit_breaker import circuit_breakers
 from auth.token_manager import token_manager
 from llm.llm_client import llm_client
+from llm.prompt_bandit import prompt_bandit
+from utils.twitter_text import weighted_length
 from twitter.api_client import twitter_client
+from twitter.media_uploader import MediaUploadError
+from twitter.tweet_store import tweet_store
+from twitter.metrics_store import metrics_store
 from scheduler.job_scheduler import job_scheduler
+from scheduler.oneoff_store import parse_due_time
 
 
 def create_app():
@@ -54,7 +64,8 @@ def status():
             'system': 'running',
             'proxy': {
                 'enabled': proxy_manager.is_proxy_enabled(),
-                'working': proxy_manager.test_proxy() if proxy_manager.is_proxy_enabled() else True
+                'working': proxy_manager.test_proxy() if proxy_manager.is_proxy_enabled() else True,
+                'pool': proxy_manager.get_status()
             },
             'twitter': {
                 'credentials_valid': token_manager.validate_credentials(),
@@ -63,7 +74,8 @@ def status():
             'openai': {
                 'api_key_valid': llm_client.validate_api_key()
             },
-            'scheduler': job_scheduler.get_job_status()
+            'scheduler': job_scheduler.get_job_status(),
+            'circuit_breakers': circuit_breakers.get_status()
         }
         
         return jsonify(status_info)
@@ -76,6 +88,33 @@ def status():
         }), 500
 
 
+@app.route('/metrics')
+def metrics():
+    """运行指标（执行器队列深度、利用率、任务执行统计）"""
+    try:
+        return jsonify({
+            'scheduler': {
+                'executors': job_scheduler.get_executor_metrics(),
+                'jobs': job_scheduler.watchdog.get_status()['stats']
+            },
+            'transport': transport_manager.get_status(),
+            'circuit_breakers': circuit_breakers.get_status(),
+            'llm': llm_client.get_stats(),
+            'media': twitter_client.media_uploader.get_status(),
+            'identity_cache': twitter_client.identity.get_status(),
+            'timeline': job_scheduler.timeline_sync.get_status() if job_scheduler.timeline_sync else None,
+            'tweet_metrics': job_scheduler.metrics_collector.get_status() if job_scheduler.metrics_collector else None,
+            'prompt_bandit': prompt_bandit.get_status()
+        })
+
+    except Exception as e:
+        logger.error(f"获取运行指标失败: {e}")
+        return jsonify({
+            'error': '获取运行指标失败',
+            'message': str(e)
+        }), 500
+
+
 @app.route('/tweet/post', methods=['POST'])
 def post_tweet():
     """手动发推接口"""
@@ -83,9 +122,35 @@ def post_tweet():
         # 获取请求数据
         data = request.get_json() or {}
         custom_content = data.get('content')
+        timeout_seconds = data.get('timeout')
+        if timeout_seconds is not None:
+            try:
+                if isinstance(timeout_seconds, bool):
+                    raise ValueError(timeout_seconds)
+                timeout_seconds = float(timeout_seconds)
+                if not math.isfinite(timeout_seconds) or timeout_seconds <= 0:
+                    raise ValueError(timeout_seconds)
+            except (TypeError, ValueError):
+                return jsonify({
+                    'success': False,
+                    'message': 'timeout 必须是大于 0 的秒数'
+                }), 400
+
+        # 附带的媒体文件（相对于 twitter.media.media_dir 的文件名）
+        media = data.get('media') or []
+        if isinstance(media, str):
+            media = [media]
+        try:
+            media_paths = [twitter_client.media_uploader.resolve_path(name) for name in media]
+        except MediaUploadError as e:
+            return jsonify({
+                'success': False,
+                'message': '媒体文件路径无效',
+                'error': str(e)
+            }), 400
         
-        # 执行发推
-        result = job_scheduler.manual_tweet(custom_content)
+        # 执行发推（整个请求在 timeout 秒内完成，未指定时使用配置的 manual_seconds）
+        result = job_scheduler.manual_tweet(custom_content, timeout_seconds, media_paths or None)
         
         if result.get('success'):
             return jsonify({
@@ -94,9 +159,19 @@ def post_tweet():
                 'data': {
                     'tweet_id': result.get('tweet_id'),
                     'tweet_url': result.get('tweet_url'),
-                    'content': result.get('content')
+                    'content': result.get('content'),
+                    'thread_id': result.get('thread_id'),
+                    'tweet_ids': result.get('tweet_ids'),
+                    'media_ids': result.get('media_ids')
                 }
             })
+        elif result.get('timed_out'):
+            return jsonify({
+                'success': False,
+                'message': '推文发送超时',
+                'error': result.get('error'),
+                'phase': result.get('phase')
+            }), 504
         else:
             return jsonify({
                 'success': False,
@@ -113,6 +188,161 @@ def post_tweet():
         }), 500
 
 
+@app.route('/tweet/schedule', methods=['POST'])
+def schedule_tweet():
+    """安排一次性定时推文接口"""
+    try:
+        data = request.get_json() or {}
+        content = data.get('content')
+        run_at = data.get('run_at')
+
+        if not content or not run_at:
+            return jsonify({
+                'success': False,
+                'message': '缺少 content 或 run_at 参数'
+            }), 400
+
+        result = job_scheduler.schedule_post(content, run_at, data.get('timezone'))
+
+        if result.get('success'):
+            return jsonify({
+                'success': True,
+                'message': '定时推文已安排',
+                'data': {
+                    'id': result.get('id'),
+                    'due_at': result.get('due_at')
+                }
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': '安排定时推文失败',
+                'error': result.get('error')
+            }), 400
+
+    except Exception as e:
+        logger.error(f"安排定时推文失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '安排定时推文时发生错误',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/tweet/scheduled')
+def scheduled_tweets():
+    """获取一次性定时推文列表"""
+    try:
+        status_filter = request.args.get('status', 'pending')
+        if status_filter == 'all':
+            status_filter = None
+        limit = request.args.get('limit', 100, type=int)
+
+        posts = job_scheduler.list_scheduled_posts(status_filter, limit)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'posts': posts,
+                'count': len(posts)
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"获取定时推文列表失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '获取定时推文列表时发生错误',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/tweet/scheduled/<int:post_id>', methods=['DELETE'])
+def cancel_scheduled_tweet(post_id):
+    """取消一次性定时推文"""
+    try:
+        if job_scheduler.cancel_scheduled_post(post_id):
+            return jsonify({
+                'success': True,
+                'message': '定时推文已取消'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': '定时推文不存在或已发送'
+            }), 404
+
+    except Exception as e:
+        logger.error(f"取消定时推文失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '取消定时推文时发生错误',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/tweet/threads')
+def tweet_threads():
+    """获取推文串列表"""
+    try:
+        status_filter = request.args.get('status')
+        if status_filter == 'all':
+            status_filter = None
+        limit = request.args.get('limit', 100, type=int)
+
+        threads = job_scheduler.list_threads(status_filter, limit)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'threads': threads,
+                'count': len(threads)
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"获取推文串列表失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '获取推文串列表时发生错误',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/tweet/threads/<int:thread_id>/resume', methods=['POST'])
+def resume_tweet_thread(thread_id):
+    """续发未发送完的推文串"""
+    try:
+        result = job_scheduler.resume_thread(thread_id)
+
+        if result.get('success'):
+            return jsonify({
+                'success': True,
+                'message': '推文串发送完成',
+                'data': {
+                    'thread_id': thread_id,
+                    'tweet_url': result.get('url'),
+                    'tweet_ids': result.get('tweet_ids')
+                }
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': '续发推文串失败',
+                'error': result.get('error'),
+                'posted': result.get('posted'),
+                'total': result.get('total')
+            }), 504 if result.get('timed_out') else 400
+
+    except Exception as e:
+        logger.error(f"续发推文串失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '续发推文串时发生错误',
+            'error': str(e)
+        }), 500
+
+
 @app.route('/tweet/generate', methods=['POST'])
 def generate_tweet():
     """生成推文内容接口"""
@@ -136,7 +366,7 @@ def generate_tweet():
                     'success': True,
                     'data': {
                         'content': tweet_content,
-                        'length': len(tweet_content)
+                        'length': weighted_length(tweet_content)
                     }
                 })
             else:
@@ -146,14 +376,17 @@ def generate_tweet():
                 }), 500
         else:
             tweets = llm_client.generate_multiple_tweets(count)
+            # 有排序模型时附带每条候选的分数
+            scores = job_scheduler.draft_ranker.score(tweets)
             return jsonify({
                 'success': True,
                 'data': {
                     'tweets': [
                         {
                             'content': tweet,
-                            'length': len(tweet)
-                        } for tweet in tweets
+                            'length': weighted_length(tweet),
+                            'score': round(float(scores[i]), 4) if scores is not None else None
+                        } for i, tweet in enumerate(tweets)
                     ],
                     'count': len(tweets)
                 }
@@ -168,11 +401,30 @@ def generate_tweet():
         }), 500
 
 
+@app.route('/tweet/generate/stream', methods=['GET', 'POST'])
+def generate_tweet_stream():
+    """流式生成推文接口（Server-Sent Events）"""
+    data = request.get_json(silent=True) or {}
+    custom_prompt = data.get('prompt') or request.args.get('prompt')
+
+    def events():
+        # 客户端断开时 Flask 关闭该生成器，stream_tweet 随之关闭上游连接
+        for event in llm_client.stream_tweet(custom_prompt):
+            payload = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['event']}\ndata: {payload}\n\n"
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 @app.route('/user/info')
 def user_info():
-    """获取用户信息"""
+    """获取用户信息（使用身份缓存，refresh=1 时重新获取）"""
     try:
-        user_data = twitter_client.get_user_info()
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        user_data = twitter_client.get_user_info(refresh=refresh)
         
         if user_data:
             return jsonify({
@@ -196,22 +448,51 @@ def user_info():
 
 @app.route('/tweets/recent')
 def recent_tweets():
-    """获取最近的推文"""
+    """
+    获取最近的推文（默认从本地推文存储查询，不消耗 API 配额）
+
+    查询参数: count、before_id（翻页）、since / until（时间）、q（内容包含的文本）、
+    kind（original / reply / quote / retweet，逗号分隔）、source=api（直接请求 API，最多 20 条）
+    """
     try:
         count = request.args.get('count', 5, type=int)
-        if count > 20:
-            count = 20
-        
-        tweets = twitter_client.get_recent_tweets(count)
-        
+        source = request.args.get('source', 'local')
+
+        # 本地存储为空（尚未同步）时退回到 API
+        if source != 'api' and tweet_store.count() > 0:
+            timezone_str = str(job_scheduler.timezone)
+            since = request.args.get('since')
+            until = request.args.get('until')
+            kinds = request.args.get('kind')
+            try:
+                tweets = tweet_store.query(
+                    limit=max(1, min(count, 1000)),
+                    before_id=request.args.get('before_id', type=int),
+                    since=parse_due_time(since, timezone_str) if since else None,
+                    until=parse_due_time(until, timezone_str) if until else None,
+                    contains=request.args.get('q'),
+                    kinds=kinds.split(',') if kinds else None
+                )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': '查询参数无效',
+                    'error': str(e)
+                }), 400
+            source = 'local'
+        else:
+            tweets = twitter_client.get_recent_tweets(min(count, 20))
+            source = 'api'
+
         return jsonify({
             'success': True,
             'data': {
                 'tweets': tweets,
-                'count': len(tweets)
+                'count': len(tweets),
+                'source': source
             }
         })
-        
+
     except Exception as e:
         logger.error(f"获取最近推文失败: {e}")
         return jsonify({
@@ -221,12 +502,107 @@ def recent_tweets():
         }), 500
 
 
+@app.route('/tweets/<int:tweet_id>/metrics')
+def tweet_metrics(tweet_id):
+    """获取推文发送后的指标变化（默认前 48 小时，每小时一个取样点）"""
+    try:
+        hours = request.args.get('hours', 48, type=int)
+        step = request.args.get('step', 60, type=int)
+        performance = metrics_store.performance(tweet_id, hours=max(1, min(hours, 24 * 90)), step_minutes=step)
+
+        if performance is None:
+            return jsonify({
+                'success': False,
+                'message': '没有该推文的指标数据'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': performance
+        })
+
+    except Exception as e:
+        logger.error(f"获取推文指标失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '获取推文指标时发生错误',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/schedule/recommendation')
+def schedule_recommendation():
+    """根据历史推文表现推荐发推时间（apply=1 时应用到定时任务）"""
+    try:
+        result = job_scheduler.optimize_schedule(
+            slots=request.args.get('slots', type=int),
+            apply=request.args.get('apply', '0') in ('1', 'true')
+        )
+
+        if result.get('success'):
+            return jsonify({
+                'success': True,
+                'data': result
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': result.get('message', '无法推荐发推时间')
+            }), 400
+
+    except Exception as e:
+        logger.error(f"推荐发推时间失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '推荐发推时间时发生错误',
+            'error': str(e)
+        }), 500
+
+
+@app.route('/tweets/sync', methods=['POST'])
+def sync_tweets():
+    """立即同步本地推文存储（backfill=true 时同时回填历史推文）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = job_scheduler.sync_timeline(
+            backfill=bool(data.get('backfill', False)),
+            max_pages=data.get('max_pages')
+        )
+
+        if result.get('success'):
+            return jsonify({
+                'success': True,
+                'message': '本地推文存储已同步',
+                'data': result
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': '同步本地推文存储失败',
+                'data': result
+            }), 500
+
+    except Exception as e:
+        logger.error(f"同步本地推文存储失败: {e}")
+        return jsonify({
+            'success': False,
+            'message': '同步本地推文存储时发生错误',
+            'error': str(e)
+        }), 500
+
+
 def signal_handler(signum, frame):
     """信号处理器，用于优雅关闭"""
     logger.info("接收到关闭信号，正在关闭系统...")
     
     # 停止调度器
     job_scheduler.stop()
+
+    # 停止代理健康检查
+    proxy_manager.stop_health_checks()
+
+    # 关闭共享连接池
+    transport_manager.close()
     
     logger.info("系统已关闭")
     sys.exit(0)
@@ -240,6 +616,7 @@ def initialize_system():
     if proxy_manager.is_proxy_enabled():
         if not proxy_manager.test_proxy():
             logger.warning("代理连接测试失败，但系统将继续运行")
+        proxy_manager.start_health_checks()
     
     # 验证 Twitter 凭据
     if not token_manager.validate_credentials():
@@ -42,6 +42,25 @@ class OAuth2Client:
         self.code_challenge = None
         self.state = None
     
+    def _post(self, url: str, data: Dict, headers: Dict, timeout: int = 30) -> requests.Response:
+        """
+        通过共享连接池发送 POST 请求
+
+        Args:
+            url: 请求 URL
+            data: 表单数据
+            headers: 请求头
+            timeout: 超时时间（秒）
+
+        Returns:
+            响应对象
+        """
+        from utils.transport import transport_manager
+
+        proxy_url = self.proxies.get('https') if self.proxies else None
+        session = transport_manager.get_session(proxy_url)
+        return session.post(url, data=data, headers=headers, timeout=timeout)
+
     def _generate_pkce_params(self) -> Tuple[str, str]:
         """
         生成 PKCE (Proof Key for Code Exchange) 参数
@@ -70,7 +89,7 @@ class OAuth2Client:
             授权 URL
         """
         if scopes is None:
-            scopes = ['tweet.read', 'tweet.write', 'users.read', 'offline.access']
+            scopes = ['tweet.read', 'tweet.write', 'users.read', 'offline.access', 'media.write']
         
         # 生成 PKCE 参数
         self.code_verifier, self.code_challenge = self._generate_pkce_params()
@@ -138,13 +157,7 @@ class OAuth2Client:
             logger.info("正在交换授权码获取访问令牌...")
             
             # 发送请求
-            response = requests.post(
-                self.TOKEN_URL,
-                data=data,
-                headers=headers,
-                proxies=self.proxies,
-                timeout=30
-            )
+            response = self._post(self.TOKEN_URL, data, headers)
             
             if response.status_code == 200:
                 token_data = response.json()
@@ -196,13 +209,7 @@ class OAuth2Client:
             logger.info("正在刷新访问令牌...")
 
             # 发送请求
-            response = requests.post(
-                self.TOKEN_URL,
-                data=data,
-                headers=headers,
-                proxies=self.proxies,
-                timeout=30
-            )
+            response = self._post(self.TOKEN_URL, data, headers)
 
             if response.status_code == 200:
                 token_data = response.json()
@@ -254,13 +261,7 @@ class OAuth2Client:
             logger.info(f"正在撤销 {token_type_hint}...")
 
             # 发送请求
-            response = requests.post(
-                self.REVOKE_URL,
-                data=data,
-                headers=headers,
-                proxies=self.proxies,
-                timeout=30
-            )
+            response = self._post(self.REVOKE_URL, data, headers)
 
             if response.status_code == 200:
                 logger.info(f"{token_type_hint} 撤销成功")
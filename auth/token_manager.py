@@ -5,12 +5,14 @@ Twitter Token 管理模块
 
 import time
 import base64
-import requests
+import hashlib
+import threading
 import yaml
 from pathlib import Path
 from typing import Dict, Optional
 from datetime import datetime, timedelta
 from utils.config_loader import config_loader
+from utils.deadline import phase_scope, DeadlineExceeded
 from utils.logger import logger
 
 
@@ -26,6 +28,10 @@ class TokenManager:
         self._client_id = None
         self._client_secret = None
         self.config_file_path = Path("config/config.yaml")
+        # 刷新令牌会轮换，同一时间只允许一个线程刷新
+        self._refresh_lock = threading.Lock()
+        # 授权代数: 令牌被撤销或替换为其他授权时加一（刷新令牌不会改变账号，不计入）
+        self.auth_generation = 0
         self._load_tokens()
 
     def _load_tokens(self):
@@ -59,14 +65,49 @@ class TokenManager:
             访问令牌字符串
         """
         # 检查 token 是否即将过期（提前 5 分钟刷新）
-        if self._is_token_expired():
+        self.refresh_if_expiring(300)
+
+        return self._access_token
+
+    def refresh_if_expiring(self, margin_seconds: int = 300) -> bool:
+        """
+        如果令牌将在指定时间内过期则刷新
+
+        Args:
+            margin_seconds: 提前刷新的时间（秒）
+
+        Returns:
+            是否执行了刷新且刷新成功
+
+        Raises:
+            DeadlineExceeded: 当前请求的截止时间在刷新完成前已到
+        """
+        if not self._is_token_expired(margin_seconds):
+            return False
+
+        with self._refresh_lock, phase_scope('token_refresh'):
+            # 等待锁期间其他线程可能已经刷新
+            if not self._is_token_expired(margin_seconds):
+                return False
+
             logger.info("访问令牌已过期或即将过期，尝试刷新")
             if self._refresh_access_token():
                 logger.info("访问令牌刷新成功")
-            else:
-                logger.error("访问令牌刷新失败")
+                return True
+            logger.error("访问令牌刷新失败")
+            return False
 
-        return self._access_token
+    def get_token_fingerprint(self) -> Optional[str]:
+        """
+        获取当前访问令牌的指纹（不触发刷新，用于检测令牌是否变化）
+
+        Returns:
+            令牌 SHA-256 的前 16 位，未配置令牌时返回 None
+        """
+        token = self._access_token
+        if not token:
+            return None
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
 
     def get_refresh_token(self) -> Optional[str]:
         """
@@ -77,10 +118,13 @@ class TokenManager:
         """
         return self._refresh_token
 
-    def _is_token_expired(self) -> bool:
+    def _is_token_expired(self, margin_seconds: int = 300) -> bool:
         """
         检查令牌是否过期或即将过期
 
+        Args:
+            margin_seconds: 提前认为过期的时间（秒）
+
         Returns:
             令牌是否过期
         """
@@ -88,8 +132,17 @@ class TokenManager:
             # 如果没有过期时间信息，假设需要刷新
             return True
 
-        # 提前 5 分钟刷新 token
-        return time.time() >= (self._token_expires_at - 300)
+        # 默认提前 5 分钟刷新 token
+        return time.time() >= (self._token_expires_at - margin_seconds)
+
+    def get_token_expires_at(self) -> Optional[float]:
+        """
+        获取访问令牌的过期时间
+
+        Returns:
+            过期时间戳，未知时返回 None
+        """
+        return self._token_expires_at
 
     def _refresh_access_token(self) -> bool:
         """
@@ -103,8 +156,9 @@ class TokenManager:
             return False
 
         try:
-            # 导入代理管理器
-            from utils.proxy import proxy_manager
+            # 导入传输层管理器和熔断器
+            from utils.transport import transport_manager
+            from utils.circuit_breaker import circuit_breakers
 
             # Twitter OAuth 2.0 token endpoint
             token_url = "https://api.twitter.com/2/oauth2/token"
@@ -138,19 +192,31 @@ class TokenManager:
                 if client_id:
                     data['client_id'] = client_id
 
-            # 获取代理配置
-            proxies = proxy_manager.get_proxies() if proxy_manager.is_proxy_enabled() else None
-
             logger.info("正在刷新 Twitter OAuth 2.0 访问令牌...")
 
-            # 发送刷新请求（增加超时时间）
-            response = requests.post(
-                token_url,
-                data=data,
-                headers=headers,
-                proxies=proxies,
-                timeout=60  # 增加到 60 秒
-            )
+            # 令牌端点熔断时直接失败
+            breaker = circuit_breakers.get('oauth_token')
+            breaker.before_call()
+
+            # 发送刷新请求（通过共享连接池，代理从代理池中选择；增加超时时间）
+            try:
+                response = transport_manager.request(
+                    'POST',
+                    token_url,
+                    data=data,
+                    headers=headers,
+                    timeout=60  # 增加到 60 秒
+                )
+            except DeadlineExceeded:
+                breaker.release()
+                raise
+            except Exception as e:
+                breaker.record_failure(e)
+                raise
+            if response.status_code >= 500:
+                breaker.record_failure(f"HTTP {response.status_code}")
+            else:
+                breaker.record_success()
 
             if response.status_code == 200:
                 token_data = response.json()
@@ -186,6 +252,8 @@ class TokenManager:
                 logger.error(f"响应内容: {response.text}")
                 return False
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logger.error(f"刷新访问令牌时发生错误: {e}", exc_info=True)
             return False
@@ -273,7 +341,7 @@ class TokenManager:
             return False
 
         try:
-            from utils.proxy import proxy_manager
+            from utils.transport import transport_manager
 
             revoke_url = "https://api.twitter.com/2/oauth2/revoke"
 
@@ -303,21 +371,19 @@ class TokenManager:
                 if client_id:
                     data['client_id'] = client_id
 
-            # 获取代理配置
-            proxies = proxy_manager.get_proxies() if proxy_manager.is_proxy_enabled() else None
-
             # 发送撤销请求
-            response = requests.post(
+            response = transport_manager.request(
+                'POST',
                 revoke_url,
                 data=data,
                 headers=headers,
-                proxies=proxies,
                 timeout=30
             )
 
             if response.status_code == 200:
                 logger.info("访问令牌已成功撤销")
                 self._access_token = None
+                self.auth_generation += 1
                 return True
             else:
                 logger.error(f"撤销访问令牌失败，状态码: {response.status_code}")
@@ -0,0 +1,383 @@
+"""
+LLM 后端路由模块
+管理多个 OpenAI 兼容后端（各自的地址、Key、模型和速率限制），按延迟选择后端；
+首选后端超过其 p95 延迟仍未返回时向次选后端发送对冲请求，先成功的结果被采用，另一个请求被取消
+"""
+
+import contextvars
+import math
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Callable
+from urllib.parse import urlparse
+from utils.deadline import get_deadline, current_phase, DeadlineExceeded
+from utils.logger import logger
+from llm.retry import RateLimiter
+
+
+class RequestCancelled(Exception):
+    """请求已被取消（对冲请求中另一个后端先返回了结果）"""
+
+
+class CancelToken:
+    """取消令牌类 - 取消时执行已登记的回调（如关闭正在读取的响应）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: List[Callable[[], Any]] = []
+
+    def is_cancelled(self) -> bool:
+        """是否已取消"""
+        return self._cancelled
+
+    def on_cancel(self, callback: Callable[[], Any]):
+        """
+        登记取消时执行的回调（已取消时立即执行）
+
+        Args:
+            callback: 无参数的回调函数
+        """
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """取消并执行所有回调"""
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"执行取消回调失败: {e}")
+
+
+class LLMBackend:
+    """OpenAI 兼容后端类"""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str,
+                 rate_limits: Optional[dict] = None, use_proxy: bool = True,
+                 history_size: int = 200, ewma_alpha: float = 0.3, error_half_life: float = 60.0):
+        """
+        初始化后端
+
+        Args:
+            name: 后端名称
+            base_url: API 地址
+            api_key: API Key
+            model: 该后端使用的模型
+            rate_limits: 速率限制配置（requests_per_minute / tokens_per_minute）
+            use_proxy: 是否通过代理池访问
+            history_size: 保留的延迟样本数（用于计算分位数）
+            ewma_alpha: 延迟和错误率的指数加权系数
+            error_half_life: 错误率的衰减半衰期（秒），使失败过的后端一段时间后重新被选中
+        """
+        rate_limits = rate_limits or {}
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.host = urlparse(self.base_url).hostname
+        self.api_key = api_key
+        self.model = model
+        self.use_proxy = use_proxy
+        self.ewma_alpha = ewma_alpha
+        self.error_half_life = error_half_life
+        # 单个默认后端沿用 openai 熔断器，其余后端各自熔断
+        self.breaker_name = 'openai' if name == 'default' else f'openai:{name}'
+        self.limiter = RateLimiter(
+            requests_per_minute=rate_limits.get('requests_per_minute'),
+            tokens_per_minute=rate_limits.get('tokens_per_minute')
+        )
+        self.clients: Dict[Optional[str], Any] = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=history_size)
+        self.ewma_latency = None
+        self._error_rate = 0.0
+        self._error_updated_at = time.monotonic()
+        self.stats = {'requests': 0, 'successes': 0, 'failures': 0, 'wins': 0, 'cancelled': 0}
+
+    def record(self, latency: Optional[float] = None, success: bool = True):
+        """
+        记录一次请求结果
+
+        Args:
+            latency: 请求耗时（秒），只记录成功请求的耗时
+            success: 是否成功
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['successes' if success else 'failures'] += 1
+            outcome = 0.0 if success else 1.0
+            self._error_rate = (1 - self.ewma_alpha) * self._current_error_rate() + self.ewma_alpha * outcome
+            self._error_updated_at = time.monotonic()
+            if success and latency is not None:
+                self._latencies.append(latency)
+                if self.ewma_latency is None:
+                    self.ewma_latency = latency
+                else:
+                    self.ewma_latency = (1 - self.ewma_alpha) * self.ewma_latency + self.ewma_alpha * latency
+
+    def _current_error_rate(self) -> float:
+        """按时间衰减后的错误率（调用方需持有锁）"""
+        elapsed = time.monotonic() - self._error_updated_at
+        return self._error_rate * 0.5 ** (elapsed / self.error_half_life)
+
+    def record_cancelled(self):
+        """记录一次被取消的请求（不计入成功或失败）"""
+        with self._lock:
+            self.stats['cancelled'] += 1
+
+    def record_win(self):
+        """记录一次被采用的结果"""
+        with self._lock:
+            self.stats['wins'] += 1
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """
+        获取延迟分位数
+
+        Args:
+            percent: 分位（0-100）
+
+        Returns:
+            延迟（秒），没有样本时返回 None
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, math.ceil(percent / 100 * len(samples)) - 1))
+        return samples[index]
+
+    def sample_count(self) -> int:
+        """获取延迟样本数"""
+        with self._lock:
+            return len(self._latencies)
+
+    def score(self) -> float:
+        """
+        路由评分（越小越优先）: 延迟 EWMA 按错误率放大；没有样本的后端评分为 0，优先试探
+        """
+        with self._lock:
+            if self.ewma_latency is None:
+                return 0.0
+            return self.ewma_latency * (1 + 4 * self._current_error_rate())
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为状态字典"""
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        with self._lock:
+            return {
+                'name': self.name,
+                'base_url': self.base_url,
+                'model': self.model,
+                'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+                'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                'error_rate': round(self._current_error_rate(), 3),
+                'samples': len(self._latencies),
+                **self.stats,
+                'rate_limiter': self.limiter.get_status()
+            }
+
+
+class BackendRouter:
+    """后端路由器类 - 按延迟排序，超过 p95 延迟时发送对冲请求"""
+
+    def __init__(self, backends: List[LLMBackend], hedge_config: Optional[dict] = None):
+        """
+        初始化路由器
+
+        Args:
+            backends: 后端列表（配置顺序即延迟相同时的优先顺序）
+            hedge_config: 对冲配置（openai.hedge）
+        """
+        hedge_config = hedge_config or {}
+        self.backends = backends
+        self.hedge_enabled = hedge_config.get('enabled', True)
+        self.hedge_percentile = hedge_config.get('percentile', 95)
+        self.initial_delay = hedge_config.get('initial_delay', 2.0)
+        self.min_delay = hedge_config.get('min_delay', 0.2)
+        self.max_delay = hedge_config.get('max_delay', 10.0)
+        self.min_samples = hedge_config.get('min_samples', 5)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'hedged': 0, 'secondary_wins': 0, 'failovers': 0}
+
+    def get(self, name: str) -> Optional[LLMBackend]:
+        """按名称获取后端"""
+        for backend in self.backends:
+            if backend.name == name:
+                return backend
+        return None
+
+    def rank(self, names: Optional[List[str]] = None) -> List[LLMBackend]:
+        """
+        按路由评分排序后端（熔断中或处于 429 暂停期的后端排在最后）
+
+        Args:
+            names: 只在这些后端中选择，为 None 时使用全部后端
+        """
+        from utils.circuit_breaker import circuit_breakers, CircuitBreaker
+
+        candidates = [b for b in self.backends if names is None or b.name in names]
+
+        def key(item):
+            position, backend = item
+            unavailable = (circuit_breakers.get(backend.breaker_name).state == CircuitBreaker.OPEN
+                           or backend.limiter.get_status()['blocked_for_seconds'] > 0)
+            return unavailable, backend.score(), position
+
+        return [backend for _, backend in sorted(enumerate(candidates), key=key)]
+
+    def hedge_delay(self, backend: LLMBackend) -> Optional[float]:
+        """
+        获取发送对冲请求前等待的时间: 首选后端的 p95 延迟（样本不足时使用初始值）
+
+        Returns:
+            等待秒数，未启用对冲时返回 None
+        """
+        if not self.hedge_enabled:
+            return None
+        delay = None
+        if backend.sample_count() >= self.min_samples:
+            delay = backend.percentile(self.hedge_percentile)
+        if delay is None:
+            delay = self.initial_delay
+        return min(max(delay, self.min_delay), self.max_delay)
+
+    def execute(self, attempt: Callable[[LLMBackend, Optional[CancelToken]], Any],
+                names: Optional[List[str]] = None) -> Any:
+        """
+        在后端上执行一次请求: 先请求首选后端，超过对冲延迟仍未返回时再请求次选后端，
+        采用先成功的结果并取消另一个；首选后端提前失败时立即转到次选后端
+
+        Args:
+            attempt: 在指定后端上执行一次请求的函数，参数为 (后端, 取消令牌)；
+                     取消令牌为 None 表示不需要支持取消
+            names: 只在这些后端中选择
+
+        Returns:
+            attempt 的返回值
+
+        Raises:
+            DeadlineExceeded: 截止时间内没有后端返回结果
+            最后一个失败请求的异常: 所有后端都失败
+        """
+        ranked = self.rank(names)
+        if not ranked:
+            raise ValueError("没有可用的 LLM 后端")
+        with self._lock:
+            self.stats['requests'] += 1
+
+        primary = ranked[0]
+        if len(ranked) == 1:
+            return self._run_single(primary, attempt)
+
+        results = queue.Queue()
+        cancel_tokens: Dict[str, CancelToken] = {}
+
+        def launch(backend: LLMBackend):
+            cancel_token = CancelToken()
+            cancel_tokens[backend.name] = cancel_token
+
+            def worker():
+                try:
+                    results.put((backend, attempt(backend, cancel_token), None))
+                except BaseException as e:
+                    results.put((backend, None, e))
+
+            # 截止时间和阶段通过 contextvars 传递给请求线程
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(worker,), name=f'llm-{backend.name}', daemon=True).start()
+
+        def wait(timeout: Optional[float]):
+            deadline = get_deadline()
+            if deadline is not None:
+                remaining = max(deadline.remaining(), 0.0)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            try:
+                return results.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded(current_phase('generate'), deadline.budget)
+                return None
+
+        secondaries = list(ranked[1:])
+        launch(primary)
+        pending = 1
+        errors = []
+        delay = self.hedge_delay(primary)
+        try:
+            item = wait(delay) if delay is not None else None
+            if item is None and delay is not None:
+                # 首选后端超过 p95 延迟仍未返回，发送对冲请求
+                with self._lock:
+                    self.stats['hedged'] += 1
+                logger.info(f"LLM 后端 {primary.name} {delay:.2f} 秒未返回，向 {secondaries[0].name} 发送对冲请求")
+                launch(secondaries.pop(0))
+                pending += 1
+
+            while True:
+                if item is None:
+                    item = wait(None)
+                    if item is None:
+                        continue
+                backend, value, error = item
+                item = None
+                pending -= 1
+                if error is None:
+                    backend.record_win()
+                    if backend is not primary:
+                        with self._lock:
+                            self.stats['secondary_wins'] += 1
+                    return value
+
+                errors.append(error)
+                if isinstance(error, DeadlineExceeded):
+                    raise error
+                if pending == 0:
+                    if not secondaries:
+                        raise error
+                    # 已发出的请求都失败，立即转到下一个后端
+                    with self._lock:
+                        self.stats['failovers'] += 1
+                    logger.warning(f"LLM 后端 {backend.name} 请求失败 ({error})，转到 {secondaries[0].name}")
+                    launch(secondaries.pop(0))
+                    pending += 1
+        finally:
+            # 取消仍在进行的请求（关闭其响应连接，请求线程随即结束）
+            for cancel_token in cancel_tokens.values():
+                cancel_token.cancel()
+
+    def _run_single(self, backend: LLMBackend, attempt: Callable[[LLMBackend, Optional[CancelToken]], Any]) -> Any:
+        """只有一个候选后端时直接在当前线程中请求"""
+        value = attempt(backend, None)
+        backend.record_win()
+        return value
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取路由状态
+
+        Returns:
+            状态字典
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            'hedge': {
+                'enabled': self.hedge_enabled,
+                'percentile': self.hedge_percentile,
+                'initial_delay': self.initial_delay
+            },
+            'stats': stats,
+            'backends': [backend.to_dict() for backend in self.backends]
+        }
@@ -0,0 +1,209 @@
+"""
+模型级联模块
+先用便宜、快速的模型生成推文，结果未通过校验（长度、重复、禁用词）或请求失败时才升级到更强的模型，
+并统计升级率和相对于直接使用最强模型节省的延迟
+"""
+
+import threading
+import time
+from typing import Optional, List, Dict, Any, Callable
+from utils.deadline import DeadlineExceeded
+from utils.logger import logger
+from llm.validators import TweetValidator
+
+
+# 与已发送的推文重复（字面或语义）的校验项，只因这些未通过时用同一层级重新生成
+DUPLICATE_FAILURES = {'duplicate', 'semantic_duplicate'}
+
+
+class CascadeTier:
+    """级联中的一级模型"""
+
+    def __init__(self, name: str, model: Optional[str] = None, backends: Optional[List[str]] = None,
+                 max_tokens: int = 300, temperature: float = 0.8):
+        """
+        初始化级联层级
+
+        Args:
+            name: 层级名称
+            model: 模型名称，为 None 时使用各后端自身的模型
+            backends: 只使用这些后端，为 None 时使用全部后端
+            max_tokens: 最大生成 token 数
+            temperature: 温度
+        """
+        self.name = name
+        self.model = model
+        self.backends = backends
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stats = {'calls': 0, 'errors': 0, 'accepted': 0, 'rejected': 0, 'latency_seconds': 0.0}
+
+    def average_latency(self) -> Optional[float]:
+        """平均耗时（秒），没有成功返回的请求时为 None"""
+        completed = self.stats['calls'] - self.stats['errors']
+        if completed <= 0:
+            return None
+        return self.stats['latency_seconds'] / completed
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为状态字典"""
+        average = self.average_latency()
+        return {
+            'name': self.name,
+            'model': self.model,
+            'backends': self.backends,
+            **{key: value for key, value in self.stats.items() if key != 'latency_seconds'},
+            'avg_latency_ms': round(average * 1000, 1) if average is not None else None
+        }
+
+
+class ModelCascade:
+    """模型级联类"""
+
+    def __init__(self, tiers: List[CascadeTier], validator: TweetValidator, duplicate_retries: int = 2):
+        """
+        初始化模型级联
+
+        Args:
+            tiers: 从便宜到昂贵排列的层级
+            validator: 推文校验器
+            duplicate_retries: 只因重复未通过校验时，用同一层级重新生成的次数（每个请求共享）
+        """
+        self.tiers = tiers
+        self.validator = validator
+        self.duplicate_retries = duplicate_retries
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'escalated': 0,
+            'rejected': 0,
+            'validation_failures': {},
+            'accepted_early': 0,
+            'regenerated': 0
+        }
+        # 在最后一级之前通过校验的请求的总耗时（用于估算节省的延迟）
+        self._early_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, cascade_config: Optional[dict], validator: TweetValidator) -> 'ModelCascade':
+        """
+        根据配置创建模型级联（未配置 tiers 时只有一级，使用各后端自身的模型）
+
+        Args:
+            cascade_config: 级联配置（openai.cascade）
+            validator: 推文校验器
+        """
+        cascade_config = cascade_config or {}
+        tiers = []
+        for index, item in enumerate(cascade_config.get('tiers') or [{'name': 'default'}]):
+            tiers.append(CascadeTier(
+                item.get('name') or item.get('model') or f'tier{index + 1}',
+                model=item.get('model'),
+                backends=item.get('backends'),
+                max_tokens=item.get('max_tokens', 300),
+                temperature=item.get('temperature', 0.8)
+            ))
+        return cls(tiers, validator, duplicate_retries=cascade_config.get('duplicate_retries', 2))
+
+    def run(self, generate: Callable[[CascadeTier], str], skip_checks: Optional[List[str]] = None) -> Optional[str]:
+        """
+        按层级依次生成，返回第一个通过校验的结果
+
+        最后一级的结果只有长度不合格时仍然返回（由调用方截断），其他校验项不合格时返回 None；
+        只因与已发送的推文重复未通过时，先用同一层级重新生成（最多 duplicate_retries 次）
+
+        Args:
+            generate: 使用指定层级生成一条推文的函数
+            skip_checks: 跳过的校验项（如推文串模式下跳过 length）
+
+        Returns:
+            推文内容，所有层级都未通过校验时返回 None
+
+        Raises:
+            DeadlineExceeded: 截止时间已到
+            最后一级请求的异常: 最后一级请求失败
+        """
+        started = time.monotonic()
+        with self._lock:
+            self.stats['requests'] += 1
+
+        retries_left = self.duplicate_retries
+        index = 0
+        while index < len(self.tiers):
+            tier = self.tiers[index]
+            is_last = index == len(self.tiers) - 1
+            tier_started = time.monotonic()
+            try:
+                content = generate(tier).strip()
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                with self._lock:
+                    tier.stats['calls'] += 1
+                    tier.stats['errors'] += 1
+                    if not is_last and index == 0:
+                        self.stats['escalated'] += 1
+                if is_last:
+                    raise
+                logger.warning(f"模型 {tier.name} 生成失败 ({e})，升级到 {self.tiers[index + 1].name}")
+                index += 1
+                continue
+
+            failures = self.validator.validate(content, skip_checks) if content else ['empty']
+            with self._lock:
+                tier.stats['calls'] += 1
+                tier.stats['latency_seconds'] += time.monotonic() - tier_started
+                for reason in failures:
+                    self.stats['validation_failures'][reason] = self.stats['validation_failures'].get(reason, 0) + 1
+
+            if not failures or (is_last and failures == ['length']):
+                with self._lock:
+                    tier.stats['accepted'] += 1
+                    if not is_last:
+                        self.stats['accepted_early'] += 1
+                        self._early_seconds += time.monotonic() - started
+                return content
+
+            if failures and set(failures) <= DUPLICATE_FAILURES and retries_left > 0:
+                retries_left -= 1
+                with self._lock:
+                    tier.stats['rejected'] += 1
+                    self.stats['regenerated'] += 1
+                logger.info(f"模型 {tier.name} 生成的推文与已发送的推文重复，重新生成")
+                continue
+
+            with self._lock:
+                tier.stats['rejected'] += 1
+                if is_last:
+                    self.stats['rejected'] += 1
+                elif index == 0:
+                    self.stats['escalated'] += 1
+            if is_last:
+                logger.error(f"模型 {tier.name} 生成的推文未通过校验: {', '.join(failures)}")
+                return None
+            logger.info(f"模型 {tier.name} 生成的推文未通过校验 ({', '.join(failures)})，升级到 {self.tiers[index + 1].name}")
+            index += 1
+        return None
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取级联统计（升级率、各层级的调用和耗时、节省的延迟）
+
+        Returns:
+            状态字典
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['validation_failures'] = dict(self.stats['validation_failures'])
+            # 节省的延迟 = 提前通过的请求数 x 最后一级的平均耗时 - 这些请求的实际耗时
+            strongest = self.tiers[-1].average_latency()
+            saved = None
+            if strongest is not None and len(self.tiers) > 1:
+                saved = stats['accepted_early'] * strongest - self._early_seconds
+            stats['latency_saved_seconds'] = round(saved, 3) if saved is not None else None
+            stats['avg_latency_saved_ms'] = (round(saved / stats['accepted_early'] * 1000, 1)
+                                             if saved is not None and stats['accepted_early'] else None)
+            stats['escalation_rate'] = round(stats['escalated'] / stats['requests'], 3) if stats['requests'] else 0.0
+            stats['tiers'] = [tier.to_dict() for tier in self.tiers]
+        stats['validation'] = self.validator.get_status()
+        return stats
@@ -0,0 +1,255 @@
+"""
+候选推文排序模块
+用历史推文的互动率离线训练一个 NumPy 逻辑回归模型（哈希后的字符 / 词 n-gram 特征 + 元数据特征），
+在进程内为 LLM 生成的多条候选推文打分，调度器发送分数最高的一条，不需要额外的 API 请求；
+模型保存在 npz 文件中，文件更新后下次打分时自动重新加载（训练见 tools/train_ranker.py）
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Optional, List, Dict, Any, Tuple
+import numpy as np
+from utils.twitter_text import weighted_length, MAX_WEIGHTED_LENGTH
+from utils.logger import logger
+
+
+_URL = re.compile(r'https?://\S+')
+_WORD = re.compile(r'\w+', re.UNICODE)
+_SPACES = re.compile(r'\s+')
+# 元数据特征数（见 _metadata）
+METADATA_FEATURES = 10
+
+
+def _metadata(text: str) -> List[float]:
+    """元数据特征: 长度、链接、话题标签、提及、问号、感叹号、行数、数字、emoji、中日韩文字比例"""
+    length = max(len(text), 1)
+    cjk = sum(1 for char in text if '\u3040' <= char <= '\u9fff' or '\uac00' <= char <= '\ud7af')
+    return [
+        weighted_length(text) / MAX_WEIGHTED_LENGTH,
+        1.0 if _URL.search(text) else 0.0,
+        min(text.count('#'), 3) / 3,
+        min(text.count('@'), 3) / 3,
+        1.0 if '?' in text or '？' in text else 0.0,
+        1.0 if '!' in text or '！' in text else 0.0,
+        min(text.count('\n') + 1, 5) / 5,
+        1.0 if any(char.isdigit() for char in text) else 0.0,
+        1.0 if any(ord(char) >= 0x1F000 for char in text) else 0.0,
+        cjk / length
+    ]
+
+
+def featurize(texts: List[str], hash_bits: int = 12) -> np.ndarray:
+    """
+    提取特征矩阵
+
+    n-gram 用 crc32 哈希到 2^hash_bits 个位置（带符号，减少冲突的影响），计数取 log1p 后按行 L2 归一化；
+    之后拼接元数据特征
+
+    Args:
+        texts: 推文内容列表
+        hash_bits: 哈希空间的位数
+
+    Returns:
+        float32 矩阵，形状为 (len(texts), 2^hash_bits + METADATA_FEATURES)
+    """
+    dim = 1 << hash_bits
+    matrix = np.zeros((len(texts), dim + METADATA_FEATURES), dtype=np.float32)
+    for row, text in enumerate(texts):
+        normalized = _SPACES.sub(' ', _URL.sub(' ', text.lower())).strip()
+        words = _WORD.findall(normalized)
+        grams = [normalized[i:i + n] for n in (2, 3) for i in range(len(normalized) - n + 1)]
+        grams.extend('w:' + word for word in words)
+        grams.extend(f'w:{first} {second}' for first, second in zip(words, words[1:]))
+        if grams:
+            hashes = np.fromiter((zlib.crc32(gram.encode('utf-8')) for gram in grams), dtype=np.uint32,
+                                 count=len(grams))
+            signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+            counts = np.bincount(hashes & (dim - 1), weights=signs, minlength=dim)
+            counts = np.sign(counts) * np.log1p(np.abs(counts))
+            norm = np.linalg.norm(counts)
+            if norm > 0:
+                matrix[row, :dim] = counts / norm
+        matrix[row, dim:] = _metadata(text)
+    return matrix
+
+
+def _auc(labels: np.ndarray, scores: np.ndarray) -> Optional[float]:
+    """计算 ROC AUC（正负样本都存在时）"""
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        return None
+    ranks = np.empty(len(scores))
+    ranks[np.argsort(scores, kind='stable')] = np.arange(1, len(scores) + 1)
+    return float((ranks[labels == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives))
+
+
+class DraftRanker:
+    """候选推文排序器类"""
+
+    def __init__(self, drafts_config: Optional[dict] = None):
+        """
+        初始化排序器
+
+        Args:
+            drafts_config: 候选推文配置（scheduler.drafts）
+        """
+        drafts_config = drafts_config or {}
+        self.model_path = drafts_config.get('model_path', 'data/draft_ranker.npz')
+        self.hash_bits = drafts_config.get('hash_bits', 12)
+        self.horizon_hours = drafts_config.get('horizon_hours', 24)
+        self.l2 = drafts_config.get('l2', 1e-3)
+        self.epochs = drafts_config.get('epochs', 300)
+        self.learning_rate = drafts_config.get('learning_rate', 0.5)
+        self.min_samples = drafts_config.get('min_samples', 50)
+
+        self._lock = threading.Lock()
+        self._weights: Optional[np.ndarray] = None
+        self._bias = 0.0
+        self._model_hash_bits = self.hash_bits
+        self._info: Dict[str, Any] = {}
+        self._loaded_mtime = None
+
+    def _maybe_reload(self):
+        """模型文件更新时重新加载（调用方需持有锁）"""
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with np.load(self.model_path) as data:
+                self._weights = data['weights'].astype(np.float32)
+                self._bias = float(data['bias'])
+                self._info = json.loads(str(data['info']))
+            self._model_hash_bits = self._info.get('hash_bits', self.hash_bits)
+            self._loaded_mtime = mtime
+            logger.info(f"已加载候选推文排序模型（{self._info.get('samples')} 条样本，AUC {self._info.get('auc')}）")
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"加载候选推文排序模型失败: {e}")
+            self._loaded_mtime = mtime
+
+    @property
+    def ready(self) -> bool:
+        """是否有可用的模型"""
+        with self._lock:
+            self._maybe_reload()
+            return self._weights is not None
+
+    def score(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        为候选推文打分（预测互动率高于历史中位数的概率）
+
+        Args:
+            texts: 候选推文列表
+
+        Returns:
+            分数数组，没有可用模型时返回 None
+        """
+        with self._lock:
+            self._maybe_reload()
+            weights, bias, hash_bits = self._weights, self._bias, self._model_hash_bits
+        if weights is None or not texts:
+            return None
+        logits = featurize(texts, hash_bits) @ weights + bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def best(self, drafts: List[str]) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        选出分数最高的候选推文
+
+        Args:
+            drafts: 候选推文列表
+
+        Returns:
+            (最佳候选, 各候选的分数)；没有可用模型时返回第一条候选和 None
+        """
+        if not drafts:
+            return None, None
+        scores = self.score(drafts)
+        if scores is None:
+            return drafts[0], None
+        return drafts[int(np.argmax(scores))], [round(float(score), 4) for score in scores]
+
+    def train(self, texts: List[str], rates: List[float], validation_split: float = 0.2) -> Dict[str, Any]:
+        """
+        训练模型并保存（标签: 互动率不低于中位数为 1），样本按时间顺序排列时最后一部分用于验证
+
+        Args:
+            texts: 推文内容（从旧到新）
+            rates: 对应的互动率
+            validation_split: 验证集比例
+
+        Returns:
+            训练结果字典
+        """
+        if len(texts) < self.min_samples:
+            return {'success': False, 'samples': len(texts), 'message': f"样本不足 {self.min_samples} 条"}
+
+        features = featurize(texts, self.hash_bits)
+        rates = np.asarray(rates, dtype=np.float64)
+        labels = (rates >= np.median(rates)).astype(np.float32)
+        split = int(len(texts) * (1 - validation_split))
+
+        def fit(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, float]:
+            """全量梯度下降（L2 正则）"""
+            weights = np.zeros(x.shape[1], dtype=np.float32)
+            bias = 0.0
+            for _ in range(self.epochs):
+                predictions = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+                error = predictions - y
+                weights -= self.learning_rate * (x.T @ error / len(y) + self.l2 * weights)
+                bias -= self.learning_rate * float(error.mean())
+            return weights, bias
+
+        auc = None
+        if 0 < split < len(texts):
+            weights, bias = fit(features[:split], labels[:split])
+            auc = _auc(labels[split:], features[split:] @ weights + bias)
+        # 验证后用全部样本重新训练
+        weights, bias = fit(features, labels)
+
+        info = {'samples': len(texts), 'hash_bits': self.hash_bits, 'auc': round(auc, 4) if auc is not None else None,
+                'median_rate': float(np.median(rates)), 'trained_at': time.time()}
+        directory = os.path.dirname(self.model_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{self.model_path}.tmp.npz"
+        np.savez(temp_path, weights=weights, bias=np.float64(bias), info=json.dumps(info))
+        os.replace(temp_path, self.model_path)
+        logger.info(f"候选推文排序模型训练完成: {len(texts)} 条样本，验证 AUC {info['auc']}")
+        return {'success': True, **info}
+
+    def train_from_history(self, tweet_store, metrics_store) -> Dict[str, Any]:
+        """
+        用本地推文存储和指标时序存储中已满 horizon_hours 的推文训练
+
+        Args:
+            tweet_store: 本地推文存储
+            metrics_store: 推文指标时序存储
+
+        Returns:
+            训练结果字典
+        """
+        from twitter.metrics_store import engagement_of
+
+        texts = tweet_store.texts()
+        samples = []
+        for tweet_id, values in metrics_store.values_at(self.horizon_hours * 3600).items():
+            impressions = values.get('impression_count') or 0
+            if tweet_id in texts and impressions > 0:
+                samples.append((tweet_id, texts[tweet_id], engagement_of(values) / impressions))
+        # 按推文 ID（发送时间）排序，验证集为最近的推文
+        samples.sort()
+        return self.train([text for _, text, _ in samples], [rate for _, _, rate in samples])
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取模型状态"""
+        with self._lock:
+            self._maybe_reload()
+            return {'ready': self._weights is not None, 'model_path': self.model_path, **self._info}
@@ -3,12 +3,31 @@ LLM 客户端模块
 负责调用 OpenAI API 生成推文内容
 """
 
-from openai import OpenAI
+import contextvars
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import httpx
-from typing import Optional
+from openai import OpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from typing import Optional, Tuple, Iterator, Dict, Any, List
+from urllib.parse import urlparse
 from utils.config_loader import config_loader
-from utils.proxy import proxy_manager
+from utils.proxy import proxy_manager, mask_proxy_url
+from utils.transport import transport_manager
+from utils.circuit_breaker import circuit_breakers, CircuitBreaker, CircuitOpenError
+from utils.deadline import remaining_timeout, get_deadline, current_phase, check_deadline, DeadlineExceeded
 from utils.logger import logger
+from utils.twitter_text import weighted_length, truncate_tweet, MAX_WEIGHTED_LENGTH
+from llm.retry import RetryingCaller, RetryPolicy, classify_error, parse_retry_after
+from llm.backends import LLMBackend, BackendRouter, CancelToken, RequestCancelled
+from llm.cascade import ModelCascade, CascadeTier
+from llm.validators import TweetValidator, tweet_history
+from llm.near_duplicate import near_duplicate_index
+from llm.semantic_duplicate import semantic_duplicate_index
+from llm.prompt_bandit import prompt_bandit
+
+
+DEFAULT_API_BASE = 'https://api.openai.com/v1'
 
 
 class LLMClient:
@@ -17,43 +36,424 @@ class LLMClient:
     def __init__(self):
         """初始化 LLM 客户端"""
         self.openai_config = config_loader.get_openai_config()
+        # 后端路由（未配置 backends 时只有一个使用 api_key / base_url / model 的默认后端）
+        self.router = self._setup_backends()
+        # 首选后端的 API 地址和主机
+        primary = self.router.backends[0] if self.router.backends else None
+        self.api_base = primary.base_url if primary else (self.openai_config.get('base_url') or DEFAULT_API_BASE)
+        self.api_host = urlparse(self.api_base).hostname
         self.client = None
+        self._clients_lock = threading.Lock()
+        # 流式生成统计
+        self._stream_lock = threading.Lock()
+        self.stream_stats = {
+            'requests': 0, 'completed': 0, 'truncated': 0, 'disconnected': 0, 'failed': 0,
+            'ttft_seconds': 0.0, 'ttft_samples': 0
+        }
+        self.retrying = self._setup_retrying()
+        # 模型级联（未配置 cascade.tiers 时只有一级）
+        self.cascade = ModelCascade.from_config(
+            self.openai_config.get('cascade'),
+            TweetValidator(self.openai_config.get('validation'), tweet_history, near_duplicate_index,
+                           semantic_duplicate_index)
+        )
+        semantic_duplicate_index.set_embedder(self.embed)
         self._setup_openai_client()
 
+    @property
+    def backends(self) -> list:
+        """所有后端（连接预热时使用）"""
+        return self.router.backends
+
+    def _setup_backends(self) -> BackendRouter:
+        """根据配置创建后端和路由器"""
+        backends_config = self.openai_config.get('backends') or [{'name': 'default'}]
+        backends = []
+        for index, item in enumerate(backends_config):
+            name = item.get('name') or f'backend{index + 1}'
+            api_key = item.get('api_key') or self.openai_config.get('api_key')
+            if not api_key:
+                logger.warning(f"LLM 后端 {name} 未配置 API Key，已跳过")
+                continue
+            backends.append(LLMBackend(
+                name,
+                base_url=item.get('base_url') or self.openai_config.get('base_url') or DEFAULT_API_BASE,
+                api_key=api_key,
+                model=item.get('model') or self.openai_config.get('model', 'gpt-3.5-turbo'),
+                # 每个后端各自限速，未单独配置时使用 openai.rate_limits
+                rate_limits=item.get('rate_limits', self.openai_config.get('rate_limits')),
+                use_proxy=item.get('use_proxy', True)
+            ))
+        if len(backends) > 1:
+            logger.info(f"已配置 {len(backends)} 个 LLM 后端: {', '.join(b.name for b in backends)}")
+        return BackendRouter(backends, self.openai_config.get('hedge'))
+
+    def _setup_retrying(self) -> RetryingCaller:
+        """根据配置创建重试调用器（速率限制由每个后端的限制器负责）"""
+        retry_config = self.openai_config.get('retry') or {}
+        policy = RetryPolicy(
+            max_attempts=retry_config.get('max_attempts', self.openai_config.get('max_retries', 2) + 1),
+            base_delay=retry_config.get('base_delay', 0.5),
+            max_delay=retry_config.get('max_delay', 20),
+            max_retry_after=retry_config.get('max_retry_after', 60)
+        )
+        return RetryingCaller(policy)
+
+    def get_stats(self) -> dict:
+        """
+        获取 LLM 请求统计（重试次数、错误分类、各后端的延迟、对冲和速率限制状态、模型级联的升级率）
+
+        Returns:
+            统计字典
+        """
+        return {
+            'retry': self.retrying.get_status(),
+            'routing': self.router.get_status(),
+            'cascade': self.cascade.get_status(),
+            'streaming': self._get_stream_stats()
+        }
+
+    def _get_stream_stats(self) -> dict:
+        """获取流式生成统计（含平均首字延迟）"""
+        with self._stream_lock:
+            stats = dict(self.stream_stats)
+        samples = stats.pop('ttft_samples')
+        total = stats.pop('ttft_seconds')
+        stats['avg_ttft_ms'] = round(total / samples * 1000, 1) if samples else None
+        return stats
+
+    def _create_client(self, backend: LLMBackend, proxy_url: Optional[str]) -> OpenAI:
+        """
+        创建通过指定代理访问后端的 OpenAI 客户端
+
+        Args:
+            backend: 后端
+            proxy_url: 代理 URL，为 None 时直连
+        """
+        # 使用传输层中共享的长连接 httpx 客户端
+        http_client = transport_manager.get_httpx_client(proxy_url, backend.host)
+        if proxy_url:
+            logger.info(f"已为 LLM 后端 {backend.name} 配置代理: {mask_proxy_url(proxy_url)}")
+
+        # 创建 OpenAI 客户端（v1.x API）
+        # 库默认超时为 10 分钟，这里显式设置，避免卡住调度线程
+        return OpenAI(
+            api_key=backend.api_key,
+            base_url=backend.base_url,
+            http_client=http_client,
+            timeout=self.openai_config.get('timeout', 60),
+            # 重试由 RetryingCaller 负责（遵循 Retry-After、受截止时间约束）
+            max_retries=0
+        )
+
     def _setup_openai_client(self):
         """设置 OpenAI 客户端"""
-        api_key = self.openai_config.get('api_key')
-        if not api_key:
+        if not self.router.backends:
             logger.warning("OpenAI API Key 未配置，LLM 功能将不可用")
             return
 
-        # 如果启用了代理，配置代理
-        http_client = None
-        if proxy_manager.is_proxy_enabled():
-            proxies = proxy_manager.get_proxies()
-            if proxies:
-                # 为 OpenAI v1.x 配置代理
-                # proxies 格式: {'http://': 'socks5://...', 'https://': 'socks5://...'}
-                proxy_url = proxies.get('https://') or proxies.get('http://')
-                if proxy_url:
-                    # httpx.Client 使用 proxy 参数（单数），不是 proxies
-                    http_client = httpx.Client(proxy=proxy_url)
-                    logger.info(f"已为 OpenAI 客户端配置代理: {proxy_url}")
+        # 首选后端的默认客户端（用于验证 API Key）
+        self.client, _ = self._select_client(self.router.backends[0])
 
-        # 创建 OpenAI 客户端（v1.x API）
-        self.client = OpenAI(
-            api_key=api_key,
-            http_client=http_client
+        logger.info("OpenAI 客户端初始化完成")
+
+    def _select_client(self, backend: LLMBackend) -> Tuple[OpenAI, Optional[str]]:
+        """
+        从代理池中选择代理，返回访问后端的 OpenAI 客户端
+
+        Args:
+            backend: 后端
+
+        Returns:
+            (OpenAI 客户端, 代理 URL) 元组
+        """
+        proxy_url = proxy_manager.select_proxy() if backend.use_proxy else None
+        with self._clients_lock:
+            client = backend.clients.get(proxy_url)
+            if client is None:
+                client = self._create_client(backend, proxy_url)
+                backend.clients[proxy_url] = client
+        return client, proxy_url
+
+    @staticmethod
+    def _iter_stream(stream) -> Iterator[str]:
+        """
+        逐段读取流式响应的内容
+
+        Raises:
+            APIConnectionError: 读取响应失败
+        """
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except httpx.TimeoutException as e:
+            raise APITimeoutError(request=stream.response.request) from e
+        except (httpx.HTTPError, httpx.StreamError) as e:
+            raise APIConnectionError(request=stream.response.request) from e
+
+    def _read_stream(self, stream, cancel_token: CancelToken) -> str:
+        """
+        读取流式响应的全部内容
+
+        Raises:
+            RequestCancelled: 读取过程中请求被取消
+            DeadlineExceeded: 读取过程中截止时间已到
+            APIConnectionError: 读取响应失败
+        """
+        parts = []
+        try:
+            if cancel_token.is_cancelled():
+                raise RequestCancelled()
+            for text in self._iter_stream(stream):
+                if cancel_token.is_cancelled():
+                    raise RequestCancelled()
+                check_deadline()
+                parts.append(text)
+        except APIConnectionError as e:
+            if cancel_token.is_cancelled():
+                raise RequestCancelled() from e
+            raise
+        finally:
+            stream.response.close()
+        if cancel_token.is_cancelled():
+            raise RequestCancelled()
+        return ''.join(parts)
+
+    def _prepare_request(self, backend: LLMBackend, prompt: str, max_tokens: int) -> Tuple[dict, CircuitBreaker]:
+        """
+        发送请求前的准备: 按后端的速率限制获取额度、按剩余的截止时间设置超时、检查后端的熔断器
+
+        Returns:
+            (请求参数, 熔断器) 元组
+
+        Raises:
+            DeadlineExceeded: 截止时间已到
+            CircuitOpenError: 后端熔断中
+        """
+        # 按字符数粗略估算 token 数，用于后端的 TPM 限制
+        deadline = get_deadline()
+        wait_limit = None if deadline is None else max(deadline.remaining(), 0.0)
+        if not backend.limiter.acquire(len(prompt) // 2 + max_tokens, timeout=wait_limit):
+            raise DeadlineExceeded(current_phase('generate'), deadline.budget)
+
+        # 有截止时间时（手动发推接口或定时任务），请求超时不超过剩余的时间预算
+        request_options = {}
+        timeout = remaining_timeout('generate')
+        if timeout is not None:
+            request_options['timeout'] = timeout
+
+        # 后端熔断时直接失败
+        breaker = circuit_breakers.get(backend.breaker_name)
+        breaker.before_call()
+        return request_options, breaker
+
+    @staticmethod
+    def _build_params(backend: LLMBackend, prompt: str, max_tokens: int, temperature: float,
+                      model: Optional[str] = None) -> dict:
+        """构造 Chat Completions 请求参数"""
+        return dict(
+            model=model or backend.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            max_tokens=max_tokens,  # 限制生成长度
+            temperature=temperature,  # 增加创造性
+            top_p=1.0,
+            frequency_penalty=0.5,  # 减少重复
+            presence_penalty=0.5
         )
 
-        logger.info("OpenAI 客户端初始化完成")
-    
-    def generate_tweet(self, custom_prompt: Optional[str] = None) -> Optional[str]:
+    def _on_request_error(self, error: BaseException, backend: LLMBackend, breaker: CircuitBreaker,
+                          proxy_url: Optional[str], started: float) -> BaseException:
+        """
+        按错误类型记录失败的请求（代理错误率、后端熔断器、后端路由统计）
+
+        Returns:
+            应抛出的异常（截止时间导致的超时转换为 DeadlineExceeded）
+        """
+        if isinstance(error, RequestCancelled):
+            breaker.release()
+            backend.record_cancelled()
+        elif isinstance(error, APIConnectionError):
+            deadline = get_deadline()
+            if deadline is not None and deadline.expired():
+                # 因截止时间缩短了超时，不能说明代理或后端有问题
+                breaker.release()
+                return DeadlineExceeded(current_phase('generate'), deadline.budget)
+            # 连接失败或超时，计入代理的错误率和后端的熔断失败
+            proxy_manager.report(proxy_url, False, error=str(error))
+            breaker.record_failure(error)
+            backend.record(success=False)
+        elif isinstance(error, InternalServerError):
+            proxy_manager.report(proxy_url, True, time.monotonic() - started)
+            breaker.record_failure(error)
+            backend.record(success=False)
+        elif isinstance(error, RateLimitError):
+            # 该后端暂停到 Retry-After 之后，其他后端不受影响
+            proxy_manager.report(proxy_url, True, time.monotonic() - started)
+            breaker.record_success()
+            backend.record(success=False)
+            backend.limiter.block_for(parse_retry_after(error.response.headers) or self.retrying.policy.base_delay)
+        elif isinstance(error, DeadlineExceeded):
+            breaker.release()
+        else:
+            breaker.record_success()
+        return error
+
+    def _on_request_success(self, backend: LLMBackend, breaker: CircuitBreaker, proxy_url: Optional[str],
+                            latency: Optional[float], headers):
+        """记录成功的请求，并用响应的速率限制头校准后端的令牌桶"""
+        proxy_manager.report(proxy_url, True, latency)
+        breaker.record_success()
+        backend.record(latency, success=True)
+        backend.limiter.update_from_headers(headers)
+
+    def _request_completion(self, backend: LLMBackend, prompt: str, max_tokens: int = 300,
+                            temperature: float = 0.8, cancel_token: Optional[CancelToken] = None,
+                            model: Optional[str] = None) -> str:
+        """
+        在指定后端上发送一次 Chat Completions 请求（不重试）
+
+        每次请求都会按后端的速率限制获取额度、检查后端的熔断器、从代理池选择代理，
+        并按剩余的截止时间设置超时；成功响应的速率限制头用于校准后端的令牌桶。
+        需要支持取消时（对冲请求）使用流式响应，取消时关闭响应连接
+
+        Args:
+            backend: 后端
+            prompt: 提示词
+            max_tokens: 最大生成 token 数
+            temperature: 温度
+            cancel_token: 取消令牌，为 None 时使用普通响应
+            model: 模型名称，为 None 时使用后端配置的模型
+
+        Returns:
+            生成的内容
+
+        Raises:
+            DeadlineExceeded: 截止时间已到
+            CircuitOpenError: 后端熔断中
+            RequestCancelled: 请求被取消
+            openai.APIError: 请求失败
+        """
+        request_options, breaker = self._prepare_request(backend, prompt, max_tokens)
+        client, proxy_url = self._select_client(backend)
+        params = self._build_params(backend, prompt, max_tokens, temperature, model)
+        started = time.monotonic()
+        try:
+            if cancel_token is None:
+                # 使用原始响应以读取速率限制头
+                raw_response = client.chat.completions.with_raw_response.create(**request_options, **params)
+                headers = raw_response.headers
+                completion = raw_response.parse()
+                content = completion.choices[0].message.content if completion.choices else None
+            else:
+                # 对冲请求使用流式响应，被取消时关闭连接（响应头到达前无法中断）
+                stream = client.chat.completions.create(**request_options, **params, stream=True)
+                headers = stream.response.headers
+                cancel_token.on_cancel(stream.response.close)
+                content = self._read_stream(stream, cancel_token)
+        except BaseException as e:
+            error = self._on_request_error(e, backend, breaker, proxy_url, started)
+            if error is e:
+                raise
+            raise error from e
+        self._on_request_success(backend, breaker, proxy_url, time.monotonic() - started, headers)
+        return content or ''
+
+    def _generate_with_tier(self, prompt: str, tier: CascadeTier) -> str:
+        """
+        使用级联中的一级模型生成内容（按延迟路由、对冲，可重试的错误自动重试）
+
+        Args:
+            prompt: 提示词
+            tier: 级联层级
+
+        Returns:
+            生成的内容
+        """
+        return self.retrying.call(
+            lambda: self.router.execute(
+                lambda backend, cancel_token: self._request_completion(
+                    backend, prompt, tier.max_tokens, tier.temperature,
+                    cancel_token=cancel_token, model=tier.model
+                ),
+                names=tier.backends
+            )
+        )
+
+    def _request_embeddings(self, backend: LLMBackend, texts: List[str], model: str,
+                            dimensions: Optional[int] = None) -> List[List[float]]:
+        """
+        在指定后端上发送一次 Embeddings 请求（不重试），速率限制、熔断器、代理和超时的处理与 Chat Completions 相同
+
+        Args:
+            backend: 后端
+            texts: 文本列表
+            model: 嵌入模型
+            dimensions: 向量维度，为 None 时使用模型的默认维度
+
+        Returns:
+            与 texts 顺序一致的向量列表
+        """
+        request_options, breaker = self._prepare_request(backend, ''.join(texts), 0)
+        client, proxy_url = self._select_client(backend)
+        params = {'model': model, 'input': texts}
+        if dimensions:
+            # 固定版本的 openai 库没有 dimensions 参数，放在请求体中
+            params['extra_body'] = {'dimensions': dimensions}
+        started = time.monotonic()
+        try:
+            raw_response = client.embeddings.with_raw_response.create(**request_options, **params)
+            headers = raw_response.headers
+            response = raw_response.parse()
+        except BaseException as e:
+            error = self._on_request_error(e, backend, breaker, proxy_url, started)
+            if error is e:
+                raise
+            raise error from e
+        self._on_request_success(backend, breaker, proxy_url, time.monotonic() - started, headers)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed(self, texts: List[str], model: str = 'text-embedding-3-small', dimensions: Optional[int] = None,
+              backends: Optional[List[str]] = None) -> List[List[float]]:
+        """
+        计算文本的嵌入向量（按延迟路由，可重试的错误自动重试）
+
+        Args:
+            texts: 文本列表
+            model: 嵌入模型
+            dimensions: 向量维度，为 None 时使用模型的默认维度
+            backends: 只使用这些后端，为 None 时使用全部后端
+
+        Returns:
+            与 texts 顺序一致的向量列表
+
+        Raises:
+            openai.APIError: 请求失败
+        """
+        return self.retrying.call(
+            lambda: self.router.execute(
+                lambda backend, cancel_token: self._request_embeddings(backend, texts, model, dimensions),
+                names=backends
+            )
+        )
+
+    def generate_tweet(self, custom_prompt: Optional[str] = None, allow_long: bool = False) -> Optional[str]:
         """
         生成推文内容
 
+        先使用级联中最便宜的模型，结果未通过校验（长度、重复、禁用词）时才升级到更强的模型；
+        请求按延迟路由到后端，首选后端较慢时发送对冲请求；
+        可重试的错误（429、5xx、超时、连接失败）在截止时间内按退避时间自动重试
+
         Args:
             custom_prompt: 自定义提示词，如果不提供则使用配置文件中的默认提示词
+                （配置了 prompt_variants 时由提示词选择器按历史互动率选择变体）
+            allow_long: 是否允许超过单条推文的长度（推文串模式下由调用方拆分，不校验长度也不截断）
 
         Returns:
             生成的推文内容，失败时返回 None
@@ -65,63 +465,181 @@ class LLMClient:
 
         try:
             # 获取提示词
-            prompt = custom_prompt or self.openai_config.get('prompt_template', '')
+            variant = None
+            if custom_prompt:
+                prompt = custom_prompt
+            elif prompt_bandit.enabled:
+                variant = prompt_bandit.choose()
+                prompt = prompt_bandit.template(variant)
+                logger.info(f"使用提示词变体: {variant}")
+            else:
+                prompt = self.openai_config.get('prompt_template', '')
             if not prompt:
                 logger.error("未配置推文生成提示词")
                 return None
 
-            # 获取模型配置
-            model = self.openai_config.get('model', 'gpt-3.5-turbo')
-
-            logger.info(f"开始生成推文，使用模型: {model}")
+            tiers = ' -> '.join(tier.model or tier.name for tier in self.cascade.tiers)
+            models = ', '.join(f"{backend.name}/{backend.model}" for backend in self.router.rank())
+            logger.info(f"开始生成推文，模型级联: {tiers}，候选后端: {models}")
 
-            # 调用 OpenAI API (v1.x)
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=300,  # 限制生成长度
-                temperature=0.8,  # 增加创造性
-                top_p=1.0,
-                frequency_penalty=0.5,  # 减少重复
-                presence_penalty=0.5
+            tweet_content = self.cascade.run(
+                lambda tier: self._generate_with_tier(prompt, tier),
+                skip_checks=['length'] if allow_long else None
             )
 
             # 提取生成的内容
-            if response.choices and len(response.choices) > 0:
-                tweet_content = response.choices[0].message.content.strip()
-
-                # 验证推文长度（Twitter 限制 280 字符）
-                if len(tweet_content) > 280:
-                    logger.warning(f"生成的推文过长 ({len(tweet_content)} 字符)，尝试截断")
-                    tweet_content = tweet_content[:277] + "..."
+            if tweet_content:
+                # 验证推文长度（按 Twitter 的加权规则，超长时在句末或字素边界截断）
+                length = weighted_length(tweet_content)
+                if length > MAX_WEIGHTED_LENGTH and not allow_long:
+                    logger.warning(f"生成的推文过长 (加权长度 {length})，尝试截断")
+                    tweet_content = truncate_tweet(tweet_content, MAX_WEIGHTED_LENGTH)
+                    length = weighted_length(tweet_content)
 
-                logger.info(f"推文生成成功，长度: {len(tweet_content)} 字符")
+                logger.info(f"推文生成成功，长度: {length}（加权）")
                 logger.debug(f"生成的推文内容: {tweet_content}")
+                if variant:
+                    # 发送成功后按内容找回变体，等待互动数据计算奖励
+                    prompt_bandit.remember(tweet_content, variant)
 
                 return tweet_content
             else:
-                logger.error("OpenAI API 返回空响应")
+                logger.error("未生成可用的推文")
                 return None
 
+        except DeadlineExceeded:
+            # 交给调用方报告超时的阶段
+            raise
+        except CircuitOpenError as e:
+            logger.error(f"OpenAI API 暂时不可用，跳过生成: {e}")
+            return None
         except Exception as e:
-            # OpenAI v1.x 使用不同的异常类型
-            error_msg = str(e)
-            if "rate_limit" in error_msg.lower():
-                logger.error("OpenAI API 速率限制，请稍后重试")
-            elif "authentication" in error_msg.lower() or "api_key" in error_msg.lower():
+            # 按错误类型记录原因
+            kind = classify_error(e)
+            if kind == 'rate_limit':
+                logger.error("OpenAI API 速率限制，重试后仍失败，请稍后重试")
+            elif kind == 'auth':
                 logger.error("OpenAI API 认证失败，请检查 API Key")
+            elif kind == 'bad_request':
+                logger.error(f"OpenAI API 请求参数错误: {e}")
             else:
-                logger.error(f"生成推文时发生错误: {e}")
+                logger.error(f"生成推文时发生错误 ({kind}): {e}")
             return None
     
+    def stream_tweet(self, custom_prompt: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        流式生成推文，逐段返回生成的内容
+
+        使用级联第一级的模型（首字延迟最低），收到第一段内容前失败时转到下一个后端；
+        每收到一段内容就按加权长度检查，超过上限时立即停止上游请求；
+        调用方停止迭代（如客户端断开）时关闭上游连接
+
+        Args:
+            custom_prompt: 自定义提示词，如果不提供则使用配置文件中的默认提示词
+
+        Yields:
+            事件字典，event 为 start / delta / done / error
+        """
+        if not self.client:
+            yield {'event': 'error', 'message': 'OpenAI 客户端未初始化'}
+            return
+        prompt = custom_prompt or self.openai_config.get('prompt_template', '')
+        if not prompt:
+            yield {'event': 'error', 'message': '未配置推文生成提示词'}
+            return
+
+        tier = self.cascade.tiers[0]
+        max_length = self.cascade.validator.max_length
+        with self._stream_lock:
+            self.stream_stats['requests'] += 1
+
+        # 1. 打开上游流式响应（失败时转到下一个后端）
+        stream = None
+        last_error = None
+        for backend in self.router.rank(tier.backends):
+            try:
+                request_options, breaker = self._prepare_request(backend, prompt, tier.max_tokens)
+            except Exception as e:
+                last_error = e
+                continue
+            client, proxy_url = self._select_client(backend)
+            params = self._build_params(backend, prompt, tier.max_tokens, tier.temperature, tier.model)
+            started = time.monotonic()
+            try:
+                stream = client.chat.completions.create(**request_options, **params, stream=True)
+                break
+            except Exception as e:
+                last_error = self._on_request_error(e, backend, breaker, proxy_url, started)
+                logger.warning(f"LLM 后端 {backend.name} 流式请求失败: {last_error}")
+        if stream is None:
+            with self._stream_lock:
+                self.stream_stats['failed'] += 1
+            logger.error(f"流式生成推文失败: {last_error}")
+            yield {'event': 'error', 'message': f'生成推文失败: {last_error}'}
+            return
+
+        # 2. 逐段转发内容，超过加权长度上限时停止（超出的一段不转发，完整内容在 done 事件中截断）
+        parts = []
+        truncated = False
+        finished = False
+        first_token_at = None
+        try:
+            yield {'event': 'start', 'backend': backend.name, 'model': tier.model or backend.model}
+            for text in self._iter_stream(stream):
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                parts.append(text)
+                if weighted_length(''.join(parts)) > max_length:
+                    truncated = True
+                    break
+                yield {'event': 'delta', 'text': text}
+            finished = True
+        except Exception as e:
+            finished = True
+            self._on_request_error(e, backend, breaker, proxy_url, started)
+            with self._stream_lock:
+                self.stream_stats['failed'] += 1
+            logger.error(f"读取流式响应失败: {e}")
+            yield {'event': 'error', 'message': f'读取生成结果失败: {e}'}
+            return
+        finally:
+            stream.response.close()
+            if not finished:
+                # 客户端断开，上游请求随连接关闭一起取消
+                breaker.release()
+                backend.record_cancelled()
+                with self._stream_lock:
+                    self.stream_stats['disconnected'] += 1
+                logger.info("客户端已断开，取消上游流式请求")
+
+        elapsed = time.monotonic() - started
+        # 截断时提前结束了请求，耗时不计入后端的延迟分位数
+        self._on_request_success(backend, breaker, proxy_url, None if truncated else elapsed, stream.response.headers)
+
+        content = ''.join(parts).strip()
+        if truncated:
+            logger.warning(f"流式生成的推文超过加权长度 {max_length}，已停止生成并截断")
+            content = truncate_tweet(content, max_length)
+        ttft = first_token_at - started if first_token_at is not None else None
+        with self._stream_lock:
+            self.stream_stats['completed'] += 1
+            self.stream_stats['truncated'] += truncated
+            if ttft is not None:
+                self.stream_stats['ttft_seconds'] += ttft
+                self.stream_stats['ttft_samples'] += 1
+        yield {
+            'event': 'done',
+            'content': content,
+            'length': weighted_length(content),
+            'truncated': truncated,
+            'validation': self.cascade.validator.validate(content),
+            'ttft_ms': round(ttft * 1000, 1) if ttft is not None else None,
+            'elapsed_ms': round(elapsed * 1000, 1)
+        }
+
     def generate_multiple_tweets(self, count: int = 3) -> list:
         """
-        生成多条推文供选择
+        并行生成多条推文供选择（截止时间通过 contextvars 传递给各生成线程）
         
         Args:
             count: 生成推文数量
@@ -129,15 +647,24 @@ class LLMClient:
         Returns:
             推文内容列表
         """
+        if count <= 0:
+            return []
         tweets = []
-        
-        for i in range(count):
-            logger.info(f"生成第 {i+1}/{count} 条推文")
-            tweet = self.generate_tweet()
-            if tweet:
-                tweets.append(tweet)
-            else:
-                logger.warning(f"第 {i+1} 条推文生成失败")
+
+        with ThreadPoolExecutor(max_workers=count, thread_name_prefix='llm-draft') as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self.generate_tweet) for _ in range(count)]
+            for i, future in enumerate(futures):
+                try:
+                    tweet = future.result()
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    logger.warning(f"第 {i+1} 条推文生成失败: {e}")
+                    continue
+                if tweet:
+                    tweets.append(tweet)
+                else:
+                    logger.warning(f"第 {i+1} 条推文生成失败")
         
         logger.info(f"成功生成 {len(tweets)}/{count} 条推文")
         return tweets
@@ -156,7 +683,7 @@ class LLMClient:
         try:
             # 发送一个简单的请求来验证 API Key
             response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
+                model=self.router.backends[0].model,
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=5
             )
@@ -0,0 +1,250 @@
+"""
+近似重复检测模块
+对已发送推文的字符 shingle 计算 MinHash 签名，按 LSH 分段放入哈希桶：
+检查新推文时只与落入相同桶的候选比较签名，不随历史推文数量线性增长；
+签名按定长记录追加写入索引文件，启动时加载并重建哈希桶；本地推文存储中尚未加入索引的推文
+（时间线同步、回填或在其他地方发送的推文）在首次使用和每次同步时间线后补充
+"""
+
+import os
+import struct
+import threading
+import zlib
+from collections import defaultdict
+from typing import Optional, List, Dict, Any, Tuple
+import numpy as np
+from utils.config_loader import config_loader
+from utils.logger import logger
+from llm.validators import normalize_text
+
+
+# 梅森素数 2^31 - 1，哈希值取低 31 位使乘积不超出 uint64
+_PRIME = (1 << 31) - 1
+_MAGIC = b'MHX1'
+_HEADER = struct.Struct('<4sIII')
+
+
+class NearDuplicateIndex:
+    """MinHash / LSH 近似重复索引类"""
+
+    def __init__(self, index_config: Optional[dict] = None):
+        """
+        初始化索引（首次检查时才加载索引文件）
+
+        Args:
+            index_config: 索引配置，为 None 时使用配置（openai.validation.near_duplicate）
+        """
+        if index_config is None:
+            validation_config = config_loader.get_openai_config().get('validation') or {}
+            index_config = validation_config.get('near_duplicate') or {}
+        self.enabled = index_config.get('enabled', True)
+        self.path = index_config.get('index_path', 'data/near_duplicate.idx')
+        # 估计的 Jaccard 相似度达到该值时视为重复
+        self.threshold = index_config.get('threshold', 0.7)
+        self.num_perm = index_config.get('num_perm', 128)
+        self.bands = index_config.get('bands', 32)
+        if self.num_perm % self.bands:
+            raise ValueError(f"num_perm ({self.num_perm}) 必须是 bands ({self.bands}) 的整数倍")
+        self.rows = self.num_perm // self.bands
+        self.shingle_size = index_config.get('shingle_size', 3)
+        self.seed = index_config.get('seed', 1)
+
+        rng = np.random.default_rng(self.seed)
+        self._a = rng.integers(1, _PRIME, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=self.num_perm, dtype=np.uint64)
+        self._record = np.dtype([('tweet_id', '<i8'), ('signature', '<u4', (self.num_perm,))])
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._signatures: List[np.ndarray] = []
+        self._tweet_ids: List[int] = []
+        self._indexed = set()
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(self.bands)]
+        self.stats = {'checks': 0, 'candidates': 0, 'duplicates': 0, 'added': 0}
+
+    def _shingles(self, content: str) -> np.ndarray:
+        """规范化后的字符 shingle 的哈希值（低 31 位）"""
+        text = normalize_text(content)
+        k = self.shingle_size
+        grams = {text[i:i + k] for i in range(len(text) - k + 1)} if len(text) >= k else {text}
+        return np.fromiter((zlib.crc32(gram.encode('utf-8')) & _PRIME for gram in grams),
+                           dtype=np.uint64, count=len(grams))
+
+    def signature(self, content: str) -> np.ndarray:
+        """
+        计算 MinHash 签名
+
+        Args:
+            content: 推文内容
+
+        Returns:
+            长度为 num_perm 的 uint32 数组
+        """
+        shingles = self._shingles(content)
+        hashed = (np.outer(shingles, self._a) + self._b) % _PRIME
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        """签名按 LSH 分段后的桶键"""
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _insert(self, tweet_id: int, signature: np.ndarray):
+        """加入内存中的索引（调用方需持有锁）"""
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        self._tweet_ids.append(tweet_id)
+        self._indexed.add(tweet_id)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band][key].append(position)
+
+    def _ensure_loaded(self):
+        """首次使用时加载索引文件，并加入本地推文存储中尚未加入索引的推文（调用方需持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self._load_file()
+        try:
+            from twitter.tweet_store import tweet_store
+            added = self._import(tweet_store.texts())
+        except Exception as e:
+            logger.warning(f"从本地推文存储补充近似重复索引失败: {e}")
+            return
+        if added:
+            logger.info(f"近似重复索引已导入 {added} 条历史推文")
+
+    def _load_file(self):
+        """加载索引文件（调用方需持有锁），参数不一致或文件不存在时重新建立"""
+        header = _HEADER.pack(_MAGIC, self.num_perm, self.shingle_size, self.seed)
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    matched = f.read(_HEADER.size) == header
+                    data = f.read() if matched else b''
+                if matched:
+                    count = len(data) // self._record.itemsize
+                    if len(data) % self._record.itemsize:
+                        # 截掉写到一半的最后一条记录，之后追加的记录才能对齐
+                        os.truncate(self.path, _HEADER.size + count * self._record.itemsize)
+                    records = np.frombuffer(data[:count * self._record.itemsize], dtype=self._record)
+                    for record in records:
+                        self._insert(int(record['tweet_id']), record['signature'].copy())
+                    logger.info(f"已加载近似重复索引: {count} 条推文")
+                    return
+                logger.warning("近似重复索引的参数已变化，重新建立索引")
+            except OSError as e:
+                logger.warning(f"加载近似重复索引失败，重新建立索引: {e}")
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path, 'wb') as f:
+            f.write(header)
+
+    def _import(self, texts: Dict[int, str]) -> int:
+        """加入尚未加入索引的推文（调用方需持有锁），返回加入的推文数"""
+        items = [(tweet_id, self.signature(text)) for tweet_id, text in sorted(texts.items())
+                 if tweet_id not in self._indexed]
+        if items:
+            self._append(items)
+        return len(items)
+
+    def sync(self, tweet_store=None) -> int:
+        """
+        把本地推文存储中尚未加入索引的推文加入索引（时间线同步或回填后调用）
+
+        Args:
+            tweet_store: 本地推文存储，为 None 时使用全局实例
+
+        Returns:
+            本次加入的推文数
+        """
+        if not self.enabled:
+            return 0
+        if tweet_store is None:
+            from twitter.tweet_store import tweet_store
+        texts = tweet_store.texts()
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                added = self._import(texts)
+            except OSError as e:
+                logger.warning(f"写入近似重复索引失败: {e}")
+                return 0
+        if added:
+            logger.info(f"近似重复索引新增 {added} 条推文")
+        return added
+
+    def _append(self, items: List[Tuple[int, np.ndarray]]):
+        """写入索引文件并加入内存索引（调用方需持有锁）"""
+        records = np.zeros(len(items), dtype=self._record)
+        for row, (tweet_id, signature) in enumerate(items):
+            records[row] = (tweet_id, signature)
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+        for tweet_id, signature in items:
+            self._insert(tweet_id, signature)
+
+    def add(self, content: str, tweet_id: Optional[str] = None):
+        """
+        加入一条已发送的推文
+
+        Args:
+            content: 推文内容
+            tweet_id: 推文 ID
+        """
+        if not self.enabled:
+            return
+        signature = self.signature(content)
+        with self._lock:
+            self._ensure_loaded()
+            try:
+                self._append([(int(tweet_id) if tweet_id else 0, signature)])
+            except OSError as e:
+                logger.warning(f"写入近似重复索引失败: {e}")
+                self._insert(int(tweet_id) if tweet_id else 0, signature)
+            self.stats['added'] += 1
+
+    def find(self, content: str) -> Optional[Dict[str, Any]]:
+        """
+        查找与内容近似重复的已发送推文
+
+        Args:
+            content: 推文内容
+
+        Returns:
+            {'tweet_id', 'similarity'}（相似度最高的一条），没有时返回 None
+        """
+        signature = self.signature(content)
+        with self._lock:
+            self._ensure_loaded()
+            self.stats['checks'] += 1
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+            self.stats['candidates'] += len(candidates)
+            best = None
+            for position in candidates:
+                similarity = float(np.count_nonzero(self._signatures[position] == signature)) / self.num_perm
+                if similarity >= self.threshold and (best is None or similarity > best['similarity']):
+                    best = {'tweet_id': str(self._tweet_ids[position]), 'similarity': round(similarity, 3)}
+            if best:
+                self.stats['duplicates'] += 1
+            return best
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取索引状态"""
+        with self._lock:
+            if self.enabled:
+                self._ensure_loaded()
+            return {
+                'enabled': self.enabled,
+                'tweets': len(self._signatures),
+                'threshold': self.threshold,
+                'num_perm': self.num_perm,
+                'bands': self.bands,
+                **self.stats
+            }
+
+
+# 全局近似重复索引实例
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,207 @@
+"""
+提示词选择模块
+配置多个提示词变体（openai.prompt_variants）时，用 Thompson 采样的多臂老虎机选择 generate_tweet 使用的提示词：
+每个变体维护一个 Beta 后验，选择时从各后验中采样一次，取最大者；
+推文发送后满 horizon_hours 时按互动率计算奖励并更新后验，状态持久化到 JSON 文件
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any
+from utils.config_loader import config_loader
+from utils.logger import logger
+from llm.validators import normalize_text
+
+
+class PromptBandit:
+    """提示词变体选择器类（Thompson 采样）"""
+
+    def __init__(self, variants: Optional[List[dict]] = None, bandit_config: Optional[dict] = None):
+        """
+        初始化选择器
+
+        Args:
+            variants: 提示词变体列表 [{'name', 'template'}]，为 None 时使用配置（openai.prompt_variants）
+            bandit_config: 选择器配置，为 None 时使用配置（openai.prompt_bandit）
+        """
+        openai_config = config_loader.get_openai_config()
+        if variants is None:
+            variants = openai_config.get('prompt_variants') or []
+        if bandit_config is None:
+            bandit_config = openai_config.get('prompt_bandit') or {}
+        self.templates = OrderedDict(
+            (variant['name'], variant['template']) for variant in variants if variant.get('template')
+        )
+        self.path = bandit_config.get('state_path', 'data/prompt_bandit.json')
+        # 按推文发送后这么久的互动率计算奖励
+        self.horizon_hours = bandit_config.get('horizon_hours', 24)
+        # 互动率达到该值时奖励为 1（奖励 = min(互动率 / reward_scale, 1)）
+        self.reward_scale = bandit_config.get('reward_scale', 0.05)
+        self.prior_alpha = bandit_config.get('prior_alpha', 1.0)
+        self.prior_beta = bandit_config.get('prior_beta', 1.0)
+        # 超过该时间仍没有指标的推文（如已删除）不再等待
+        self.pending_ttl_hours = bandit_config.get('pending_ttl_hours', 168)
+
+        self._lock = threading.Lock()
+        self._arms: Dict[str, Dict[str, float]] = {}
+        # 已发送、等待奖励的推文 {推文 ID: {'variant', 'posted_at'}}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # 最近生成的内容对应的变体（发送时按内容找回变体）
+        self._generated: OrderedDict = OrderedDict()
+        self._load()
+        for name in self.templates:
+            self._arms.setdefault(name, self._new_arm())
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了提示词变体"""
+        return bool(self.templates)
+
+    def _new_arm(self) -> Dict[str, float]:
+        """新变体的初始状态（先验）"""
+        return {'alpha': self.prior_alpha, 'beta': self.prior_beta, 'pulls': 0, 'rewards': 0}
+
+    def _load(self):
+        """从文件加载状态"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self._arms = state.get('arms') or {}
+            self._pending = state.get('pending') or {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载提示词选择器状态失败: {e}")
+
+    def _save(self):
+        """写入文件（调用方需持有锁）"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'arms': self._arms, 'pending': self._pending}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def choose(self) -> Optional[str]:
+        """
+        选择一个提示词变体（从每个变体的 Beta 后验中采样，取最大者）
+
+        Returns:
+            变体名，未配置变体时返回 None
+        """
+        with self._lock:
+            best = None
+            best_sample = -1.0
+            for name in self.templates:
+                arm = self._arms[name]
+                sample = random.betavariate(arm['alpha'], arm['beta'])
+                if sample > best_sample:
+                    best, best_sample = name, sample
+            return best
+
+    def template(self, name: str) -> str:
+        """获取变体的提示词"""
+        return self.templates[name]
+
+    def remember(self, content: str, name: str, max_items: int = 200):
+        """
+        记录生成的内容来自哪个变体（发送成功时调用 record_post 找回）
+
+        Args:
+            content: 生成的推文内容
+            name: 变体名
+            max_items: 最多保留的记录数
+        """
+        with self._lock:
+            self._generated[normalize_text(content)] = name
+            while len(self._generated) > max_items:
+                self._generated.popitem(last=False)
+
+    def record_post(self, content: str, tweet_id: str):
+        """
+        记录已发送的推文（内容来自某个变体时，等待其互动数据后计算奖励）
+
+        Args:
+            content: 推文内容
+            tweet_id: 推文 ID
+        """
+        with self._lock:
+            name = self._generated.pop(normalize_text(content), None)
+            if name is None or name not in self._arms:
+                return
+            self._arms[name]['pulls'] += 1
+            self._pending[str(tweet_id)] = {'variant': name, 'posted_at': time.time()}
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"保存提示词选择器状态失败: {e}")
+
+    def update_rewards(self, metrics_store) -> int:
+        """
+        用已满 horizon_hours 的推文的互动率更新后验（每条推文只计算一次）
+
+        Args:
+            metrics_store: 推文指标时序存储
+
+        Returns:
+            本次计算奖励的推文数
+        """
+        from twitter.metrics_store import engagement_of
+
+        with self._lock:
+            expire_before = time.time() - (self.horizon_hours + self.pending_ttl_hours) * 3600
+            expired = [tweet_id for tweet_id, item in self._pending.items() if item['posted_at'] < expire_before]
+            for tweet_id in expired:
+                del self._pending[tweet_id]
+            if not self._pending:
+                return 0
+            tweet_ids = [int(tweet_id) for tweet_id in self._pending]
+        values = metrics_store.values_at(self.horizon_hours * 3600, tweet_ids=tweet_ids)
+        if not values:
+            return 0
+
+        with self._lock:
+            for tweet_id, metrics in values.items():
+                item = self._pending.pop(str(tweet_id), None)
+                name = item['variant'] if item else None
+                if name not in self._arms:
+                    continue
+                impressions = metrics.get('impression_count') or 0
+                if not impressions:
+                    # 没有曝光数据时无法计算互动率，不计奖励
+                    continue
+                rate = engagement_of(metrics) / impressions
+                reward = min(rate / self.reward_scale, 1.0) if self.reward_scale else 0.0
+                arm = self._arms[name]
+                arm['alpha'] += reward
+                arm['beta'] += 1.0 - reward
+                arm['rewards'] += 1
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"保存提示词选择器状态失败: {e}")
+        logger.info(f"提示词选择器更新了 {len(values)} 条推文的奖励")
+        return len(values)
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取各变体的后验和选择次数"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._pending),
+                'variants': [{
+                    'name': name,
+                    'pulls': self._arms[name]['pulls'],
+                    'rewards': self._arms[name]['rewards'],
+                    'mean': round(self._arms[name]['alpha'] / (self._arms[name]['alpha'] + self._arms[name]['beta']), 4)
+                } for name in self.templates]
+            }
+
+
+# 全局提示词选择器实例
+prompt_bandit = PromptBandit()
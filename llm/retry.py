@@ -0,0 +1,375 @@
+"""
+LLM 请求重试模块
+按类型区分 OpenAI 错误，遵循 Retry-After 和速率限制重置头，在截止时间内使用去相关抖动退避重试；
+所有调用方共享按分钟计的请求数 / token 数令牌桶，收到 429 后统一暂停，避免并发调用同时冲击 API
+"""
+
+import email.utils
+import random
+import re
+import threading
+import time
+from typing import Optional, Callable, Any, Dict
+from openai import (
+    APIConnectionError, APITimeoutError, APIStatusError, RateLimitError, InternalServerError,
+    ConflictError, AuthenticationError, PermissionDeniedError, BadRequestError, NotFoundError,
+    UnprocessableEntityError
+)
+from utils.deadline import get_deadline, current_phase, DeadlineExceeded
+from utils.logger import logger
+
+
+# 错误分类: 前四类可以重试
+RETRYABLE_ERRORS = ('rate_limit', 'server', 'timeout', 'connection')
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    按类型区分 OpenAI 错误
+
+    Returns:
+        rate_limit / server / timeout / connection / auth / bad_request / other
+    """
+    if isinstance(error, RateLimitError):
+        return 'rate_limit'
+    if isinstance(error, (InternalServerError, ConflictError)):
+        return 'server'
+    if isinstance(error, APITimeoutError):
+        return 'timeout'
+    if isinstance(error, APIConnectionError):
+        return 'connection'
+    if isinstance(error, (AuthenticationError, PermissionDeniedError)):
+        return 'auth'
+    if isinstance(error, (BadRequestError, NotFoundError, UnprocessableEntityError)):
+        return 'bad_request'
+    if isinstance(error, APIStatusError):
+        # 其余状态码: 408 / 5xx 按服务端错误重试
+        if error.status_code == 408 or error.status_code >= 500:
+            return 'server'
+    return 'other'
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    解析 OpenAI 速率限制重置时间，如 "1s"、"6m0s"、"20ms"、"1h2m3.5s"
+
+    Returns:
+        秒数，格式无法识别时返回 None
+    """
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value:
+        return None
+    units = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    从响应头中解析需要等待的时间
+
+    依次检查 retry-after-ms、retry-after（秒数或 HTTP 日期），
+    以及剩余额度为 0 时的 x-ratelimit-reset-requests / x-ratelimit-reset-tokens
+
+    Args:
+        headers: 响应头（不区分大小写的映射）
+
+    Returns:
+        等待秒数，没有相关响应头时返回 None
+    """
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            date_tuple = email.utils.parsedate_tz(retry_after)
+            if date_tuple is not None:
+                return max(email.utils.mktime_tz(date_tuple) - time.time(), 0.0)
+
+    waits = []
+    for kind in ('requests', 'tokens'):
+        remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+        reset = headers.get(f'x-ratelimit-reset-{kind}')
+        if reset and remaining is not None and remaining.strip() == '0':
+            seconds = parse_duration(reset)
+            if seconds is not None:
+                waits.append(seconds)
+    return max(waits) if waits else None
+
+
+class TokenBucket:
+    """令牌桶类（按分钟补充）"""
+
+    def __init__(self, per_minute: float):
+        """
+        初始化令牌桶
+
+        Args:
+            per_minute: 每分钟的额度（同时也是桶容量）
+        """
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        """补充令牌（调用方需持有锁）"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """获取额度足够前需要等待的时间（调用方需持有锁并已补充令牌）"""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def set_remaining(self, remaining: float):
+        """按服务端报告的剩余额度校准（只向下校准）"""
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class RateLimiter:
+    """共享速率限制器类 - 每分钟请求数（RPM）和 token 数（TPM）"""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        """
+        初始化速率限制器
+
+        Args:
+            requests_per_minute: 每分钟请求数上限，为空时不限制
+            tokens_per_minute: 每分钟 token 数上限，为空时不限制
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._condition = threading.Condition()
+        self._blocked_until = 0.0
+        self.stats = {'acquired': 0, 'waited': 0, 'wait_seconds': 0.0, 'blocked': 0}
+
+    def acquire(self, tokens: float = 0, timeout: Optional[float] = None) -> bool:
+        """
+        获取一次请求的额度，额度不足或处于 429 暂停期时等待
+
+        Args:
+            tokens: 本次请求预计消耗的 token 数
+            timeout: 最长等待时间（秒），为 None 时一直等待
+
+        Returns:
+            是否在超时前获取到额度
+        """
+        started = time.monotonic()
+        give_up_at = None if timeout is None else started + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                wait = max(self._blocked_until - now, 0.0)
+                if self.requests:
+                    self.requests.refill(now)
+                    wait = max(wait, self.requests.wait_time(1))
+                if self.tokens and tokens:
+                    self.tokens.refill(now)
+                    wait = max(wait, self.tokens.wait_time(tokens))
+
+                if wait <= 0:
+                    if self.requests:
+                        self.requests.tokens -= 1
+                    if self.tokens and tokens:
+                        self.tokens.tokens -= min(tokens, self.tokens.capacity)
+                    self.stats['acquired'] += 1
+                    waited = now - started
+                    if waited > 0.001:
+                        self.stats['waited'] += 1
+                        self.stats['wait_seconds'] += waited
+                    return True
+
+                if give_up_at is not None:
+                    if now + wait > give_up_at:
+                        return False
+                self._condition.wait(wait)
+
+    def block_for(self, seconds: float):
+        """
+        收到 429 后暂停所有调用方（取已有暂停期和新暂停期中较晚的一个）
+
+        Args:
+            seconds: 暂停秒数
+        """
+        with self._condition:
+            until = time.monotonic() + seconds
+            if until > self._blocked_until:
+                self._blocked_until = until
+                self.stats['blocked'] += 1
+            self._condition.notify_all()
+
+    def update_from_headers(self, headers):
+        """按响应头中的剩余额度校准令牌桶"""
+        if not headers:
+            return
+        with self._condition:
+            now = time.monotonic()
+            for bucket, name in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+                remaining = headers.get(f'x-ratelimit-remaining-{name}')
+                if bucket is None or remaining is None:
+                    continue
+                try:
+                    bucket.refill(now)
+                    bucket.set_remaining(float(remaining))
+                except ValueError:
+                    continue
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取速率限制器状态"""
+        with self._condition:
+            now = time.monotonic()
+            status = dict(self.stats)
+            status['wait_seconds'] = round(status['wait_seconds'], 3)
+            status['blocked_for_seconds'] = round(max(self._blocked_until - now, 0.0), 2)
+            for bucket, name in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+                if bucket is not None:
+                    bucket.refill(now)
+                    status[f'{name}_available'] = round(bucket.tokens, 1)
+                    status[f'{name}_per_minute'] = bucket.capacity
+            return status
+
+
+class RetryPolicy:
+    """重试策略类 - 去相关抖动退避（decorrelated jitter）"""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 max_retry_after: float = 60.0):
+        """
+        初始化重试策略
+
+        Args:
+            max_attempts: 最多尝试次数（含第一次）
+            base_delay: 最小退避时间（秒）
+            max_delay: 最大退避时间（秒）
+            max_retry_after: 服务端要求等待的时间超过该值时不再重试
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def next_delay(self, previous_delay: float) -> float:
+        """
+        计算下一次退避时间: min(max_delay, random(base, previous * 3))
+
+        Args:
+            previous_delay: 上一次的退避时间
+        """
+        return min(self.max_delay, random.uniform(self.base_delay, max(previous_delay, self.base_delay) * 3))
+
+
+class RetryingCaller:
+    """带重试和共享速率限制的调用器类"""
+
+    def __init__(self, policy: RetryPolicy, limiter: Optional[RateLimiter] = None, name: str = 'openai'):
+        """
+        初始化调用器
+
+        Args:
+            policy: 重试策略
+            limiter: 共享速率限制器，为 None 时由每次请求自行限速（如每个后端各自的限制器）
+            name: 上游名称（用于日志）
+        """
+        self.policy = policy
+        self.limiter = limiter
+        self.name = name
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'attempts': 0, 'retries': 0, 'gave_up': 0, 'errors': {}}
+
+    def _count_error(self, kind: str):
+        with self._lock:
+            self.stats['errors'][kind] = self.stats['errors'].get(kind, 0) + 1
+
+    def call(self, func: Callable[[], Any], estimated_tokens: float = 0) -> Any:
+        """
+        调用 func，可重试的错误在截止时间内按退避时间重试
+
+        Args:
+            func: 执行一次请求的函数（无参数）
+            estimated_tokens: 本次请求预计消耗的 token 数（用于 TPM 限制）
+
+        Returns:
+            func 的返回值
+
+        Raises:
+            DeadlineExceeded: 等待额度或退避时超出截止时间
+            最后一次请求的异常: 不可重试的错误或重试次数用完
+        """
+        with self._lock:
+            self.stats['calls'] += 1
+        delay = self.policy.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            deadline = get_deadline()
+            wait_limit = None if deadline is None else max(deadline.remaining(), 0.0)
+            if self.limiter is not None and not self.limiter.acquire(estimated_tokens, timeout=wait_limit):
+                raise DeadlineExceeded(current_phase('generate'), deadline.budget)
+
+            with self._lock:
+                self.stats['attempts'] += 1
+            try:
+                return func()
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                self._count_error(kind)
+                if kind not in RETRYABLE_ERRORS or attempt >= self.policy.max_attempts:
+                    raise
+
+                headers = getattr(getattr(e, 'response', None), 'headers', None)
+                retry_after = parse_retry_after(headers)
+                if retry_after is not None and retry_after > self.policy.max_retry_after:
+                    logger.warning(f"{self.name} 要求等待 {retry_after:.0f} 秒，超过上限，不再重试")
+                    raise
+
+                delay = self.policy.next_delay(delay)
+                wait = max(delay, retry_after or 0.0)
+                if kind == 'rate_limit':
+                    if self.limiter is None:
+                        # 由请求自身的限制器暂停（其他后端仍可立即重试）
+                        wait = 0.0
+                    else:
+                        # 所有调用方一起暂停，避免同时重试
+                        self.limiter.block_for(wait)
+
+                deadline = get_deadline()
+                if deadline is not None and wait >= deadline.remaining():
+                    with self._lock:
+                        self.stats['gave_up'] += 1
+                    logger.warning(f"{self.name} 请求失败 ({kind})，剩余时间不足以等待 {wait:.1f} 秒后重试")
+                    raise
+
+                with self._lock:
+                    self.stats['retries'] += 1
+                logger.warning(f"{self.name} 请求失败 ({kind}: {e})，{wait:.1f} 秒后进行第 {attempt + 1} 次尝试")
+                if kind != 'rate_limit':
+                    # 429 的等待在下一次获取额度时进行
+                    time.sleep(wait)
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取重试统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['errors'] = dict(self.stats['errors'])
+        if self.limiter is not None:
+            stats['rate_limiter'] = self.limiter.get_status()
+        return stats
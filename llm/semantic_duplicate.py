@@ -0,0 +1,337 @@
+"""
+语义重复检测模块
+字面不同但意思相同的推文（改写）用 MinHash 检查不出来：每条已发送的推文只计算一次嵌入向量，
+按行追加到 float32 矩阵文件中，用内存映射分块读取，新推文与最近 window_months 个月的推文计算余弦相似度；
+嵌入向量按内容哈希缓存（候选推文检查时计算的向量在发送后直接写入矩阵），默认不启用
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Callable, Tuple
+import numpy as np
+from utils.config_loader import config_loader
+from utils.logger import logger
+from llm.validators import normalize_text
+
+
+class SemanticDuplicateIndex:
+    """语义重复索引类（内存映射的嵌入向量矩阵）"""
+
+    def __init__(self, index_config: Optional[dict] = None):
+        """
+        初始化索引（首次使用时才加载矩阵文件）
+
+        Args:
+            index_config: 索引配置，为 None 时使用配置（openai.validation.semantic_duplicate）
+        """
+        if index_config is None:
+            validation_config = config_loader.get_openai_config().get('validation') or {}
+            index_config = validation_config.get('semantic_duplicate') or {}
+        self.enabled = index_config.get('enabled', False)
+        self.directory = index_config.get('index_dir', 'data/semantic_index')
+        self.model = index_config.get('model', 'text-embedding-3-small')
+        # 向量维度（text-embedding-3 系列支持缩短），为 None 时使用模型的默认维度
+        self.dimensions = index_config.get('dimensions', 256)
+        # 只使用这些后端计算嵌入，为 None 时使用全部后端
+        self.backends = index_config.get('backends')
+        # 余弦相似度达到该值时视为重复
+        self.threshold = index_config.get('threshold', 0.9)
+        self.window_months = index_config.get('window_months', 6)
+        self.batch_size = index_config.get('batch_size', 100)
+        # 每次同步最多计算的推文数（首次导入历史推文时分多次完成）
+        self.max_per_sync = index_config.get('max_per_sync', 1000)
+        self.sync_interval_minutes = index_config.get('sync_interval_minutes', 30)
+        # 每次从矩阵文件读取的行数
+        self.chunk_rows = index_config.get('chunk_rows', 65536)
+        self.cache_size = index_config.get('cache_size', 256)
+
+        self._vectors_path = os.path.join(self.directory, 'vectors.f32')
+        self._rows_path = os.path.join(self.directory, 'rows.bin')
+        self._meta_path = os.path.join(self.directory, 'meta.json')
+        self._record = np.dtype([('tweet_id', '<i8'), ('posted_at', '<f8'), ('digest', 'S16')])
+
+        self._lock = threading.Lock()
+        self._embedder: Optional[Callable[..., List[List[float]]]] = None
+        self._loaded = False
+        self._dim: Optional[int] = None
+        self._count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._records: Optional[np.memmap] = None
+        # 已写入矩阵的内容哈希 -> 行号，推文 ID 集合
+        self._digests: Dict[bytes, int] = {}
+        self._tweet_ids = set()
+        # 最近检查过的候选推文的向量（内容哈希 -> 向量）
+        self._drafts: OrderedDict = OrderedDict()
+        self.stats = {'checks': 0, 'cache_hits': 0, 'embedded': 0, 'duplicates': 0, 'errors': 0}
+
+    def set_embedder(self, embedder: Callable[..., List[List[float]]]):
+        """
+        设置计算嵌入向量的函数（LLM 客户端的 embed）
+
+        Args:
+            embedder: embedder(texts, model=..., dimensions=..., backends=...) -> 向量列表
+        """
+        self._embedder = embedder
+
+    @staticmethod
+    def digest(content: str) -> bytes:
+        """内容哈希（规范化文本的 SHA-256 前 16 字节）"""
+        return hashlib.sha256((normalize_text(content) or content).encode('utf-8')).digest()[:16]
+
+    def _window_start(self) -> float:
+        """比较窗口的起始时间戳"""
+        return time.time() - self.window_months * 30 * 86400
+
+    def _reset(self):
+        """删除矩阵文件（调用方需持有锁）"""
+        for path in (self._vectors_path, self._rows_path, self._meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _map(self):
+        """重新映射矩阵文件（调用方需持有锁）"""
+        if self._count and self._dim:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(self._count, self._dim))
+            self._records = np.memmap(self._rows_path, dtype=self._record, mode='r', shape=(self._count,))
+        else:
+            self._vectors = self._records = None
+
+    def _ensure_loaded(self):
+        """加载矩阵文件（调用方需持有锁），模型或维度变化时重新建立"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('model') != self.model or meta.get('dimensions') != self.dimensions:
+                logger.warning("语义重复索引的嵌入模型已变化，重新建立索引")
+                self._reset()
+                return
+            self._dim = meta['dim']
+            row_bytes = self._dim * 4
+            vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+            record_rows = os.path.getsize(self._rows_path) // self._record.itemsize if os.path.exists(self._rows_path) else 0
+            # 两个文件的行数以较少的为准（写到一半时中断）
+            self._count = min(vector_rows, record_rows)
+            for path, size in ((self._vectors_path, self._count * row_bytes),
+                               (self._rows_path, self._count * self._record.itemsize)):
+                if os.path.exists(path) and os.path.getsize(path) != size:
+                    os.truncate(path, size)
+            self._map()
+            if self._count:
+                for row, (tweet_id, digest) in enumerate(zip(self._records['tweet_id'].tolist(),
+                                                             self._records['digest'].tolist())):
+                    self._digests[digest] = row
+                    self._tweet_ids.add(tweet_id)
+            logger.info(f"已加载语义重复索引: {self._count} 条推文，{self._dim} 维")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"加载语义重复索引失败，重新建立索引: {e}")
+            self._dim, self._count = None, 0
+            self._digests.clear()
+            self._tweet_ids.clear()
+            self._map()
+            self._reset()
+
+    def _append(self, items: List[Tuple[int, float, bytes, np.ndarray]]):
+        """追加到矩阵文件（调用方需持有锁）"""
+        if not items:
+            return
+        if self._dim is None:
+            self._dim = len(items[0][3])
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{self._meta_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'model': self.model, 'dimensions': self.dimensions, 'dim': self._dim}, f)
+            os.replace(temp_path, self._meta_path)
+        records = np.zeros(len(items), dtype=self._record)
+        vectors = np.empty((len(items), self._dim), dtype=np.float32)
+        for row, (tweet_id, posted_at, digest, vector) in enumerate(items):
+            records[row] = (tweet_id, posted_at, digest)
+            vectors[row] = vector
+        # 先写向量再写记录，中断时加载按两者中较少的行数截断
+        with open(self._vectors_path, 'ab') as f:
+            f.write(vectors.tobytes())
+        with open(self._rows_path, 'ab') as f:
+            f.write(records.tobytes())
+        for offset, (tweet_id, _, digest, _) in enumerate(items):
+            self._digests[digest] = self._count + offset
+            self._tweet_ids.add(tweet_id)
+        self._count += len(items)
+        self._map()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """计算嵌入向量并按行 L2 归一化（余弦相似度即为点积）"""
+        if self._embedder is None:
+            raise RuntimeError("未设置嵌入函数")
+        vectors = np.asarray(self._embedder(texts, model=self.model, dimensions=self.dimensions,
+                                            backends=self.backends), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        with self._lock:
+            self.stats['embedded'] += len(texts)
+        return vectors / norms
+
+    def _cached(self, digest: bytes) -> Optional[np.ndarray]:
+        """按内容哈希查找已计算的向量（调用方需持有锁）"""
+        vector = self._drafts.get(digest)
+        if vector is not None:
+            return vector
+        row = self._digests.get(digest)
+        if row is not None and self._vectors is not None:
+            return np.array(self._vectors[row])
+        return None
+
+    def find(self, content: str) -> Optional[Dict[str, Any]]:
+        """
+        查找与内容语义重复的最近推文
+
+        Args:
+            content: 推文内容
+
+        Returns:
+            {'tweet_id', 'similarity'}（相似度最高的一条），没有时返回 None
+
+        Raises:
+            计算嵌入向量时的异常
+        """
+        digest = self.digest(content)
+        with self._lock:
+            self._ensure_loaded()
+            self.stats['checks'] += 1
+            vector = self._cached(digest)
+            if vector is not None:
+                self.stats['cache_hits'] += 1
+        if vector is None:
+            vector = self._embed([content])[0]
+            with self._lock:
+                self._drafts[digest] = vector
+                while len(self._drafts) > self.cache_size:
+                    self._drafts.popitem(last=False)
+
+        with self._lock:
+            vectors, records, count = self._vectors, self._records, self._count
+        if vectors is None or len(vector) != vectors.shape[1]:
+            return None
+        # 推文基本按发送时间追加，从第一条在窗口内的推文开始分块计算，窗口外的行（回填的旧推文）不参与比较
+        cutoff = self._window_start()
+        posted_at = records['posted_at']
+        recent = np.flatnonzero(posted_at >= cutoff)
+        if not len(recent):
+            return None
+        best_row, best = -1, -1.0
+        for start in range(int(recent[0]), count, self.chunk_rows):
+            end = min(start + self.chunk_rows, count)
+            similarities = vectors[start:end] @ vector
+            similarities[posted_at[start:end] < cutoff] = -1.0
+            row = int(np.argmax(similarities))
+            if similarities[row] > best:
+                best_row, best = start + row, float(similarities[row])
+        if best < self.threshold:
+            return None
+        with self._lock:
+            self.stats['duplicates'] += 1
+        return {'tweet_id': str(int(records['tweet_id'][best_row])), 'similarity': round(best, 3)}
+
+    def add(self, content: str, tweet_id: Optional[str] = None, posted_at: Optional[float] = None):
+        """
+        加入一条已发送的推文（发送前检查过时直接使用缓存的向量，否则由下次同步计算）
+
+        Args:
+            content: 推文内容
+            tweet_id: 推文 ID
+            posted_at: 发送时间戳，为 None 时为当前时间
+        """
+        if not self.enabled:
+            return
+        digest = self.digest(content)
+        tweet_id = int(tweet_id) if tweet_id else 0
+        with self._lock:
+            self._ensure_loaded()
+            vector = self._cached(digest)
+            if vector is None or tweet_id in self._tweet_ids:
+                return
+            self._drafts.pop(digest, None)
+            try:
+                self._append([(tweet_id, posted_at or time.time(), digest, vector)])
+            except OSError as e:
+                logger.warning(f"写入语义重复索引失败: {e}")
+
+    def sync(self, tweet_store) -> int:
+        """
+        为本地推文存储中窗口内、尚未写入矩阵的推文计算向量（从新到旧，最多 max_per_sync 条）
+
+        Args:
+            tweet_store: 本地推文存储
+
+        Returns:
+            本次写入的推文数
+        """
+        if not self.enabled or self._embedder is None:
+            return 0
+        texts = tweet_store.texts()
+        posted_times = tweet_store.posted_times()
+        cutoff = self._window_start()
+        with self._lock:
+            self._ensure_loaded()
+            missing = [tweet_id for tweet_id in sorted(texts, reverse=True)
+                       if tweet_id not in self._tweet_ids and (posted_times.get(tweet_id) or 0) >= cutoff]
+        missing = missing[:self.max_per_sync]
+        added = 0
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            items = []
+            # 需要计算的内容哈希 -> 推文 ID 列表（内容相同的推文只计算一次）
+            pending: Dict[bytes, List[int]] = OrderedDict()
+            with self._lock:
+                for tweet_id in batch:
+                    digest = self.digest(texts[tweet_id])
+                    vector = self._cached(digest)
+                    if vector is not None:
+                        items.append((tweet_id, posted_times[tweet_id], digest, vector))
+                    else:
+                        pending.setdefault(digest, []).append(tweet_id)
+            try:
+                if pending:
+                    vectors = self._embed([texts[tweet_ids[0]] for tweet_ids in pending.values()])
+                    items.extend((tweet_id, posted_times[tweet_id], digest, vector)
+                                 for (digest, tweet_ids), vector in zip(pending.items(), vectors)
+                                 for tweet_id in tweet_ids)
+                with self._lock:
+                    # 计算期间可能已由 add 写入
+                    items = [item for item in items if item[0] not in self._tweet_ids]
+                    self._append(items)
+            except Exception as e:
+                with self._lock:
+                    self.stats['errors'] += 1
+                logger.error(f"计算推文嵌入向量失败: {e}")
+                break
+            added += len(items)
+        if added:
+            logger.info(f"语义重复索引新增 {added} 条推文")
+        return added
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取索引状态"""
+        with self._lock:
+            if self.enabled:
+                self._ensure_loaded()
+            return {
+                'enabled': self.enabled,
+                'model': self.model,
+                'dim': self._dim,
+                'tweets': self._count,
+                'threshold': self.threshold,
+                'window_months': self.window_months,
+                **self.stats
+            }
+
+
+# 全局语义重复索引实例
+semantic_duplicate_index = SemanticDuplicateIndex()
@@ -0,0 +1,217 @@
+"""
+推文校验模块
+检查生成的推文是否可用：长度、与已发送的推文是否重复（字面或语义）、是否包含禁用词；
+模型级联根据校验结果决定是否升级到更强的模型
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from difflib import SequenceMatcher
+from typing import Optional, List, Dict, Any
+from utils.config_loader import config_loader
+from utils.twitter_text import weighted_length, MAX_WEIGHTED_LENGTH
+from utils.deadline import DeadlineExceeded
+from utils.logger import logger
+
+
+_URL = re.compile(r'https?://\S+')
+_NON_WORD = re.compile(r'[\W_]+', re.UNICODE)
+
+
+def normalize_text(content: str) -> str:
+    """
+    规范化文本用于比较: 去掉链接、标点和空白，转为小写
+
+    Args:
+        content: 原始文本
+
+    Returns:
+        规范化后的文本
+    """
+    return _NON_WORD.sub('', _URL.sub('', content)).lower()
+
+
+class TweetHistory:
+    """最近发送的推文记录类（持久化到 JSON 文件，用于重复检查）"""
+
+    def __init__(self, path: Optional[str] = None, size: Optional[int] = None):
+        """
+        初始化推文记录
+
+        Args:
+            path: JSON 文件路径，为 None 时使用配置（openai.validation.history_path）
+            size: 保留的推文条数，为 None 时使用配置（openai.validation.history_size）
+        """
+        validation_config = config_loader.get_openai_config().get('validation') or {}
+        if path is None:
+            path = validation_config.get('history_path', 'data/tweet_history.json')
+        if size is None:
+            size = validation_config.get('history_size', 200)
+        self.path = path
+        self.size = size
+        self._lock = threading.Lock()
+        self._items = deque(maxlen=size)
+        self._load()
+
+    def _load(self):
+        """从文件加载记录"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for item in json.load(f)[-self.size:]:
+                    self._items.append(item)
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载推文记录失败: {e}")
+
+    def _save(self):
+        """写入文件（调用方需持有锁）"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._items), f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def add(self, content: str, tweet_id: Optional[str] = None):
+        """
+        记录一条已发送的推文
+
+        Args:
+            content: 推文内容
+            tweet_id: 推文 ID
+        """
+        with self._lock:
+            self._items.append({'content': content, 'id': tweet_id, 'posted_at': time.time()})
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"保存推文记录失败: {e}")
+
+    def contents(self) -> List[str]:
+        """获取最近推文的内容列表（从旧到新）"""
+        with self._lock:
+            return [item['content'] for item in self._items]
+
+
+class TweetValidator:
+    """推文校验器类"""
+
+    def __init__(self, validation_config: Optional[dict] = None, history: Optional[TweetHistory] = None,
+                 near_duplicates=None, semantic_duplicates=None):
+        """
+        初始化校验器
+
+        Args:
+            validation_config: 校验配置（openai.validation）
+            history: 最近发送的推文记录，为 None 时不检查重复
+            near_duplicates: 全部已发送推文的近似重复索引（NearDuplicateIndex），启用时代替逐条比较最近的推文
+            semantic_duplicates: 语义重复索引（SemanticDuplicateIndex），启用时在其他校验项都通过后检查
+        """
+        validation_config = validation_config or {}
+        self.min_length = validation_config.get('min_length', 0)
+        self.max_length = validation_config.get('max_length', MAX_WEIGHTED_LENGTH)
+        self.banned_terms = [term.lower() for term in validation_config.get('banned_terms') or []]
+        self.duplicate_threshold = validation_config.get('duplicate_threshold', 0.9)
+        self.history = history
+        self.near_duplicates = near_duplicates
+        self.semantic_duplicates = semantic_duplicates
+
+    def check_length(self, content: str) -> Optional[str]:
+        """检查长度（按 Twitter 的加权规则），返回失败原因"""
+        length = weighted_length(content)
+        if length > self.max_length or length < self.min_length:
+            return 'length'
+        return None
+
+    def check_banned_terms(self, content: str) -> Optional[str]:
+        """检查禁用词，返回失败原因"""
+        lowered = content.lower()
+        if any(term in lowered for term in self.banned_terms):
+            return 'banned_term'
+        return None
+
+    def check_duplicate(self, content: str) -> Optional[str]:
+        """检查是否与已发送的推文重复（规范化后相似度达到阈值），返回失败原因"""
+        normalized = normalize_text(content)
+        if not normalized:
+            return None
+        if self.near_duplicates is not None and self.near_duplicates.enabled:
+            match = self.near_duplicates.find(content)
+            if match:
+                logger.info(f"推文与已发送的推文 {match['tweet_id']} 近似重复（相似度 {match['similarity']}）")
+                return 'duplicate'
+            return None
+        if self.history is None:
+            return None
+        for previous in self.history.contents():
+            other = normalize_text(previous)
+            if other == normalized:
+                return 'duplicate'
+            matcher = SequenceMatcher(None, normalized, other, autojunk=False)
+            # quick_ratio 是相似度的上界，先用它过滤大部分推文
+            if matcher.quick_ratio() >= self.duplicate_threshold and matcher.ratio() >= self.duplicate_threshold:
+                return 'duplicate'
+        return None
+
+    def check_semantic_duplicate(self, content: str) -> Optional[str]:
+        """检查是否与最近发送的推文意思相同（嵌入向量的余弦相似度达到阈值），返回失败原因"""
+        if self.semantic_duplicates is None or not self.semantic_duplicates.enabled:
+            return None
+        try:
+            match = self.semantic_duplicates.find(content)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # 嵌入请求失败时不阻止发送
+            logger.warning(f"语义重复检查失败，已跳过: {e}")
+            return None
+        if match:
+            logger.info(f"推文与已发送的推文 {match['tweet_id']} 语义重复（相似度 {match['similarity']}）")
+            return 'semantic_duplicate'
+        return None
+
+    def validate(self, content: str, skip: Optional[List[str]] = None) -> List[str]:
+        """
+        校验推文
+
+        Args:
+            content: 推文内容
+            skip: 跳过的校验项（如推文串模式下跳过 length）
+
+        Returns:
+            未通过的校验项列表（length / banned_term / duplicate / semantic_duplicate），全部通过时为空列表
+        """
+        checks = {'length': self.check_length, 'banned_term': self.check_banned_terms,
+                  'duplicate': self.check_duplicate}
+        skip = skip or []
+        failures = [reason for reason in (check(content) for name, check in checks.items() if name not in skip)
+                    if reason]
+        # 语义检查需要请求嵌入向量，只在其他校验项都通过时进行
+        if not failures and 'semantic_duplicate' not in skip:
+            reason = self.check_semantic_duplicate(content)
+            if reason:
+                failures.append(reason)
+        return failures
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取校验配置"""
+        return {
+            'min_length': self.min_length,
+            'max_length': self.max_length,
+            'banned_terms': len(self.banned_terms),
+            'duplicate_threshold': self.duplicate_threshold,
+            'history_size': len(self.history.contents()) if self.history is not None else 0,
+            'near_duplicate': self.near_duplicates.get_status() if self.near_duplicates is not None else None,
+            'semantic_duplicate': (self.semantic_duplicates.get_status()
+                                   if self.semantic_duplicates is not None else None)
+        }
+
+
+# 全局推文记录实例
+tweet_history = TweetHistory()
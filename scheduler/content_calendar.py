@@ -0,0 +1,366 @@
+"""
+内容日历模块
+从 CSV 或 JSONL 文件中读取按日期排好的推文内容，支持按时间段（slot）和账号区分
+源文件不会被整体读入内存：磁盘上维护一个按时间戳排序的定长索引（时间戳 + 文件偏移），
+查询时在索引上二分查找，再按偏移读取对应的那一行
+"""
+
+import bisect
+import csv
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+from pytz import timezone as pytz_timezone
+from utils.logger import logger
+
+
+class ContentCalendar:
+    """内容日历类 - 基于磁盘索引的按时间查询"""
+
+    # 索引文件头: 魔数, 已索引的源文件字节数, 源文件 mtime(ns), 已索引部分的 CRC, 解析时间使用的时区, 记录数
+    INDEX_MAGIC = b'TBCAL002'
+    HEADER = struct.Struct('<8sQqI64sQ')
+    # 索引记录: 时间戳（秒）, 行在源文件中的字节偏移
+    RECORD = struct.Struct('<qQ')
+    # 计算 CRC 时每次读取的字节数
+    CRC_CHUNK = 1 << 20
+
+    def __init__(self, path: str, index_path: Optional[str] = None,
+                 timezone: str = 'America/New_York', max_delta: int = 1024):
+        """
+        初始化内容日历
+
+        Args:
+            path: 日历文件路径（.csv 或 .jsonl）
+            index_path: 索引文件路径，默认为日历文件路径加 .idx 后缀
+            timezone: 条目时间未带时区信息时使用的时区
+            max_delta: 内存中追加条目的上限，超过后合并写回磁盘索引
+        """
+        self.path = path
+        self.index_path = index_path or f"{path}.idx"
+        self.timezone = pytz_timezone(timezone)
+        self.max_delta = max_delta
+        self.is_csv = path.lower().endswith('.csv')
+
+        self._lock = threading.Lock()
+        self._csv_fields = None
+        self._indexed_size = 0
+        self._indexed_mtime = 0
+        self._indexed_crc = 0
+        self._scanned_to = 0
+        self._record_count = 0
+        # 增量追加但尚未合并到磁盘索引的记录（按时间戳排序）
+        self._delta: List[Tuple[int, int]] = []
+
+    def _parse_time(self, value: str) -> Optional[int]:
+        """
+        解析条目时间为时间戳
+
+        Args:
+            value: ISO 格式时间字符串，如 "2026-11-03 09:00" 或 "2026-11-03T09:00:00-05:00"
+
+        Returns:
+            时间戳（秒），解析失败时返回 None
+        """
+        if not value:
+            return None
+        try:
+            dt = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = self.timezone.localize(dt)
+        return int(dt.timestamp())
+
+    def _read_csv_header(self, f) -> int:
+        """
+        读取 CSV 表头
+
+        Returns:
+            表头之后第一行的字节偏移
+        """
+        f.seek(0)
+        header_line = f.readline()
+        self._csv_fields = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+        self._csv_fields = [field.strip() for field in self._csv_fields]
+        return len(header_line)
+
+    def _parse_line(self, line: bytes) -> Optional[Dict[str, Any]]:
+        """
+        解析单行条目
+
+        Args:
+            line: 源文件中的一行（字节）
+
+        Returns:
+            条目字典，空行或格式错误时返回 None
+        """
+        try:
+            text = line.decode('utf-8').strip()
+        except UnicodeDecodeError as e:
+            logger.warning(f"内容日历条目不是有效的 UTF-8，已跳过: {e}")
+            return None
+        if not text:
+            return None
+        try:
+            if self.is_csv:
+                values = next(csv.reader([text]), [])
+                entry = dict(zip(self._csv_fields or [], values))
+            else:
+                entry = json.loads(text)
+        except (ValueError, csv.Error):
+            return None
+        if not isinstance(entry, dict) or not entry.get('content'):
+            return None
+        return entry
+
+    def _scan(self, f, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        扫描源文件的 [start, end) 区间，返回 (时间戳, 偏移) 记录
+
+        只处理以换行结尾的完整行，未写完的最后一行留给下次增量扫描
+        """
+        records = []
+        f.seek(start)
+        offset = start
+        while offset < end:
+            line = f.readline()
+            if not line or not line.endswith(b'\n'):
+                break
+            entry = self._parse_line(line)
+            if entry is not None:
+                timestamp = self._parse_time(entry.get('time'))
+                if timestamp is not None:
+                    records.append((timestamp, offset))
+                else:
+                    logger.warning(f"内容日历条目时间格式错误，已跳过 (偏移 {offset})")
+            offset += len(line)
+        self._scanned_to = offset
+        return records
+
+    def _crc(self, f, end: int, start: int = 0, crc: int = 0) -> int:
+        """
+        计算源文件 [start, end) 区间的 CRC
+
+        Args:
+            crc: 前面部分的 CRC（从 start 处继续计算），用于在追加后更新整个已索引部分的 CRC
+        """
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = f.read(min(self.CRC_CHUNK, remaining))
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            remaining -= len(chunk)
+        return crc
+
+    def _read_header(self) -> Optional[Tuple[int, int, int, str, int]]:
+        """读取索引文件头 (已索引字节数, mtime, CRC, 时区, 记录数)，文件不存在或格式不符时返回 None"""
+        try:
+            with open(self.index_path, 'rb') as idx:
+                data = idx.read(self.HEADER.size)
+        except OSError:
+            return None
+        if len(data) < self.HEADER.size:
+            return None
+        magic, size, mtime, crc, timezone, count = self.HEADER.unpack(data)
+        if magic != self.INDEX_MAGIC:
+            return None
+        return size, mtime, crc, timezone.rstrip(b'\0').decode('utf-8', 'replace'), count
+
+    def _iter_index(self) -> Iterator[Tuple[int, int]]:
+        """顺序遍历磁盘索引中的全部记录"""
+        if self._record_count == 0:
+            return
+        with open(self.index_path, 'rb') as idx:
+            idx.seek(self.HEADER.size)
+            for _ in range(self._record_count):
+                yield self.RECORD.unpack(idx.read(self.RECORD.size))
+
+    def _write_index(self, records: Iterator[Tuple[int, int]], size: int, mtime: int, crc: int):
+        """
+        将排好序的记录写入新的索引文件（先写临时文件再原子替换）
+        """
+        tmp_path = f"{self.index_path}.tmp"
+        count = 0
+        with open(tmp_path, 'wb') as idx:
+            idx.write(b'\0' * self.HEADER.size)
+            for record in records:
+                idx.write(self.RECORD.pack(*record))
+                count += 1
+            idx.seek(0)
+            idx.write(self.HEADER.pack(self.INDEX_MAGIC, size, mtime, crc,
+                                       self.timezone.zone.encode('utf-8'), count))
+        os.replace(tmp_path, self.index_path)
+
+        self._indexed_size = size
+        self._indexed_mtime = mtime
+        self._indexed_crc = crc
+        self._record_count = count
+        self._delta = []
+
+    def _rebuild(self, f, mtime: int):
+        """重新扫描整个源文件并重建索引"""
+        start = self._read_csv_header(f) if self.is_csv else 0
+        end = os.fstat(f.fileno()).st_size
+        records = self._scan(f, start, end)
+        records.sort()
+        self._write_index(iter(records), self._scanned_to, mtime, self._crc(f, self._scanned_to))
+        logger.info(f"内容日历索引已重建: {self.path}，共 {self._record_count} 条")
+
+    def _ensure_index(self, f):
+        """
+        检查源文件变化并更新索引
+
+        - 文件未变化: 直接使用现有索引
+        - 文件被追加（已索引部分的 CRC 不变）: 只扫描新增部分，记录暂存在内存中，积累过多时合并写回磁盘
+        - 文件被修改或截断、或索引按其他时区建立: 重建索引
+        """
+        stat = os.fstat(f.fileno())
+        if self.is_csv and self._csv_fields is None:
+            self._read_csv_header(f)
+
+        verified = False
+        if self._indexed_size == 0:
+            header = self._read_header()
+            if header is None:
+                self._rebuild(f, stat.st_mtime_ns)
+                return
+            size, mtime, crc, timezone, count = header
+            if timezone != self.timezone.zone:
+                # 未带时区的条目按索引建立时的时区计算了时间戳
+                logger.info(f"内容日历时区已变化 ({timezone} -> {self.timezone.zone})，重建索引")
+                self._rebuild(f, stat.st_mtime_ns)
+                return
+            # 源文件在索引建立后有变化时，检查已索引部分是否保持不变
+            verified = size == stat.st_size and mtime == stat.st_mtime_ns
+            if size > stat.st_size or (not verified and self._crc(f, size) != crc):
+                self._rebuild(f, stat.st_mtime_ns)
+                return
+            verified = True
+            self._indexed_size, self._indexed_mtime, self._record_count = size, mtime, count
+            self._indexed_crc = crc
+
+        if stat.st_size == self._indexed_size and stat.st_mtime_ns == self._indexed_mtime:
+            return
+        if stat.st_size <= self._indexed_size or (
+                not verified and self._crc(f, self._indexed_size) != self._indexed_crc):
+            # 文件未增长却有修改，或已索引部分的内容发生变化，说明发生了原地修改
+            self._rebuild(f, stat.st_mtime_ns)
+            return
+
+        new_records = self._scan(f, self._indexed_size, stat.st_size)
+        if self._scanned_to == self._indexed_size:
+            return
+        for record in new_records:
+            bisect.insort(self._delta, record)
+        self._indexed_crc = self._crc(f, self._scanned_to, self._indexed_size, self._indexed_crc)
+        self._indexed_size = self._scanned_to
+        self._indexed_mtime = stat.st_mtime_ns
+        logger.info(f"内容日历增量加载 {len(new_records)} 条新条目")
+
+        if len(self._delta) > self.max_delta:
+            merged = heapq.merge(self._iter_index(), list(self._delta))
+            self._write_index(merged, self._indexed_size, self._indexed_mtime, self._indexed_crc)
+
+    def _iter_from(self, timestamp: int) -> Iterator[Tuple[int, int]]:
+        """
+        从第一个时间戳 >= timestamp 的记录开始，按时间顺序遍历磁盘索引和内存增量
+        """
+        def disk_records():
+            if self._record_count == 0:
+                return
+            with open(self.index_path, 'rb') as idx:
+                with mmap.mmap(idx.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    base = self.HEADER.size
+                    size = self.RECORD.size
+                    lo, hi = 0, self._record_count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if self.RECORD.unpack_from(mm, base + mid * size)[0] < timestamp:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    for i in range(lo, self._record_count):
+                        yield self.RECORD.unpack_from(mm, base + i * size)
+
+        start = bisect.bisect_left(self._delta, (timestamp, 0))
+        return heapq.merge(disk_records(), self._delta[start:])
+
+    def next_entry(self, after: datetime, slot: Optional[str] = None, account: Optional[str] = None,
+                   until: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        查找时间不早于 after 的第一条匹配条目
+
+        条目的 slot / account 为空时表示适用于所有时间段 / 账号
+
+        Args:
+            after: 起始时间
+            slot: 时间段（如 "09:00"），为空时不过滤
+            account: 账号，为空时不过滤
+            until: 截止时间（包含），为空时不限制
+
+        Returns:
+            条目字典（time 为带时区的 datetime），没有匹配条目时返回 None
+        """
+        if not os.path.exists(self.path):
+            logger.warning(f"内容日历文件不存在: {self.path}")
+            return None
+
+        until_ts = int(until.timestamp()) if until else None
+        with self._lock:
+            with open(self.path, 'rb') as f:
+                self._ensure_index(f)
+                for timestamp, offset in self._iter_from(int(after.timestamp())):
+                    if until_ts is not None and timestamp > until_ts:
+                        return None
+                    f.seek(offset)
+                    entry = self._parse_line(f.readline())
+                    if entry is None:
+                        continue
+                    if slot and entry.get('slot') and entry['slot'] != slot:
+                        continue
+                    if account and entry.get('account') and entry['account'] != account:
+                        continue
+                    entry['time'] = datetime.fromtimestamp(timestamp, self.timezone)
+                    return entry
+        return None
+
+    def get_entry_for_slot(self, fire_time: datetime, slot: Optional[str] = None,
+                           account: Optional[str] = None, window_minutes: int = 30) -> Optional[Dict[str, Any]]:
+        """
+        获取某次定时任务应发送的条目（条目时间在触发时间前后 window_minutes 分钟内）
+
+        Args:
+            fire_time: 任务触发时间
+            slot: 时间段
+            account: 账号
+            window_minutes: 匹配窗口（分钟）
+
+        Returns:
+            条目字典，没有匹配条目时返回 None
+        """
+        window = timedelta(minutes=window_minutes)
+        return self.next_entry(fire_time - window, slot=slot, account=account, until=fire_time + window)
+
+    def get_status(self) -> dict:
+        """
+        获取日历索引状态
+
+        Returns:
+            状态字典
+        """
+        return {
+            'path': self.path,
+            'index_path': self.index_path,
+            'indexed_entries': self._record_count,
+            'pending_entries': len(self._delta),
+            'indexed_bytes': self._indexed_size
+        }
@@ -0,0 +1,31 @@
+"""
+推文内容后处理模块
+对生成的推文内容做规范化处理（CPU 密集阶段，可在进程池中执行）
+函数需定义在模块顶层，以便进程池序列化调用
+"""
+
+import re
+
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+_TRAILING_SPACES = re.compile(r'[ \t]+\n')
+
+
+def postprocess_content(content: str) -> str:
+    """
+    规范化推文内容: 去除首尾空白、行尾空格、多余的空行和包裹整条推文的引号
+
+    Args:
+        content: 原始推文内容
+
+    Returns:
+        处理后的推文内容
+    """
+    content = content.strip()
+    if len(content) >= 2 and content[0] == content[-1] and content[0] in '"“”\'':
+        content = content[1:-1].strip()
+    elif content.startswith('“') and content.endswith('”'):
+        content = content[1:-1].strip()
+    content = _TRAILING_SPACES.sub('\n', content)
+    content = _BLANK_LINES.sub('\n\n', content)
+    return content
@@ -0,0 +1,233 @@
+"""
+执行器池模块
+为调度任务的各阶段提供独立、可配置大小的执行器池：
+- generate: LLM 生成（IO 密集，线程池）
+- post: 发送推文（IO 密集，线程池）
+- process: 内容后处理（CPU 密集，可选进程池）
+并统计队列深度、并发数和利用率，便于在高负载下调优
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Any, Dict, Optional
+from utils.logger import logger
+
+
+class InstrumentedPool:
+    """带统计信息的执行器池"""
+
+    def __init__(self, name: str, workers: int, use_processes: bool = False, max_concurrent: Optional[int] = None):
+        """
+        初始化执行器池
+
+        Args:
+            name: 池名称
+            workers: 工作线程（进程）数
+            use_processes: 是否使用进程池
+            max_concurrent: 同时执行的任务上限（超出的任务在池外排队，不占用工作线程），默认且最多为 workers
+        """
+        self.name = name
+        self.workers = workers
+        self.use_processes = use_processes
+        if use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'pool-{name}')
+        self.max_concurrent = min(max_concurrent or workers, workers)
+        self._lock = threading.Lock()
+        self._created_at = time.monotonic()
+        # 等待空闲名额的任务：(future, func, args, kwargs, submitted_at)
+        self._pending = deque()
+        self._slots_used = 0
+
+        self.submitted = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.max_queue_depth = 0
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        提交任务（线程池中超出并发上限的任务先在池外排队，有空闲名额时才交给工作线程）
+
+        Returns:
+            Future 对象
+        """
+        submitted_at = time.monotonic()
+        with self._lock:
+            self.submitted += 1
+
+        if self.use_processes:
+            # 进程池无法在子进程中回调统计，并发数即进程数，耗时按提交到完成计算
+            with self._lock:
+                self.max_queue_depth = max(self.max_queue_depth, self._queue_depth())
+                self.active += 1
+            future = self._executor.submit(func, *args, **kwargs)
+            future.add_done_callback(lambda f: self._on_process_done(f, submitted_at))
+            return future
+
+        future = Future()
+        future.add_done_callback(self._count_result)
+        with self._lock:
+            self._pending.append((future, func, args, kwargs, submitted_at))
+            self.max_queue_depth = max(self.max_queue_depth, self._queue_depth())
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """把排队的任务交给工作线程，直到用完并发名额"""
+        while True:
+            with self._lock:
+                if not self._pending or self._slots_used >= self.max_concurrent:
+                    return
+                item = self._pending.popleft()
+                self._slots_used += 1
+            future = item[0]
+            # 排队期间已被取消的任务直接跳过（取消回调会获取锁，需在锁外调用）
+            if future.set_running_or_notify_cancel():
+                try:
+                    self._executor.submit(self._run, *item)
+                    continue
+                except RuntimeError as e:
+                    # 执行器池已关闭
+                    future.set_exception(e)
+            with self._lock:
+                self._slots_used -= 1
+
+    def _run(self, future: Future, func: Callable[..., Any], args: tuple, kwargs: dict, submitted_at: float):
+        """在工作线程中执行任务，结束后释放名额并继续分派排队的任务"""
+        started_at = time.monotonic()
+        with self._lock:
+            self.active += 1
+            self.wait_seconds += started_at - submitted_at
+        error = result = None
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            error = e
+        finally:
+            with self._lock:
+                self.active -= 1
+                self._slots_used -= 1
+                self.busy_seconds += time.monotonic() - started_at
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        self._dispatch()
+
+    def _on_process_done(self, future: Future, submitted_at: float):
+        """进程池任务完成回调"""
+        with self._lock:
+            self.active -= 1
+            self.busy_seconds += time.monotonic() - submitted_at
+        self._count_result(future)
+
+    def _count_result(self, future: Future):
+        """统计任务结果"""
+        with self._lock:
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _queue_depth(self) -> int:
+        """已提交但尚未开始执行的任务数"""
+        finished = self.completed + self.failed + self.cancelled
+        return max(0, self.submitted - finished - self.active)
+
+    def get_metrics(self) -> dict:
+        """
+        获取池统计信息
+
+        Returns:
+            统计字典
+        """
+        with self._lock:
+            uptime = max(time.monotonic() - self._created_at, 1e-9)
+            started = self.completed + self.failed + self.active
+            return {
+                'type': 'process' if self.use_processes else 'thread',
+                'workers': self.workers,
+                'max_concurrent': self.max_concurrent,
+                'active': self.active,
+                'queue_depth': self._queue_depth(),
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'utilization': round(self.active / self.workers, 3),
+                'avg_utilization': round(self.busy_seconds / (self.workers * uptime), 4),
+                'avg_wait_ms': round(self.wait_seconds / started * 1000, 2) if started else 0.0
+            }
+
+    def shutdown(self, wait: bool = False):
+        """关闭执行器池（取消仍在排队的任务）"""
+        with self._lock:
+            pending = [item[0] for item in self._pending]
+            self._pending.clear()
+        for future in pending:
+            future.cancel()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class ExecutorPools:
+    """调度任务执行器池集合"""
+
+    def __init__(self, executor_config: Optional[dict] = None):
+        """
+        初始化执行器池集合
+
+        Args:
+            executor_config: scheduler.executors 配置
+        """
+        self.config = executor_config or {}
+        self.closed = False
+        max_concurrent = self.config.get('max_concurrent') or {}
+        self.pools: Dict[str, InstrumentedPool] = {
+            'generate': InstrumentedPool(
+                'generate', self.config.get('generate_threads', 4),
+                max_concurrent=max_concurrent.get('generate')
+            ),
+            'post': InstrumentedPool(
+                'post', self.config.get('post_threads', 2),
+                max_concurrent=max_concurrent.get('post')
+            )
+        }
+
+        process_workers = self.config.get('process_workers', 0)
+        if process_workers:
+            self.pools['process'] = InstrumentedPool('process', process_workers, use_processes=True)
+
+        sizes = ', '.join(f"{name}={pool.workers}" for name, pool in self.pools.items())
+        logger.info(f"执行器池已创建: {sizes}")
+
+    def get(self, stage: str) -> Optional[InstrumentedPool]:
+        """
+        获取阶段对应的执行器池
+
+        Args:
+            stage: 阶段名称（generate / post / process）
+
+        Returns:
+            执行器池，未配置时返回 None
+        """
+        return self.pools.get(stage)
+
+    def get_metrics(self) -> dict:
+        """获取所有池的统计信息"""
+        return {name: pool.get_metrics() for name, pool in self.pools.items()}
+
+    def shutdown(self, wait: bool = False):
+        """关闭所有执行器池"""
+        self.closed = True
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
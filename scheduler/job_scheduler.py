@@ -4,37 +4,330 @@
 支持时区设置，可按照指定时区（如美国时间）执行任务
 """
 
+import functools
+import html
 import time
 import threading
-from datetime import datetime
-from typing import List, Callable
+from datetime import datetime, timedelta
+from typing import List, Callable, Optional
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MAX_INSTANCES
+from apscheduler.executors.pool import ThreadPoolExecutor as APSThreadPoolExecutor
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from pytz import timezone as pytz_timezone
 from utils.config_loader import config_loader
 from utils.logger import logger
+from utils.deadline import DeadlineExceeded
+from scheduler.content_calendar import ContentCalendar
+from scheduler.watchdog import JobWatchdog, JobCancelled, PhaseTimeout
+from scheduler.executors import ExecutorPools
+from scheduler.content_processing import postprocess_content
+from scheduler.oneoff_store import OneOffStore, parse_due_time
+from scheduler.prewarm import ConnectionPrewarmer
+from scheduler.posting_optimizer import PostingTimeOptimizer
+from llm.draft_ranker import DraftRanker
+from twitter.thread_poster import ThreadPoster
+from twitter.tweet_store import TimelineSync, tweet_store
+from twitter.metrics_store import MetricsCollector, metrics_store
+from utils.twitter_text import weighted_length, MAX_WEIGHTED_LENGTH
 
 
 class JobScheduler:
     """定时任务调度器类 - 支持时区设置"""
 
-    def __init__(self):
-        """初始化调度器"""
-        self.scheduler_config = config_loader.get_scheduler_config()
+    # 会发出推文的任务 ID 前缀（其余为维护任务，不计入下次发推时间）
+    POST_JOB_PREFIXES = ('tweet_', 'oneoff_')
+
+    def __init__(self, scheduler_config: Optional[dict] = None, clock: Optional[Callable[[], datetime]] = None):
+        """
+        初始化调度器
+
+        Args:
+            scheduler_config: 调度器配置，默认读取配置文件
+            clock: 返回当前时间（带时区）的函数，默认使用系统时间；模拟模式下传入虚拟时钟
+        """
+        self.scheduler_config = scheduler_config if scheduler_config is not None else config_loader.get_scheduler_config()
         self.is_running = False
+        self.clock = clock
+
+        # LLM / Twitter 客户端，为 None 时延迟导入全局实例（模拟模式下替换为桩实现）
+        self.llm_backend = None
+        self.twitter_backend = None
 
         # 获取时区设置
         timezone_str = self.scheduler_config.get('timezone', 'America/New_York')
         self.timezone = pytz_timezone(timezone_str)
 
-        # 创建 APScheduler 调度器
-        self.scheduler = BackgroundScheduler(timezone=self.timezone)
+        # 创建 APScheduler 调度器和各阶段执行器池
+        self.executor_config = self.scheduler_config.get('executors') or {}
+        # 各任务正在执行（含在调度线程池中排队）的实例数，由调度器事件维护
+        self._job_events_lock = threading.Lock()
+        self._running_instances = {}
+        self._skipped_instances = 0
+        self.scheduler = self._create_scheduler()
+        self.pools = ExecutorPools(self.executor_config)
+
+        # 内容日历（可选）
+        self.content_calendar = self._setup_content_calendar()
+
+        # 一次性定时推文（所有待发任务共用一个定时器，只在最早的任务到期时唤醒）
+        self.oneoff_config = self.scheduler_config.get('oneoff') or {}
+        self.oneoff_store = None
+        # 发送超时被放弃、正在等待发送阶段结束的定时推文 ID
+        self._oneoff_resolving = set()
+        self._oneoff_lock = threading.Lock()
+        if self.oneoff_config.get('enabled', True):
+            self.oneoff_store = OneOffStore(self.oneoff_config.get('db_path', 'data/oneoff_posts.db'))
+
+        # 推文串模式（超长内容拆分为回复链发送，进度持久化以便中断后续发）
+        self.thread_config = self.scheduler_config.get('thread') or {}
+        self.thread_poster = None
+        if self.thread_config.get('enabled', False):
+            self.thread_poster = ThreadPoster(self.thread_config)
+
+        # 本地推文存储与时间线的增量同步（/tweets/recent 从本地查询）
+        self.timeline_config = config_loader.get_twitter_config().get('timeline') or {}
+        self.timeline_sync = None
+        if self.timeline_config.get('enabled', True):
+            self.timeline_sync = TimelineSync(tweet_store, self.timeline_config)
+
+        # 定期采集推文的公开指标（保存为时间序列）
+        self.metrics_config = config_loader.get_twitter_config().get('metrics') or {}
+        self.metrics_collector = None
+        if self.metrics_config.get('enabled', True):
+            self.metrics_collector = MetricsCollector(metrics_store, tweet_store, self.metrics_config)
+
+        # 根据历史推文表现推荐发推时间（可选自动应用）
+        self.optimizer_config = self.scheduler_config.get('optimizer') or {}
+        self.posting_optimizer = None
+        self._schedule_applied_at = None
+        if self.optimizer_config.get('enabled', True):
+            self.posting_optimizer = PostingTimeOptimizer(metrics_store, self.optimizer_config, self.timezone)
+
+        # 多条候选推文（并行生成，用本地排序模型选出分数最高的一条）
+        self.drafts_config = self.scheduler_config.get('drafts') or {}
+        self.draft_ranker = DraftRanker(self.drafts_config)
+
+        # 任务执行时限和看门狗
+        self.timeouts = self.scheduler_config.get('timeouts') or {}
+        self.watchdog = JobWatchdog(
+            check_interval=self.timeouts.get('watchdog_interval_seconds', 5)
+        )
+
+        # 发推前的连接预热
+        self.prewarm_config = self.scheduler_config.get('prewarm') or {}
+        self.prewarmer = ConnectionPrewarmer(self.prewarm_config)
 
         # 设置定时任务
         self._setup_jobs()
 
         logger.info(f"调度器初始化完成，时区: {timezone_str}")
 
+    def now(self) -> datetime:
+        """获取调度器时区下的当前时间"""
+        if self.clock:
+            return self.clock().astimezone(self.timezone)
+        return datetime.now(self.timezone)
+
+    def _get_llm_client(self):
+        """获取 LLM 客户端"""
+        if self.llm_backend is None:
+            # 延迟导入 LLM 客户端
+            from llm.llm_client import llm_client
+            return llm_client
+        return self.llm_backend
+
+    def _get_twitter_client(self):
+        """获取 Twitter 客户端"""
+        if self.twitter_backend is None:
+            # 延迟导入 Twitter 客户端
+            from twitter.api_client import twitter_client
+            return twitter_client
+        return self.twitter_backend
+
+    def _create_scheduler(self) -> BackgroundScheduler:
+        """创建 APScheduler 调度器（执行线程数、默认并发上限由 scheduler.executors 配置）"""
+        scheduler = BackgroundScheduler(
+            timezone=self.timezone,
+            executors={
+                'default': APSThreadPoolExecutor(self.executor_config.get('scheduler_threads', 10))
+            },
+            job_defaults={
+                'max_instances': self.executor_config.get('max_instances', 1),
+                'coalesce': self.executor_config.get('coalesce', False)
+            }
+        )
+        scheduler.add_listener(
+            self._on_job_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MAX_INSTANCES
+        )
+        return scheduler
+
+    def _on_job_event(self, event):
+        """调度器事件回调：统计各任务正在执行的实例数和因达到并发上限而跳过的次数"""
+        with self._job_events_lock:
+            if event.code == EVENT_JOB_SUBMITTED:
+                self._running_instances[event.job_id] = self._running_instances.get(event.job_id, 0) + 1
+            elif event.code == EVENT_JOB_MAX_INSTANCES:
+                self._skipped_instances += 1
+            else:
+                remaining = self._running_instances.get(event.job_id, 0) - 1
+                if remaining > 0:
+                    self._running_instances[event.job_id] = remaining
+                else:
+                    self._running_instances.pop(event.job_id, None)
+
+    def _get_max_instances(self, job_id: str) -> int:
+        """获取单个任务的并发上限（job_max_instances 中按任务 ID 配置，未配置时使用默认值）"""
+        job_limits = self.executor_config.get('job_max_instances') or {}
+        return job_limits.get(job_id, self.executor_config.get('max_instances', 1))
+
+    def _postprocess(self, run, content: str) -> str:
+        """
+        对 LLM 生成的内容做后处理，配置了进程池时在进程池中执行
+
+        Args:
+            run: 任务心跳记录
+            content: 推文内容
+
+        Returns:
+            处理后的推文内容
+        """
+        pool = self.pools.get('process')
+        if pool is None:
+            return postprocess_content(content)
+        return self.watchdog.run_phase(
+            run, 'postprocess', postprocess_content,
+            self.timeouts.get('postprocess_seconds', 10), content, executor=pool
+        )
+
+    def _generate(self, run) -> Optional[str]:
+        """
+        使用 LLM 生成推文内容（推文串模式下允许超过单条推文的长度）
+
+        Args:
+            run: 任务心跳记录
+
+        Returns:
+            推文内容，失败时返回 None
+        """
+        if self.thread_poster:
+            return self.watchdog.run_phase(
+                run, 'generate', self._get_llm_client().generate_tweet,
+                self.timeouts.get('generate_seconds', 120),
+                self.thread_config.get('prompt_template'), allow_long=True,
+                executor=self.pools.get('generate')
+            )
+        if self.drafts_config.get('count', 1) > 1:
+            return self.watchdog.run_phase(
+                run, 'generate', self._generate_best,
+                self.timeouts.get('generate_seconds', 120), executor=self.pools.get('generate')
+            )
+        return self.watchdog.run_phase(
+            run, 'generate', self._get_llm_client().generate_tweet,
+            self.timeouts.get('generate_seconds', 120), executor=self.pools.get('generate')
+        )
+
+    def _generate_best(self) -> Optional[str]:
+        """
+        并行生成多条候选推文，返回排序模型打分最高的一条（没有模型时返回第一条）
+
+        Returns:
+            推文内容，全部生成失败时返回 None
+        """
+        drafts = self._get_llm_client().generate_multiple_tweets(self.drafts_config.get('count', 1))
+        content, scores = self.draft_ranker.best(drafts)
+        if scores is not None:
+            logger.info(f"候选推文分数: {scores}，选择第 {scores.index(max(scores)) + 1} 条")
+        elif len(drafts) > 1:
+            logger.warning("候选推文排序模型不可用（运行 tools/train_ranker.py 训练），使用第一条候选")
+        return content
+
+    def _post(self, run, content: str, media_paths: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        发送推文，推文串模式下超长内容拆分为回复链发送
+
+        Args:
+            run: 任务心跳记录
+            content: 推文内容
+            media_paths: 附带的媒体文件路径（推文串附在第一条）
+
+        Returns:
+            发送结果字典（推文串包含 thread_id），失败时返回 None 或 success 为 False
+        """
+        twitter_client = self._get_twitter_client()
+        # 只在有媒体时传入，兼容不支持媒体的客户端实现
+        kwargs = {'media_paths': media_paths} if media_paths else {}
+        if self.thread_poster and weighted_length(content) > MAX_WEIGHTED_LENGTH:
+            return self.watchdog.run_phase(
+                run, 'post', self.thread_poster.post_content,
+                self.timeouts.get('thread_post_seconds', 180), content, twitter_client,
+                executor=self.pools.get('post'), **kwargs
+            )
+        timeout = self.timeouts.get('media_post_seconds' if media_paths else 'post_seconds', 180 if media_paths else 60)
+        return self.watchdog.run_phase(
+            run, 'post', twitter_client.post_tweet, timeout, content,
+            executor=self.pools.get('post'), **kwargs
+        )
+
+    @staticmethod
+    def _get_entry_media(entry: Optional[dict]) -> Optional[List[str]]:
+        """
+        获取内容日历条目附带的媒体文件（media 字段: JSONL 中为列表或字符串，CSV 中以 | 分隔）
+
+        Returns:
+            文件路径列表，没有媒体时返回 None
+        """
+        media = (entry or {}).get('media')
+        if not media:
+            return None
+        if isinstance(media, str):
+            media = media.split('|')
+        return [path.strip() for path in media if path and path.strip()] or None
+
+    def _setup_content_calendar(self) -> Optional[ContentCalendar]:
+        """设置内容日历（未配置时返回 None）"""
+        calendar_config = self.scheduler_config.get('content_calendar') or {}
+        path = calendar_config.get('path')
+        if not path:
+            return None
+
+        calendar = ContentCalendar(
+            path=path,
+            index_path=calendar_config.get('index_path'),
+            timezone=str(self.timezone),
+            max_delta=calendar_config.get('max_delta', 1024)
+        )
+        logger.info(f"已启用内容日历: {path}")
+        return calendar
+
+    def _get_calendar_entry(self, tweet_time: Optional[str]) -> Optional[dict]:
+        """
+        从内容日历中获取当前时间段的条目
+
+        Args:
+            tweet_time: 触发本次任务的时间段（HH:MM）
+
+        Returns:
+            条目字典，未启用日历或没有匹配条目时返回 None
+        """
+        if not self.content_calendar:
+            return None
+
+        calendar_config = self.scheduler_config.get('content_calendar') or {}
+        try:
+            return self.content_calendar.get_entry_for_slot(
+                fire_time=self.now(),
+                slot=tweet_time,
+                account=calendar_config.get('account'),
+                window_minutes=calendar_config.get('window_minutes', 30)
+            )
+        except Exception as e:
+            logger.error(f"读取内容日历失败: {e}")
+            return None
+
     def _setup_jobs(self):
         """设置定时任务"""
         tweet_times = self.scheduler_config.get('tweet_times', ['08:00'])
@@ -57,57 +350,495 @@ class JobScheduler:
                 )
 
                 # 添加任务
+                job_id = f'tweet_{tweet_time}'
                 self.scheduler.add_job(
                     func=self._auto_tweet_job,
                     trigger=trigger,
-                    args=[fixed_content],
-                    id=f'tweet_{tweet_time}',
+                    args=[fixed_content, tweet_time],
+                    id=job_id,
                     name=f'每天 {tweet_time} 发推',
+                    max_instances=self._get_max_instances(job_id),
                     replace_existing=True
                 )
 
                 logger.info(f"已设置定时发推任务: 每天 {tweet_time} ({self.timezone})")
+
+                if self.prewarm_config.get('enabled', True):
+                    self._add_prewarm_job(tweet_time, hour, minute)
             except Exception as e:
                 logger.error(f"设置定时任务失败 ({tweet_time}): {e}")
 
         logger.info(f"共设置了 {len(tweet_times)} 个定时发推任务")
-    
-    def _auto_tweet_job(self, fixed_content=None):
+
+        if self.oneoff_store:
+            # 定期重新设置定时器，以便发现其他进程（如命令行工具）新增的定时推文
+            self.scheduler.add_job(
+                func=self._arm_oneoff_timer,
+                trigger=IntervalTrigger(seconds=self.oneoff_config.get('rearm_seconds', 60)),
+                id='maint_oneoff_rearm',
+                name='检查一次性定时推文',
+                replace_existing=True
+            )
+            if self.is_running:
+                self._arm_oneoff_timer()
+
+        if self.timeline_sync:
+            self.scheduler.add_job(
+                func=self._timeline_sync_job,
+                trigger=IntervalTrigger(minutes=self.timeline_config.get('sync_interval_minutes', 15)),
+                id='maint_timeline_sync',
+                name='同步本地推文存储',
+                replace_existing=True
+            )
+
+        if self.metrics_collector:
+            self.scheduler.add_job(
+                func=self._metrics_collect_job,
+                trigger=IntervalTrigger(minutes=self.metrics_config.get('collect_interval_minutes', 15)),
+                id='maint_metrics_collect',
+                name='采集推文指标',
+                replace_existing=True
+            )
+
+        from llm.semantic_duplicate import semantic_duplicate_index
+        if semantic_duplicate_index.enabled:
+            self.scheduler.add_job(
+                func=self._semantic_sync_job,
+                trigger=IntervalTrigger(minutes=semantic_duplicate_index.sync_interval_minutes),
+                id='maint_semantic_sync',
+                name='同步语义重复索引',
+                replace_existing=True
+            )
+
+    def _add_prewarm_job(self, tweet_time: str, hour: int, minute: int):
+        """
+        在发推时间点之前 lead_seconds 秒添加连接预热任务
+
+        Args:
+            tweet_time: 发推时间（HH:MM）
+            hour: 小时
+            minute: 分钟
+        """
+        lead_seconds = self.prewarm_config.get('lead_seconds', 30)
+        warm_at = datetime(2000, 1, 2, hour, minute) - timedelta(seconds=lead_seconds)
+        self.scheduler.add_job(
+            func=self._prewarm_job,
+            trigger=CronTrigger(
+                hour=warm_at.hour,
+                minute=warm_at.minute,
+                second=warm_at.second,
+                timezone=self.timezone
+            ),
+            args=[tweet_time],
+            id=f'prewarm_{tweet_time}',
+            name=f'每天 {tweet_time} 发推前预热连接',
+            misfire_grace_time=lead_seconds,
+            replace_existing=True
+        )
+
+    def _prewarm_job(self, tweet_time=None):
+        """
+        连接预热任务: 解析 DNS、建立并保持到 Twitter 和 OpenAI 的连接、提前刷新即将过期的令牌
+
+        Args:
+            tweet_time: 即将到来的发推时间（HH:MM）
+        """
+        try:
+            logger.info(f"开始为 {tweet_time} 的发推预热连接")
+            from auth.token_manager import token_manager
+            self.prewarmer.prewarm(token_manager, self._get_llm_client())
+        except Exception as e:
+            logger.error(f"连接预热失败: {e}")
+
+    def _arm_oneoff_timer(self):
+        """将一次性推文定时器设置为最早的待发送时间（没有待发任务时移除定时器）"""
+        try:
+            next_due = self.oneoff_store.next_due_time()
+            if next_due is None:
+                if self.scheduler.get_job('oneoff_timer'):
+                    self.scheduler.remove_job('oneoff_timer')
+                return
+
+            job = self.scheduler.get_job('oneoff_timer')
+            if job and getattr(job, 'next_run_time', None) == next_due:
+                return
+            self.scheduler.add_job(
+                func=self._oneoff_timer_job,
+                trigger=DateTrigger(run_date=next_due),
+                id='oneoff_timer',
+                name='一次性定时推文',
+                misfire_grace_time=None,
+                replace_existing=True
+            )
+            logger.debug(f"一次性推文定时器已设置: {next_due.astimezone(self.timezone)}")
+        except Exception as e:
+            logger.error(f"设置一次性推文定时器失败: {e}")
+
+    def _oneoff_timer_job(self):
+        """一次性推文定时器: 发送所有已到期的推文，然后设置下一次唤醒时间"""
+        try:
+            due_posts = self.oneoff_store.claim_due(self.now(), limit=self.oneoff_config.get('batch_size', 50))
+            for post in due_posts:
+                self._post_oneoff(post)
+        except Exception as e:
+            logger.error(f"执行一次性定时推文任务时发生错误: {e}")
+        finally:
+            self._arm_oneoff_timer()
+
+    def _post_oneoff(self, post: dict):
+        """
+        发送一条一次性定时推文
+
+        Args:
+            post: 定时推文记录
+        """
+        run = self.watchdog.begin(f"oneoff_{post['id']}", self.timeouts.get('job_seconds', 300))
+        success = False
+        try:
+            logger.info(f"发送一次性定时推文 #{post['id']} (计划时间: {post['due_at']})")
+            result = self._post(run, post['content'])
+            if result and result.get('success'):
+                success = True
+                self.oneoff_store.mark_posted(post['id'], result.get('id'))
+                logger.info(f"一次性定时推文 #{post['id']} 发送成功: {result.get('url')}")
+            else:
+                self.oneoff_store.mark_failed(post['id'], '发送推文失败')
+                logger.error(f"一次性定时推文 #{post['id']} 发送失败")
+        except PhaseTimeout as e:
+            if not e.abandoned:
+                self.oneoff_store.mark_failed(post['id'], str(e))
+                logger.error(f"一次性定时推文 #{post['id']} 发送超时: {e}")
+                return
+            # 发送请求可能已经发出，标记为结果未知（不会再次发送），等发送阶段结束后确认
+            self.oneoff_store.mark_unknown(post['id'], str(e))
+            logger.error(f"一次性定时推文 #{post['id']} 发送超时，结果未知，等待确认: {e}")
+            if e.future is not None:
+                with self._oneoff_lock:
+                    self._oneoff_resolving.add(post['id'])
+                e.future.add_done_callback(functools.partial(self._resolve_oneoff, post['id']))
+        except Exception as e:
+            self.oneoff_store.mark_failed(post['id'], str(e))
+            logger.error(f"一次性定时推文 #{post['id']} 发送时发生错误: {e}")
+        finally:
+            self.watchdog.finish(run, success)
+
+    def _resolve_oneoff(self, post_id: int, future):
+        """
+        被放弃的一次性定时推文发送阶段结束后，根据实际结果标记为已发送或失败
+
+        Args:
+            post_id: 定时推文 ID
+            future: 发送阶段的 Future
+        """
+        try:
+            result = future.result()
+        except BaseException as e:
+            result = None
+            error = str(e) or type(e).__name__
+        else:
+            error = '发送推文失败'
+        if result and result.get('success'):
+            self.oneoff_store.mark_posted(post_id, result.get('id'))
+            logger.warning(f"一次性定时推文 #{post_id} 在超时后发送成功: {result.get('url')}")
+        else:
+            self.oneoff_store.mark_failed(post_id, f"超时后确认未发出: {error}")
+            logger.info(f"一次性定时推文 #{post_id} 已确认未发出")
+        with self._oneoff_lock:
+            self._oneoff_resolving.discard(post_id)
+
+    def _verify_unknown_oneoffs(self):
+        """同步时间线后，在本地推文存储中确认结果未知的一次性定时推文是否已经发出"""
+        from llm.validators import normalize_text
+        with self._oneoff_lock:
+            resolving = set(self._oneoff_resolving)
+        for post in self.oneoff_store.list('unknown'):
+            if post['id'] in resolving:
+                continue
+            expected = normalize_text(post['content'])
+            posted = tweet_store.query(limit=200, since=datetime.fromisoformat(post['due_at']))
+            found = next((tweet for tweet in posted
+                          if normalize_text(html.unescape(tweet['text'])) == expected), None)
+            if found:
+                self.oneoff_store.mark_posted(post['id'], found['id'])
+                logger.info(f"一次性定时推文 #{post['id']} 已在时间线上确认发出 (ID: {found['id']})")
+            else:
+                self.oneoff_store.mark_failed(post['id'], '时间线上未找到，确认未发出，请重新安排')
+                logger.warning(f"一次性定时推文 #{post['id']} 在时间线上未找到，已标记为失败")
+
+    def _resume_threads_job(self):
+        """续发所有未发送完的推文串"""
+        run = self.watchdog.begin('thread_resume', self.timeouts.get('job_seconds', 300))
+        success = False
+        try:
+            results = self.watchdog.run_phase(
+                run, 'post', self.thread_poster.resume_all, self.timeouts.get('thread_post_seconds', 180),
+                self._get_twitter_client(), executor=self.pools.get('post')
+            )
+            success = all(result.get('success') for result in results)
+            if results:
+                logger.info(f"推文串续发完成: {sum(1 for result in results if result.get('success'))}/{len(results)} 个成功")
+        except Exception as e:
+            logger.error(f"续发推文串时发生错误: {e}")
+        finally:
+            self.watchdog.finish(run, success)
+
+    def _timeline_sync_job(self):
+        """增量同步时间线上的新推文，并继续回填历史推文"""
+        try:
+            twitter_client = self._get_twitter_client()
+            result = self.timeline_sync.sync(twitter_client)
+            if result.get('success') and self.timeline_config.get('backfill', True):
+                self.timeline_sync.backfill(twitter_client)
+            if result.get('success') and self.oneoff_store:
+                self._verify_unknown_oneoffs()
+            # 同步或回填到的推文（包括在其他地方发送的推文）加入近似重复索引
+            from llm.near_duplicate import near_duplicate_index
+            near_duplicate_index.sync(tweet_store)
+        except Exception as e:
+            logger.error(f"同步本地推文存储时发生错误: {e}")
+
+    def _metrics_collect_job(self):
+        """采集推文的公开指标"""
+        try:
+            self.metrics_collector.collect(self._get_twitter_client())
+            # 用新满时长的推文更新提示词选择器
+            from llm.prompt_bandit import prompt_bandit
+            if prompt_bandit.enabled:
+                prompt_bandit.update_rewards(metrics_store)
+            if self.posting_optimizer:
+                self.posting_optimizer.refresh()
+                self._auto_apply_schedule()
+        except Exception as e:
+            logger.error(f"采集推文指标时发生错误: {e}")
+
+    def _semantic_sync_job(self):
+        """为本地推文存储中尚未计算嵌入向量的推文计算向量"""
+        try:
+            from llm.semantic_duplicate import semantic_duplicate_index
+            # 导入 LLM 客户端时设置嵌入函数
+            self._get_llm_client()
+            semantic_duplicate_index.sync(tweet_store)
+        except Exception as e:
+            logger.error(f"同步语义重复索引时发生错误: {e}")
+
+    def _auto_apply_schedule(self):
+        """按配置的间隔自动应用推荐的发推时间"""
+        if not self.optimizer_config.get('auto_apply', False):
+            return
+        interval = self.optimizer_config.get('apply_interval_hours', 24) * 3600
+        if self._schedule_applied_at is not None and time.time() - self._schedule_applied_at < interval:
+            return
+        result = self.optimize_schedule(apply=True)
+        if result.get('success'):
+            self._schedule_applied_at = time.time()
+
+    def optimize_schedule(self, slots: Optional[int] = None, apply: bool = False) -> dict:
+        """
+        根据历史推文表现推荐发推时间
+
+        Args:
+            slots: 推荐的时段数，默认为当前每天的发推次数
+            apply: 是否通过 update_schedule 应用推荐的每天发推时间
+
+        Returns:
+            推荐结果字典（applied 表示是否修改了发推时间）
+        """
+        if not self.posting_optimizer:
+            return {'success': False, 'message': '未启用发推时间优化'}
+        if slots is None:
+            slots = self.optimizer_config.get('slots') or len(self.scheduler_config.get('tweet_times') or ['08:00'])
+        self.posting_optimizer.refresh()
+        result = self.posting_optimizer.recommend(slots)
+        result['applied'] = False
+        if apply and result.get('success'):
+            if sorted(result['tweet_times']) != sorted(self.scheduler_config.get('tweet_times') or []):
+                logger.info(f"应用推荐的发推时间: {result['tweet_times']}")
+                self.update_schedule(tweet_times=result['tweet_times'])
+                result['applied'] = True
+        return result
+
+    def sync_timeline(self, backfill: bool = False, max_pages: Optional[int] = None) -> dict:
+        """
+        立即同步本地推文存储
+
+        Args:
+            backfill: 是否同时回填历史推文
+            max_pages: 回填最多请求的页数，默认为 backfill_pages_per_run
+
+        Returns:
+            同步结果字典
+        """
+        if not self.timeline_sync:
+            return {'success': False, 'message': '未启用本地推文存储同步'}
+        twitter_client = self._get_twitter_client()
+        result = {'sync': self.timeline_sync.sync(twitter_client)}
+        if backfill:
+            result['backfill'] = self.timeline_sync.backfill(twitter_client, max_pages=max_pages)
+        result['success'] = all(item.get('success') for item in result.values())
+        return result
+
+    def resume_thread(self, thread_id: int) -> dict:
+        """
+        续发一个未发送完的推文串（不受尝试次数限制）
+
+        Args:
+            thread_id: 推文串 ID
+
+        Returns:
+            发送结果字典
+        """
+        if not self.thread_poster:
+            return {'success': False, 'error': '推文串模式未启用'}
+        run = self.watchdog.begin(f'thread_{thread_id}', self.timeouts.get('job_seconds', 300))
+        result = {}
+        try:
+            result = self.watchdog.run_phase(
+                run, 'post', self.thread_poster.post, self.timeouts.get('thread_post_seconds', 180),
+                thread_id, self._get_twitter_client(), executor=self.pools.get('post')
+            )
+            return result
+        except (DeadlineExceeded, JobCancelled) as e:
+            logger.error(f"续发推文串 #{thread_id} 超时: {e}")
+            return {'success': False, 'error': str(e), 'timed_out': True, 'thread_id': thread_id}
+        finally:
+            self.watchdog.finish(run, bool(result.get('success')))
+
+    def list_threads(self, status: Optional[str] = None, limit: int = 100) -> list:
+        """
+        列出推文串
+
+        Args:
+            status: 按状态过滤，为空时返回全部
+            limit: 最多返回条数
+
+        Returns:
+            推文串列表
+        """
+        if not self.thread_poster:
+            return []
+        return self.thread_poster.store.list(status=status, limit=limit)
+
+    def schedule_post(self, content: str, run_at: str, timezone_str: Optional[str] = None) -> dict:
+        """
+        安排一条在指定时间发送的一次性推文
+
+        Args:
+            content: 推文内容
+            run_at: 发送时间，如 "2026-11-03 14:35 ET" 或带偏移的 ISO 时间
+            timezone_str: run_at 未带时区时使用的时区，默认为调度器时区
+
+        Returns:
+            结果字典
+        """
+        if not self.oneoff_store:
+            return {'success': False, 'error': '一次性定时推文功能未启用'}
+        if not content or not content.strip():
+            return {'success': False, 'error': '推文内容为空'}
+
+        try:
+            due_at = parse_due_time(run_at, timezone_str or str(self.timezone))
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
+
+        if due_at <= self.now():
+            return {'success': False, 'error': '发送时间必须晚于当前时间'}
+
+        post_id = self.oneoff_store.add(content, due_at, timezone_str)
+        logger.info(f"已安排一次性定时推文 #{post_id}: {due_at.astimezone(self.timezone)}")
+        if self.is_running:
+            self._arm_oneoff_timer()
+
+        return {
+            'success': True,
+            'id': post_id,
+            'due_at': due_at.isoformat()
+        }
+
+    def cancel_scheduled_post(self, post_id: int) -> bool:
+        """
+        取消一条待发送的一次性推文
+
+        Returns:
+            是否取消成功
+        """
+        if not self.oneoff_store:
+            return False
+        cancelled = self.oneoff_store.cancel(post_id)
+        if cancelled:
+            logger.info(f"已取消一次性定时推文 #{post_id}")
+            if self.is_running:
+                self._arm_oneoff_timer()
+        return cancelled
+
+    def list_scheduled_posts(self, status: Optional[str] = 'pending', limit: int = 100) -> list:
+        """
+        列出一次性定时推文
+
+        Args:
+            status: 按状态过滤，为空时返回全部
+            limit: 最多返回条数
+
+        Returns:
+            定时推文列表
+        """
+        if not self.oneoff_store:
+            return []
+        return self.oneoff_store.list(status=status, limit=limit)
+
+    def _auto_tweet_job(self, fixed_content=None, tweet_time=None):
         """
         自动发推任务
 
+        内容优先级: 内容日历条目 > 固定内容 > LLM 生成
+
         Args:
             fixed_content: 固定内容，如果提供则使用固定内容，否则使用 LLM 生成
+            tweet_time: 触发本次任务的时间段（HH:MM），用于匹配内容日历
         """
+        run = self.watchdog.begin(f'tweet_{tweet_time}', self.timeouts.get('job_seconds', 300))
+        success = False
         try:
-            current_time = datetime.now(self.timezone).strftime("%Y-%m-%d %H:%M:%S %Z")
+            current_time = self.now().strftime("%Y-%m-%d %H:%M:%S %Z")
             logger.info(f"开始执行自动发推任务 (当前时间: {current_time})")
 
             # 获取推文内容
-            if fixed_content:
+            calendar_entry = self._get_calendar_entry(tweet_time)
+            media_paths = self._get_entry_media(calendar_entry)
+            if calendar_entry:
+                tweet_content = calendar_entry['content']
+                logger.info(f"使用内容日历中的推文内容 ({calendar_entry['time']})")
+            elif fixed_content:
                 tweet_content = fixed_content
                 logger.info("使用固定推文内容")
             else:
-                # 延迟导入 LLM 客户端
-                from llm.llm_client import llm_client
                 # 生成推文内容
-                tweet_content = llm_client.generate_tweet()
+                tweet_content = self._generate(run)
                 if not tweet_content:
                     logger.error("生成推文内容失败，跳过本次发推")
                     return
+                tweet_content = self._postprocess(run, tweet_content)
                 logger.info("使用 LLM 生成的推文内容")
 
-            # 延迟导入 Twitter 客户端
-            from twitter.api_client import twitter_client
             # 发送推文
-            result = twitter_client.post_tweet(tweet_content)
+            twitter_client = self._get_twitter_client()
+            post_started = time.monotonic()
+            result = self._post(run, tweet_content, media_paths)
             if result and result.get('success'):
+                success = True
+                if result.get('thread_id') is None and not media_paths:
+                    self.prewarmer.record_post_latency(
+                        time.monotonic() - post_started, getattr(twitter_client, 'last_request_latency', None)
+                    )
                 logger.info(f"自动发推成功: {result.get('url')}")
             else:
                 logger.error("自动发推失败")
 
+        except (DeadlineExceeded, JobCancelled) as e:
+            logger.error(f"自动发推任务超时，已放弃本次发推: {e}")
         except Exception as e:
             logger.error(f"执行自动发推任务时发生错误: {e}")
+        finally:
+            self.watchdog.finish(run, success)
     
     def start(self):
         """启动调度器"""
@@ -116,10 +847,37 @@ class JobScheduler:
             return
 
         try:
+            if self.pools.closed:
+                # 停止后重新启动时重新创建执行器池
+                self.pools = ExecutorPools(self.executor_config)
             self.scheduler.start()
+            self.watchdog.start()
             self.is_running = True
             logger.info("定时任务调度器已启动")
 
+            if self.oneoff_store:
+                self.oneoff_store.recover_interrupted()
+                self._arm_oneoff_timer()
+
+            if self.thread_poster:
+                # 从中断处续发上次未发送完的推文串
+                self.thread_poster.recover_interrupted()
+                self.scheduler.add_job(
+                    func=self._resume_threads_job,
+                    id='thread_resume',
+                    name='续发推文串',
+                    replace_existing=True
+                )
+
+            if self.timeline_sync:
+                # 启动时先同步一次，补上停机期间发送的推文
+                self.scheduler.add_job(
+                    func=self._timeline_sync_job,
+                    id='timeline_sync_startup',
+                    name='同步本地推文存储',
+                    replace_existing=True
+                )
+
             # 显示下次运行时间
             next_run = self.get_next_run_time()
             logger.info(f"下次发推时间: {next_run}")
@@ -135,6 +893,8 @@ class JobScheduler:
 
         try:
             self.scheduler.shutdown(wait=False)
+            self.watchdog.stop()
+            self.pools.shutdown()
             self.is_running = False
             logger.info("定时任务调度器已停止")
 
@@ -153,8 +913,11 @@ class JobScheduler:
             if not jobs:
                 return "无定时任务"
 
-            # 获取所有任务的下次运行时间
-            next_runs = [job.next_run_time for job in jobs if job.next_run_time]
+            # 获取所有发推任务的下次运行时间（调度器未启动时任务尚无 next_run_time）
+            next_runs = [
+                job.next_run_time for job in jobs
+                if job.id.startswith(self.POST_JOB_PREFIXES) and getattr(job, 'next_run_time', None)
+            ]
             if not next_runs:
                 return "无定时任务"
 
@@ -175,7 +938,7 @@ class JobScheduler:
         jobs = self.scheduler.get_jobs()
 
         # 获取当前时区时间
-        current_time = datetime.now(self.timezone).strftime("%Y-%m-%d %H:%M:%S %Z")
+        current_time = self.now().strftime("%Y-%m-%d %H:%M:%S %Z")
 
         status = {
             'is_running': self.is_running,
@@ -185,21 +948,68 @@ class JobScheduler:
             'timezone': str(self.timezone),
             'tweet_times': self.scheduler_config.get('tweet_times', []),
             'tweets_per_day': self.scheduler_config.get('tweets_per_day', 0),
-            'fixed_content': self.scheduler_config.get('fixed_content', None)
+            'fixed_content': self.scheduler_config.get('fixed_content', None),
+            'content_calendar': self.content_calendar.get_status() if self.content_calendar else None,
+            'watchdog': self.watchdog.get_status(),
+            'prewarm': self.prewarmer.get_status(),
+            'oneoff_pending': self.oneoff_store.count_pending() if self.oneoff_store else 0,
+            'thread': self.thread_poster.get_status() if self.thread_poster else None,
+            'timeline': self.timeline_sync.get_status() if self.timeline_sync else None,
+            'metrics': self.metrics_collector.get_status() if self.metrics_collector else None,
+            'optimizer': self.posting_optimizer.get_status() if self.posting_optimizer else None,
+            'draft_ranker': self.draft_ranker.get_status()
         }
 
         return status
     
-    def manual_tweet(self, custom_content: str = None) -> dict:
+    def get_executor_metrics(self) -> dict:
+        """
+        获取执行器指标（调度线程池和各阶段执行器池的队列深度、并发数、利用率）
+
+        Returns:
+            指标字典
+        """
+        with self._job_events_lock:
+            running = dict(self._running_instances)
+            skipped = self._skipped_instances
+        workers = self.executor_config.get('scheduler_threads', 10)
+        total = sum(running.values())
+        return {
+            'stages': self.pools.get_metrics(),
+            'scheduler': {
+                'workers': workers,
+                'active': min(total, workers),
+                # 超出调度线程数的实例在线程池中排队
+                'queue_depth': max(0, total - workers),
+                'running_instances': running,
+                'skipped_max_instances': skipped,
+                # 调度器启动前任务尚未应用默认值，按配置计算
+                'max_instances': {
+                    job.id: self._get_max_instances(job.id) for job in self.scheduler.get_jobs()
+                }
+            }
+        }
+
+    def manual_tweet(self, custom_content: str = None, timeout_seconds: Optional[float] = None,
+                     media_paths: Optional[List[str]] = None) -> dict:
         """
         手动触发发推
+
+        整个请求共用一个截止时间，令牌刷新、生成和发送的每一跳只使用剩余的时间预算
         
         Args:
             custom_content: 自定义推文内容，如果不提供则自动生成
+            timeout_seconds: 本次请求的时间预算（秒），默认为 timeouts.manual_seconds
+            media_paths: 附带的图片或视频文件路径
             
         Returns:
-            发推结果字典
+            发推结果字典（超时时包含 timed_out 和超时的阶段 phase）
         """
+        budget = self.timeouts.get('manual_seconds', 90)
+        if timeout_seconds is not None:
+            budget = min(budget, timeout_seconds)
+        run = self.watchdog.begin('manual', budget)
+        success = False
         try:
             logger.info("开始手动发推")
 
@@ -208,42 +1018,56 @@ class JobScheduler:
                 tweet_content = custom_content
                 logger.info("使用自定义推文内容")
             else:
-                # 延迟导入 LLM 客户端
-                from llm.llm_client import llm_client
-                tweet_content = llm_client.generate_tweet()
+                tweet_content = self._generate(run)
                 if not tweet_content:
                     return {
                         'success': False,
                         'error': '生成推文内容失败'
                     }
+                tweet_content = self._postprocess(run, tweet_content)
                 logger.info("使用自动生成的推文内容")
 
-            # 延迟导入 Twitter 客户端
-            from twitter.api_client import twitter_client
             # 发送推文
-            result = twitter_client.post_tweet(tweet_content)
+            result = self._post(run, tweet_content, media_paths)
 
             if result and result.get('success'):
+                success = True
                 logger.info(f"手动发推成功: {result.get('url')}")
-                return {
+                response = {
                     'success': True,
                     'tweet_id': result.get('id'),
                     'tweet_url': result.get('url'),
-                    'content': tweet_content
+                    'content': tweet_content,
+                    'media_ids': result.get('media_ids')
                 }
+                if result.get('thread_id') is not None:
+                    response['thread_id'] = result['thread_id']
+                    response['tweet_ids'] = result.get('tweet_ids')
+                return response
             else:
                 logger.error("手动发推失败")
                 return {
                     'success': False,
-                    'error': '发送推文失败'
+                    'error': (result or {}).get('error') or '发送推文失败',
+                    'thread_id': (result or {}).get('thread_id')
                 }
-                
+
+        except (DeadlineExceeded, JobCancelled) as e:
+            logger.error(f"手动发推超时: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'timed_out': True,
+                'phase': getattr(e, 'phase', run.phase)
+            }
         except Exception as e:
             logger.error(f"手动发推时发生错误: {e}")
             return {
                 'success': False,
                 'error': str(e)
             }
+        finally:
+            self.watchdog.finish(run, success)
     
     def update_schedule(self, tweet_times: List[str] = None, fixed_content: str = None, timezone_str: str = None):
         """
@@ -268,7 +1092,14 @@ class JobScheduler:
                 # 重新创建调度器以应用新时区
                 if self.is_running:
                     self.scheduler.shutdown(wait=False)
-                self.scheduler = BackgroundScheduler(timezone=self.timezone)
+                self.scheduler = self._create_scheduler()
+                # 旧调度器的执行器池一并关闭
+                self.pools.shutdown()
+                self.pools = ExecutorPools(self.executor_config)
+                # 日历中未带时区的条目按新时区解析
+                self.content_calendar = self._setup_content_calendar()
+                if self.posting_optimizer:
+                    self.posting_optimizer.set_timezone(self.timezone)
 
             # 重新设置任务
             self._setup_jobs()
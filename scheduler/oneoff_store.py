@@ -0,0 +1,275 @@
+"""
+一次性定时推文存储模块
+使用 SQLite 持久化"在某个确切时间发送某条推文"的任务，
+待发送任务按发送时间建立部分索引，获取最早的待发任务为 O(log n)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+import pytz
+from utils.logger import logger
+
+
+# 常用时区缩写（按美国时间习惯，自动处理夏令时）
+TIMEZONE_ALIASES = {
+    'ET': 'America/New_York',
+    'EST': 'America/New_York',
+    'EDT': 'America/New_York',
+    'CT': 'America/Chicago',
+    'CST': 'America/Chicago',
+    'CDT': 'America/Chicago',
+    'MT': 'America/Denver',
+    'MST': 'America/Denver',
+    'MDT': 'America/Denver',
+    'PT': 'America/Los_Angeles',
+    'PST': 'America/Los_Angeles',
+    'PDT': 'America/Los_Angeles',
+    'UTC': 'UTC',
+    'GMT': 'UTC'
+}
+
+
+def parse_due_time(value: str, timezone_str: Optional[str] = None) -> datetime:
+    """
+    解析发送时间
+
+    支持的格式:
+        "2026-11-03T14:35:00-05:00"  带偏移的 ISO 时间
+        "2026-11-03 14:35 ET"        结尾带时区缩写或 IANA 时区名
+        "2026-11-03 14:35"           使用 timezone_str 指定的时区
+
+    Args:
+        value: 时间字符串
+        timezone_str: 时间未带时区信息时使用的时区
+
+    Returns:
+        带时区的 datetime（UTC）
+
+    Raises:
+        ValueError: 时间格式或时区无效
+    """
+    value = value.strip()
+    parts = value.rsplit(' ', 1)
+    if len(parts) == 2 and not parts[1][:1].isdigit():
+        value, timezone_str = parts[0], parts[1]
+
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        if not timezone_str:
+            raise ValueError(f"发送时间缺少时区信息: {value}")
+        try:
+            tz = pytz.timezone(TIMEZONE_ALIASES.get(timezone_str.upper(), timezone_str))
+        except pytz.UnknownTimeZoneError:
+            raise ValueError(f"未知时区: {timezone_str}")
+        dt = tz.localize(dt)
+    return dt.astimezone(pytz.utc)
+
+
+class OneOffStore:
+    """一次性定时推文存储类"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS oneoff_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            due_at REAL NOT NULL,
+            content TEXT NOT NULL,
+            timezone TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at REAL NOT NULL,
+            posted_at REAL,
+            tweet_id TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_oneoff_pending_due
+            ON oneoff_posts(due_at) WHERE status = 'pending';
+    """
+
+    def __init__(self, db_path: str = 'data/oneoff_posts.db'):
+        """
+        初始化存储（首次使用时才创建数据库文件）
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接"""
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        """将数据行转换为字典（时间转换为 ISO 字符串）"""
+        item = dict(row)
+        for key in ('due_at', 'created_at', 'posted_at'):
+            if item.get(key) is not None:
+                item[key] = datetime.fromtimestamp(item[key], pytz.utc).isoformat()
+        return item
+
+    def add(self, content: str, due_at: datetime, timezone_str: Optional[str] = None) -> int:
+        """
+        添加一条定时推文
+
+        Args:
+            content: 推文内容
+            due_at: 发送时间（带时区）
+            timezone_str: 原始时区（仅用于展示）
+
+        Returns:
+            任务 ID
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "INSERT INTO oneoff_posts (due_at, content, timezone, created_at) VALUES (?, ?, ?, ?)",
+                (due_at.timestamp(), content, timezone_str, time.time())
+            )
+            return cursor.lastrowid
+
+    def cancel(self, post_id: int) -> bool:
+        """
+        取消一条待发送的定时推文
+
+        Returns:
+            是否取消成功（已发送或不存在时返回 False）
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE oneoff_posts SET status = 'cancelled' WHERE id = ? AND status = 'pending'",
+                (post_id,)
+            )
+            return cursor.rowcount > 0
+
+    def next_due_time(self) -> Optional[datetime]:
+        """
+        获取最早的待发送时间
+
+        Returns:
+            发送时间（UTC），没有待发送任务时返回 None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT MIN(due_at) FROM oneoff_posts WHERE status = 'pending'"
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return datetime.fromtimestamp(row[0], pytz.utc)
+
+    def claim_due(self, now: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        取出已到发送时间的任务并标记为发送中（同一任务只会被取出一次）
+
+        Args:
+            now: 当前时间
+            limit: 最多取出的任务数
+
+        Returns:
+            任务列表
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM oneoff_posts WHERE status = 'pending' AND due_at <= ? "
+                    "ORDER BY due_at LIMIT ?",
+                    (now.timestamp(), limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE oneoff_posts SET status = 'posting' WHERE id = ?",
+                    [(row['id'],) for row in rows]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return [self._row_to_dict(row) for row in rows]
+
+    def mark_posted(self, post_id: int, tweet_id: str):
+        """标记任务已发送"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE oneoff_posts SET status = 'posted', posted_at = ?, tweet_id = ?, error = NULL WHERE id = ?",
+                (time.time(), str(tweet_id), post_id)
+            )
+
+    def mark_failed(self, post_id: int, error: str):
+        """标记任务发送失败"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE oneoff_posts SET status = 'failed', error = ? WHERE id = ?",
+                (error, post_id)
+            )
+
+    def mark_unknown(self, post_id: int, error: str):
+        """
+        标记任务发送结果未知（发送阶段超时被放弃，请求可能已经发出）
+
+        结果未知的任务不会再次发送，等被放弃的发送阶段结束（或同步时间线）后再标记为已发送或失败
+        """
+        with self._lock:
+            self._connect().execute(
+                "UPDATE oneoff_posts SET status = 'unknown', error = ? WHERE id = ?",
+                (error, post_id)
+            )
+
+    def recover_interrupted(self) -> int:
+        """
+        处理上次运行时中断在"发送中"状态的任务
+
+        无法确认这些推文是否已经发出，为避免重复发送，统一标记为结果未知（同步时间线后确认）
+
+        Returns:
+            处理的任务数
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE oneoff_posts SET status = 'unknown', error = ? WHERE status = 'posting'",
+                ('发送过程中程序中断，无法确认是否已经发出',)
+            )
+        if cursor.rowcount:
+            logger.warning(f"有 {cursor.rowcount} 条定时推文在上次运行中断时处于发送中状态，已标记为结果未知")
+        return cursor.rowcount
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        列出定时推文
+
+        Args:
+            status: 按状态过滤（pending / posting / posted / unknown / failed / cancelled）
+            limit: 最多返回条数
+
+        Returns:
+            任务列表（按发送时间排序）
+        """
+        with self._lock:
+            if status:
+                rows = self._connect().execute(
+                    "SELECT * FROM oneoff_posts WHERE status = ? ORDER BY due_at LIMIT ?",
+                    (status, limit)
+                ).fetchall()
+            else:
+                rows = self._connect().execute(
+                    "SELECT * FROM oneoff_posts ORDER BY due_at LIMIT ?", (limit,)
+                ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def count_pending(self) -> int:
+        """获取待发送任务数"""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM oneoff_posts WHERE status = 'pending'"
+            ).fetchone()[0]
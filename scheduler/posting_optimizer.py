@@ -0,0 +1,210 @@
+"""
+发推时间优化模块
+根据历史推文的表现（发送后固定时长的互动数 / 曝光数），按调度器时区统计每周 168 个小时段的互动率：
+相邻时段平滑（环形高斯核）、以全局互动率为先验的 Beta 后验、给出置信区间，推荐表现最好的 N 个时段，
+并可通过 JobScheduler.update_schedule 应用；新的指标到达时只处理新满足时长的推文
+"""
+
+import threading
+import time
+from datetime import datetime
+from statistics import NormalDist
+from typing import Optional, List, Dict, Any
+import numpy as np
+import pytz
+from utils.logger import logger
+from twitter.metrics_store import engagement_of
+
+
+HOURS_PER_WEEK = 168
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+
+class PostingTimeOptimizer:
+    """发推时间优化器类"""
+
+    def __init__(self, metrics_store, optimizer_config: Optional[dict] = None, timezone=None):
+        """
+        初始化优化器
+
+        Args:
+            metrics_store: 推文指标时序存储
+            optimizer_config: 优化配置（scheduler.optimizer）
+            timezone: 调度器时区（pytz 时区）
+        """
+        optimizer_config = optimizer_config or {}
+        self.metrics_store = metrics_store
+        self.timezone = timezone or pytz.utc
+        # 比较推文发送后这么久的表现（未满该时长的推文不计入）
+        self.horizon_hours = optimizer_config.get('horizon_hours', 24)
+        # 平滑核的标准差（小时），0 表示不平滑
+        self.smoothing_hours = optimizer_config.get('smoothing_hours', 1.0)
+        # 先验强度（相当于多少次曝光的全局平均互动率），数据少的时段向全局平均收缩
+        self.prior_impressions = optimizer_config.get('prior_impressions', 2000)
+        self.confidence = optimizer_config.get('confidence', 0.9)
+        self.min_tweets = optimizer_config.get('min_tweets', 20)
+        self.min_gap_hours = optimizer_config.get('min_gap_hours', 3)
+        # 按置信下界（lower）还是后验均值（mean）排序
+        self.rank_by = optimizer_config.get('rank_by', 'lower')
+
+        self._lock = threading.Lock()
+        # 已计入的推文: 每条推文的时段、互动数、曝光数
+        self._seen = set()
+        self._posted_at: List[float] = []
+        self._engagements: List[float] = []
+        self._impressions: List[float] = []
+        self._buckets = np.zeros(0, dtype=np.int64)
+        self._updated_at = None
+
+    def set_timezone(self, timezone):
+        """更换时区（按新时区重新划分时段）"""
+        with self._lock:
+            self.timezone = timezone
+            self._buckets = self._bucket_of(np.asarray(self._posted_at, dtype=np.float64))
+
+    def _bucket_of(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        计算时间戳在调度器时区下的周内小时（周一 0 点为 0）
+
+        UTC 偏移随夏令时变化，逐条取得偏移后向量化计算
+        """
+        if not len(timestamps):
+            return np.zeros(0, dtype=np.int64)
+        offsets = np.array([
+            datetime.fromtimestamp(ts, self.timezone).utcoffset().total_seconds() for ts in timestamps
+        ])
+        local = (timestamps + offsets).astype(np.int64)
+        # 1970-01-01 是周四，加 3 天使周一为 0
+        return ((local // 3600) + 72) % HOURS_PER_WEEK
+
+    def refresh(self) -> int:
+        """
+        读取新满足时长的推文并计入统计（已计入的推文不再读取）
+
+        Returns:
+            新计入的推文数
+        """
+        with self._lock:
+            rows = self.metrics_store.values_at(self.horizon_hours * 3600, exclude=self._seen)
+            added = []
+            for tweet_id, values in rows.items():
+                # 满足时长后该时刻的指标不再变化，每条推文只读取一次
+                self._seen.add(tweet_id)
+                impressions = values.get('impression_count') or 0
+                if impressions <= 0:
+                    # 没有曝光数据的推文无法计算互动率
+                    continue
+                self._posted_at.append(values['posted_at'])
+                self._engagements.append(float(engagement_of(values)))
+                self._impressions.append(float(impressions))
+                added.append(values['posted_at'])
+            if added:
+                self._buckets = np.concatenate([self._buckets, self._bucket_of(np.asarray(added, dtype=np.float64))])
+                logger.info(f"发推时间统计新增 {len(added)} 条推文，共 {len(self._seen)} 条")
+            self._updated_at = time.time()
+            return len(added)
+
+    def _smooth(self, values: np.ndarray) -> np.ndarray:
+        """环形高斯平滑（周日 23 点与周一 0 点相邻）"""
+        if not self.smoothing_hours:
+            return values
+        radius = int(np.ceil(self.smoothing_hours * 3))
+        offsets = np.arange(-radius, radius + 1)
+        weights = np.exp(-0.5 * (offsets / self.smoothing_hours) ** 2)
+        weights /= weights[radius]
+        padded = np.concatenate([values[-radius:], values, values[:radius]])
+        return np.convolve(padded, weights, mode='valid')
+
+    def analyze(self) -> Dict[str, Any]:
+        """
+        计算每个时段的互动率
+
+        Returns:
+            {'tweets', 'global_rate', 'tweets_per_bucket', 'rate', 'lower', 'upper'}，后四项为长度 168 的数组
+        """
+        with self._lock:
+            buckets = self._buckets
+            engagements = np.asarray(self._engagements, dtype=np.float64)
+            impressions = np.asarray(self._impressions, dtype=np.float64)
+        counts = np.bincount(buckets, minlength=HOURS_PER_WEEK)
+        successes = np.bincount(buckets, weights=engagements, minlength=HOURS_PER_WEEK)
+        trials = np.bincount(buckets, weights=impressions, minlength=HOURS_PER_WEEK)
+        global_rate = successes.sum() / trials.sum() if trials.sum() > 0 else 0.0
+        # 避免先验的 Beta 参数为 0
+        global_rate = min(max(global_rate, 1e-6), 1 - 1e-6)
+
+        successes = np.minimum(self._smooth(successes), self._smooth(trials))
+        trials = self._smooth(trials)
+        alpha = self.prior_impressions * global_rate + successes
+        beta = self.prior_impressions * (1 - global_rate) + trials - successes
+        total = alpha + beta
+        mean = alpha / total
+        std = np.sqrt(alpha * beta / (total ** 2 * (total + 1)))
+        z = NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        return {
+            'tweets': int(counts.sum()),
+            'global_rate': global_rate,
+            'tweets_per_bucket': counts,
+            'rate': mean,
+            'lower': np.clip(mean - z * std, 0.0, 1.0),
+            'upper': np.clip(mean + z * std, 0.0, 1.0)
+        }
+
+    @staticmethod
+    def _pick(scores: np.ndarray, n: int, gap: int, period: int) -> List[int]:
+        """按分数从高到低选出 n 个位置，任意两个位置在环上的距离不小于 gap"""
+        chosen = []
+        for index in np.argsort(-scores, kind='stable'):
+            if all(min(abs(index - other), period - abs(index - other)) >= gap for other in chosen):
+                chosen.append(int(index))
+                if len(chosen) == n:
+                    break
+        return chosen
+
+    def recommend(self, n: int = 1) -> Dict[str, Any]:
+        """
+        推荐发推时段
+
+        Args:
+            n: 推荐的时段数
+
+        Returns:
+            {'success', 'tweets', 'global_rate', 'slots': 每周时段（含互动率和置信区间）,
+             'tweet_times': 每天的发推时间（HH:MM，按小时汇总七天的数据）}；数据不足时 success 为 False
+        """
+        analysis = self.analyze()
+        if analysis['tweets'] < self.min_tweets:
+            return {'success': False, 'tweets': analysis['tweets'],
+                    'message': f"已满 {self.horizon_hours} 小时的推文不足 {self.min_tweets} 条"}
+
+        scores = analysis['lower'] if self.rank_by == 'lower' else analysis['rate']
+        slots = [{
+            'weekday': WEEKDAYS[bucket // 24],
+            'hour': bucket % 24,
+            'rate': round(float(analysis['rate'][bucket]), 6),
+            'lower': round(float(analysis['lower'][bucket]), 6),
+            'upper': round(float(analysis['upper'][bucket]), 6),
+            'tweets': int(analysis['tweets_per_bucket'][bucket])
+        } for bucket in self._pick(scores, n, self.min_gap_hours, HOURS_PER_WEEK)]
+
+        # 调度器按天重复发推，把七天同一小时的分数取平均后选出每天的时间
+        daily = scores.reshape(7, 24).mean(axis=0)
+        hours = sorted(self._pick(daily, n, self.min_gap_hours, 24))
+        return {
+            'success': True,
+            'tweets': analysis['tweets'],
+            'global_rate': round(float(analysis['global_rate']), 6),
+            'timezone': str(self.timezone),
+            'slots': slots,
+            'tweet_times': [f"{hour:02d}:00" for hour in hours]
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取优化器状态"""
+        with self._lock:
+            return {
+                'tweets': len(self._seen),
+                'horizon_hours': self.horizon_hours,
+                'updated_at': (datetime.fromtimestamp(self._updated_at, pytz.utc).isoformat()
+                               if self._updated_at else None)
+            }
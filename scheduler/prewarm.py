@@ -0,0 +1,189 @@
+"""
+连接预热模块
+在每个定时发推时间点之前执行：解析 DNS、通过代理建立并保持 api.twitter.com 和 OpenAI 的长连接、
+令牌即将过期时提前刷新，使发推时只需要一次请求往返
+"""
+
+import socket
+import threading
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse
+from utils.logger import logger
+
+
+class ConnectionPrewarmer:
+    """连接预热器类"""
+
+    TWITTER_API_URL = "https://api.twitter.com/2/openapi.json"
+
+    def __init__(self, prewarm_config: Optional[dict] = None, history_size: int = 50):
+        """
+        初始化连接预热器
+
+        Args:
+            prewarm_config: 预热配置（scheduler.prewarm）
+            history_size: 保留的预热和发推耗时记录数
+        """
+        self.prewarm_config = prewarm_config or {}
+        self._lock = threading.Lock()
+        self._last_result = None
+        self._last_prewarm_at = None
+        self._post_latencies = deque(maxlen=history_size)
+
+    def _get_targets(self, llm_client) -> List[str]:
+        """获取需要预热的 URL 列表"""
+        targets = [self.TWITTER_API_URL]
+        if llm_client is not None and getattr(llm_client, 'client', None):
+            targets.extend(backend.base_url + '/models' for backend in llm_client.backends)
+        targets.extend(self.prewarm_config.get('extra_urls') or [])
+        return targets
+
+    def _get_proxy_urls(self) -> List[Optional[str]]:
+        """
+        获取需要预热的代理（发推时会按权重从代理池中选择，默认预热所有未摘除的代理）
+        """
+        from utils.proxy import proxy_manager
+
+        if not proxy_manager.is_proxy_enabled():
+            return [None]
+        if not self.prewarm_config.get('warm_all_proxies', True):
+            return [proxy_manager.select_proxy()]
+        healthy = [endpoint.url for endpoint in proxy_manager.endpoints if not endpoint.ejected]
+        return healthy or [proxy_manager.select_proxy()]
+
+    @staticmethod
+    def _resolve(host: str) -> Dict[str, Any]:
+        """解析 DNS"""
+        started = time.monotonic()
+        try:
+            addresses = socket.getaddrinfo(host, 443, proto=socket.IPPROTO_TCP)
+            return {
+                'host': host,
+                'ok': True,
+                'addresses': len(addresses),
+                'ms': round((time.monotonic() - started) * 1000, 1)
+            }
+        except OSError as e:
+            return {'host': host, 'ok': False, 'error': str(e)}
+
+    def _warm_connection(self, url: str, proxy_url: Optional[str], llm_client) -> Dict[str, Any]:
+        """
+        通过指定代理向目标主机发送一次 HEAD 请求，请求完成后连接留在共享连接池中
+
+        LLM 后端使用对应的 httpx 连接池，其余主机使用 requests 连接池
+        """
+        from utils.transport import transport_manager
+        from utils.proxy import proxy_manager
+
+        host = urlparse(url).hostname
+        timeout = self.prewarm_config.get('timeout', 10)
+        started = time.monotonic()
+        try:
+            llm_hosts = {backend.host for backend in getattr(llm_client, 'backends', [])}
+            if host in llm_hosts:
+                client = transport_manager.get_httpx_client(proxy_url, host)
+                response = client.head(url, timeout=timeout)
+            else:
+                response = transport_manager.get_session(proxy_url).head(url, timeout=timeout)
+            latency = time.monotonic() - started
+            proxy_manager.report(proxy_url, True, latency)
+            return {'url': url, 'ok': True, 'status_code': response.status_code, 'ms': round(latency * 1000, 1)}
+        except Exception as e:
+            proxy_manager.report(proxy_url, False, error=str(e))
+            return {'url': url, 'ok': False, 'error': str(e)}
+
+    def prewarm(self, token_manager=None, llm_client=None) -> Dict[str, Any]:
+        """
+        执行一次预热
+
+        Args:
+            token_manager: 令牌管理器，为 None 时跳过令牌刷新
+            llm_client: LLM 客户端，为 None 时跳过 OpenAI 连接预热
+
+        Returns:
+            预热结果字典
+        """
+        started = time.monotonic()
+        result = {'dns': [], 'connections': [], 'token_refreshed': False}
+
+        # 1. 令牌即将过期时提前刷新（刷新请求本身也会预热 api.twitter.com 的连接）
+        if token_manager is not None:
+            margin = self.prewarm_config.get('token_refresh_margin_seconds', 600)
+            try:
+                result['token_refreshed'] = token_manager.refresh_if_expiring(margin)
+            except Exception as e:
+                logger.error(f"预热时刷新令牌失败: {e}")
+
+        targets = self._get_targets(llm_client)
+        proxy_urls = self._get_proxy_urls()
+
+        # 2. 解析 DNS（socks5:// 代理在本地解析目标主机，socks5h:// 由代理解析，只需解析代理主机）
+        hosts = {urlparse(url).hostname for url in targets}
+        hosts.update(urlparse(proxy_url).hostname for proxy_url in proxy_urls if proxy_url)
+        result['dns'] = [self._resolve(host) for host in sorted(host for host in hosts if host)]
+
+        # 3. 并发建立连接
+        threads = []
+        connections = []
+        for proxy_url in proxy_urls:
+            for url in targets:
+                thread = threading.Thread(
+                    target=lambda u=url, p=proxy_url: connections.append(self._warm_connection(u, p, llm_client)),
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        deadline = time.monotonic() + self.prewarm_config.get('timeout', 10) + 5
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        result['connections'] = list(connections)
+
+        result['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        warmed = sum(1 for item in result['connections'] if item['ok'])
+        logger.info(f"连接预热完成: {warmed}/{len(threads)} 个连接, 耗时 {result['duration_ms']} ms"
+                    + (", 已刷新访问令牌" if result['token_refreshed'] else ""))
+
+        with self._lock:
+            self._last_result = result
+            self._last_prewarm_at = time.time()
+        return result
+
+    def _is_warm(self) -> bool:
+        """最近一次预热是否在有效期内（调用方需持有锁）"""
+        max_age = self.prewarm_config.get('max_age_seconds', 120)
+        return self._last_prewarm_at is not None and time.time() - self._last_prewarm_at <= max_age
+
+    def record_post_latency(self, seconds: float, request_seconds: Optional[float] = None):
+        """
+        记录一次发推耗时
+
+        Args:
+            seconds: 发送阶段总耗时
+            request_seconds: 其中 API 请求本身的耗时
+        """
+        with self._lock:
+            self._post_latencies.append({
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'warm': self._is_warm(),
+                'post_ms': round(seconds * 1000, 1),
+                'request_ms': round(request_seconds * 1000, 1) if request_seconds is not None else None
+            })
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取预热状态
+
+        Returns:
+            状态字典（最近一次预热结果和最近的发推耗时）
+        """
+        with self._lock:
+            return {
+                'enabled': self.prewarm_config.get('enabled', True),
+                'lead_seconds': self.prewarm_config.get('lead_seconds', 30),
+                'last_prewarm_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._last_prewarm_at))
+                if self._last_prewarm_at else None,
+                'last_result': self._last_result,
+                'recent_posts': list(self._post_latencies)
+            }
@@ -0,0 +1,246 @@
+"""
+调度模拟模块
+使用虚拟时钟驱动 JobScheduler，LLM 和 Twitter 客户端替换为桩实现，
+可以在几秒内回放一个月（含夏令时切换）的定时发推，并输出每条推文的发送时间；
+调度器使用的推文串、内容日历索引、推文和指标存储都放在临时目录中，不读写 data/ 下的真实状态
+"""
+
+import copy
+import heapq
+import itertools
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+import pytz
+from utils.config_loader import config_loader
+from utils.logger import logger
+
+
+class VirtualClock:
+    """虚拟时钟类 - 时间只在模拟器推进时变化"""
+
+    def __init__(self, start: datetime):
+        """
+        初始化虚拟时钟
+
+        Args:
+            start: 起始时间（带时区）
+        """
+        self._now = start.astimezone(pytz.utc)
+
+    def __call__(self) -> datetime:
+        """获取当前虚拟时间（UTC）"""
+        return self._now
+
+    def advance_to(self, moment: datetime):
+        """将时钟推进到指定时间"""
+        self._now = moment.astimezone(pytz.utc)
+
+
+class StubLLMClient:
+    """LLM 客户端桩实现，不调用 OpenAI API"""
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.call_count = 0
+
+    def generate_tweet(self, custom_prompt: Optional[str] = None, allow_long: bool = False) -> Optional[str]:
+        """生成一条模拟推文"""
+        self.call_count += 1
+        return f"[模拟] LLM 推文 #{self.call_count} ({self.clock().strftime('%Y-%m-%d %H:%M UTC')})"
+
+    def generate_multiple_tweets(self, count: int = 3) -> List[str]:
+        """生成多条模拟推文"""
+        return [self.generate_tweet() for _ in range(count)]
+
+
+class StubTwitterClient:
+    """Twitter 客户端桩实现，只记录发推请求"""
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.posts: List[Dict[str, Any]] = []
+
+    def post_tweet(self, content: str, in_reply_to_tweet_id: Optional[str] = None,
+                   media_paths: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """记录一次模拟发推（不上传媒体，只记录文件路径）"""
+        tweet_id = f"sim-{len(self.posts) + 1}"
+        self.posts.append({'id': tweet_id, 'content': content, 'in_reply_to': in_reply_to_tweet_id,
+                           'media_paths': media_paths, 'posted_at': self.clock()})
+        return {
+            'id': tweet_id,
+            'url': f"https://twitter.com/user/status/{tweet_id}",
+            'content': content,
+            'media_ids': None,
+            'success': True
+        }
+
+
+class ScheduleSimulator:
+    """调度模拟器类"""
+
+    # 参与模拟的任务 ID 前缀
+    SIMULATED_JOB_PREFIXES = ('tweet_',)
+
+    def __init__(self, start: datetime, days: int = 30, timezones: Optional[List[str]] = None,
+                 scheduler_config: Optional[dict] = None):
+        """
+        初始化调度模拟器
+
+        Args:
+            start: 模拟起始时间（带时区）
+            days: 模拟天数
+            timezones: 要模拟的时区列表，默认为配置中的时区
+            scheduler_config: 调度器配置，默认读取配置文件（会被复制，不影响原配置）
+        """
+        base_config = scheduler_config if scheduler_config is not None else config_loader.get_scheduler_config()
+        self.base_config = copy.deepcopy(base_config)
+        self.start = start
+        self.end = start + timedelta(days=days)
+        self.timezones = timezones or [self.base_config.get('timezone', 'America/New_York')]
+        self.clock = VirtualClock(start)
+
+    def _create_scheduler(self, timezone_str: str, data_dir: str):
+        """
+        为指定时区创建一个使用虚拟时钟和桩客户端的调度器
+
+        Args:
+            timezone_str: 时区
+            data_dir: 存放该调度器所有存储文件的临时目录
+        """
+        from scheduler.job_scheduler import JobScheduler
+        from scheduler.posting_optimizer import PostingTimeOptimizer
+        from twitter.tweet_store import TweetStore, TimelineSync
+        from twitter.metrics_store import MetricsStore, MetricsCollector
+
+        os.makedirs(data_dir, exist_ok=True)
+        scheduler_config = copy.deepcopy(self.base_config)
+        scheduler_config['timezone'] = timezone_str
+        # 模拟时不使用一次性定时推文，推文串进度和内容日历索引写到临时目录
+        scheduler_config['oneoff'] = {'enabled': False}
+        scheduler_config['thread'] = {**(scheduler_config.get('thread') or {}),
+                                      'db_path': os.path.join(data_dir, 'threads.db')}
+        if (scheduler_config.get('content_calendar') or {}).get('path'):
+            scheduler_config['content_calendar']['index_path'] = os.path.join(data_dir, 'calendar.idx')
+        job_scheduler = JobScheduler(scheduler_config=scheduler_config, clock=self.clock)
+        # 提示词变体统计、重复检测索引和发送历史只由真实的 LLM 和 Twitter 客户端写入，桩实现不会触及
+        job_scheduler.llm_backend = StubLLMClient(self.clock)
+        job_scheduler.twitter_backend = StubTwitterClient(self.clock)
+
+        # 依赖推文和指标存储的组件改用临时目录中的存储（推文、指标数据不会写入真实数据库）
+        tweets = TweetStore(os.path.join(data_dir, 'tweets.db'))
+        metrics = MetricsStore(os.path.join(data_dir, 'metrics.db'))
+        if job_scheduler.timeline_sync:
+            job_scheduler.timeline_sync = TimelineSync(tweets, job_scheduler.timeline_config)
+        if job_scheduler.metrics_collector:
+            job_scheduler.metrics_collector = MetricsCollector(metrics, tweets, job_scheduler.metrics_config)
+        if job_scheduler.posting_optimizer:
+            job_scheduler.posting_optimizer = PostingTimeOptimizer(
+                metrics, job_scheduler.optimizer_config, job_scheduler.timezone
+            )
+        return job_scheduler
+
+    @staticmethod
+    def _shutdown_scheduler(job_scheduler):
+        """停止调度器的看门狗并关闭执行器池（模拟时调度器本身从未启动）"""
+        job_scheduler.watchdog.stop()
+        job_scheduler.pools.shutdown(wait=True)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        执行模拟
+
+        Returns:
+            模拟报告字典
+        """
+        data_dir = tempfile.mkdtemp(prefix='schedule-simulation-')
+        schedulers = {}
+        try:
+            return self._simulate(schedulers, data_dir)
+        finally:
+            for job_scheduler in schedulers.values():
+                self._shutdown_scheduler(job_scheduler)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    def _simulate(self, schedulers: Dict[str, Any], data_dir: str) -> Dict[str, Any]:
+        """
+        依次为每个时区创建调度器并按时间顺序执行所有发推任务
+
+        Args:
+            schedulers: 时区 -> 调度器（创建后放入，供调用方在结束后关闭）
+            data_dir: 临时存储目录
+
+        Returns:
+            模拟报告字典
+        """
+        counter = itertools.count()
+        queue = []
+
+        for index, timezone_str in enumerate(self.timezones):
+            job_scheduler = self._create_scheduler(timezone_str, os.path.join(data_dir, str(index)))
+            schedulers[timezone_str] = job_scheduler
+            # 调度器未启动时，get_jobs() 返回待添加的任务
+            for job in job_scheduler.scheduler.get_jobs():
+                if not job.id.startswith(self.SIMULATED_JOB_PREFIXES):
+                    continue
+                fire_time = job.trigger.get_next_fire_time(None, self.start.astimezone(job_scheduler.timezone))
+                if fire_time and fire_time < self.end:
+                    heapq.heappush(queue, (fire_time, next(counter), timezone_str, job))
+
+        posts = []
+        dst_transitions = []
+        last_offsets = {}
+
+        while queue:
+            fire_time, _, timezone_str, job = heapq.heappop(queue)
+            job_scheduler = schedulers[timezone_str]
+            self.clock.advance_to(fire_time)
+
+            twitter_backend = job_scheduler.twitter_backend
+            posted_before = len(twitter_backend.posts)
+            job.func(*job.args, **job.kwargs)
+
+            local_time = fire_time.astimezone(job_scheduler.timezone)
+            utc_offset = local_time.strftime('%z')
+            if timezone_str in last_offsets and last_offsets[timezone_str] != utc_offset:
+                dst_transitions.append({
+                    'timezone': timezone_str,
+                    'before': last_offsets[timezone_str],
+                    'after': utc_offset,
+                    'first_run_after': local_time.isoformat()
+                })
+            last_offsets[timezone_str] = utc_offset
+
+            for post in twitter_backend.posts[posted_before:]:
+                posts.append({
+                    'timezone': timezone_str,
+                    'job_id': job.id,
+                    'fire_time_utc': fire_time.astimezone(pytz.utc).isoformat(),
+                    'local_time': local_time.strftime('%Y-%m-%d %H:%M:%S %Z'),
+                    'utc_offset': utc_offset,
+                    'tweet_id': post['id'],
+                    'content': post['content'],
+                    'media_paths': post['media_paths']
+                })
+            if len(twitter_backend.posts) == posted_before:
+                logger.warning(f"模拟任务 {job.id} ({timezone_str}) 在 {local_time} 未发出推文")
+
+            next_fire = job.trigger.get_next_fire_time(fire_time, fire_time + timedelta(seconds=1))
+            if next_fire and next_fire < self.end:
+                heapq.heappush(queue, (next_fire, next(counter), timezone_str, job))
+
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'timezones': self.timezones,
+            'total_posts': len(posts),
+            'posts_per_timezone': {
+                timezone_str: sum(1 for post in posts if post['timezone'] == timezone_str)
+                for timezone_str in self.timezones
+            },
+            'llm_calls': sum(s.llm_backend.call_count for s in schedulers.values()),
+            'dst_transitions': dst_transitions,
+            'posts': posts
+        }
@@ -0,0 +1,297 @@
+"""
+任务看门狗模块
+为定时任务的每个阶段（生成、发送）设置执行时限，记录心跳，
+检测超出预算的任务并释放调度器的执行线程
+"""
+
+import contextvars
+import functools
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from typing import Optional, Callable, Any, Dict
+from utils.deadline import Deadline, DeadlineExceeded, run_with_deadline
+from utils.logger import logger
+
+
+class JobCancelled(Exception):
+    """任务已被看门狗取消"""
+
+
+class PhaseTimeout(DeadlineExceeded):
+    """任务阶段执行超时（看门狗在等待阶段结果时发现）"""
+
+    def __init__(self, phase: str, timeout: Optional[float] = None, abandoned: bool = False,
+                 future: Optional[Future] = None):
+        """
+        Args:
+            phase: 阶段名称
+            timeout: 阶段时间预算（秒）
+            abandoned: 阶段是否已开始执行（被放弃，仍在后台运行，结果未知）
+            future: 被放弃的阶段在执行器池中的 Future（可据此在阶段结束后确认结果）
+        """
+        super().__init__(phase, timeout)
+        self.abandoned = abandoned
+        self.future = future
+
+
+class JobRun:
+    """单次任务执行的心跳记录"""
+
+    def __init__(self, run_id: int, job_id: str, budget: float):
+        self.run_id = run_id
+        self.job_id = job_id
+        self.budget = budget
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + budget
+        self.phase = 'start'
+        self.phase_deadline = self.deadline
+        self.last_heartbeat = time.monotonic()
+        self.cancel_event = threading.Event()
+        self.overdue = False
+
+    def remaining(self) -> float:
+        """获取任务剩余的时间预算（秒）"""
+        return self.deadline - time.monotonic()
+
+    def to_dict(self) -> dict:
+        """转换为状态字典"""
+        now = time.monotonic()
+        return {
+            'run_id': self.run_id,
+            'job_id': self.job_id,
+            'phase': self.phase,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(),
+            'elapsed_seconds': round(time.time() - self.started_at, 2),
+            'remaining_seconds': round(self.deadline - now, 2),
+            'phase_remaining_seconds': round(self.phase_deadline - now, 2),
+            'last_heartbeat_seconds_ago': round(now - self.last_heartbeat, 2),
+            'cancelled': self.cancel_event.is_set(),
+            'overdue': self.overdue
+        }
+
+
+class JobWatchdog:
+    """任务看门狗类"""
+
+    # 等待阶段结果时额外多等的时间，让阶段内按截止时间超时的请求先报告具体超时的一跳
+    PHASE_GRACE_SECONDS = 0.5
+
+    def __init__(self, check_interval: float = 5, history_size: int = 50):
+        """
+        初始化看门狗
+
+        Args:
+            check_interval: 后台巡检间隔（秒）
+            history_size: 保留的超时记录条数
+        """
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._run_ids = itertools.count(1)
+        self._active: Dict[int, JobRun] = {}
+        self._hung = deque(maxlen=history_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.stats = {
+            'started': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'abandoned_threads': 0
+        }
+
+    def start(self):
+        """启动后台巡检线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, name='job-watchdog', daemon=True)
+        self._thread.start()
+        logger.info(f"任务看门狗已启动，巡检间隔 {self.check_interval} 秒")
+
+    def stop(self):
+        """停止后台巡检线程"""
+        self._stop_event.set()
+
+    def _loop(self):
+        """后台巡检循环"""
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"任务看门狗巡检失败: {e}")
+
+    def check(self):
+        """检查所有执行中的任务，标记超出预算的任务并通知其取消"""
+        now = time.monotonic()
+        with self._lock:
+            runs = list(self._active.values())
+        for run in runs:
+            if run.overdue:
+                continue
+            if now > run.deadline or now > run.phase_deadline:
+                run.overdue = True
+                run.cancel_event.set()
+                self._record_hung(run, reason='巡检发现任务超出时间预算')
+
+    def _record_hung(self, run: JobRun, reason: str):
+        """记录一次超时任务"""
+        record = run.to_dict()
+        record['reason'] = reason
+        record['detected_at'] = datetime.now().isoformat()
+        with self._lock:
+            self._hung.append(record)
+        logger.error(f"任务 {run.job_id} 在阶段 {run.phase} 超出时间预算: {reason}")
+
+    def begin(self, job_id: str, budget: float) -> JobRun:
+        """
+        登记一次任务执行
+
+        Args:
+            job_id: 任务 ID
+            budget: 整个任务的时间预算（秒）
+
+        Returns:
+            任务心跳记录
+        """
+        run = JobRun(next(self._run_ids), job_id, budget)
+        with self._lock:
+            self._active[run.run_id] = run
+            self.stats['started'] += 1
+        return run
+
+    def heartbeat(self, run: JobRun, phase: Optional[str] = None, phase_budget: Optional[float] = None):
+        """
+        更新任务心跳
+
+        Args:
+            run: 任务心跳记录
+            phase: 新的阶段名称（为空时保持当前阶段）
+            phase_budget: 新阶段的时间预算（秒），不会超过任务剩余预算
+        """
+        now = time.monotonic()
+        run.last_heartbeat = now
+        if phase:
+            run.phase = phase
+            run.phase_deadline = run.deadline if phase_budget is None else min(run.deadline, now + phase_budget)
+
+    def finish(self, run: JobRun, success: bool):
+        """
+        结束一次任务执行
+
+        Args:
+            run: 任务心跳记录
+            success: 任务是否成功
+        """
+        with self._lock:
+            self._active.pop(run.run_id, None)
+            if run.overdue:
+                self.stats['timed_out'] += 1
+            elif success:
+                self.stats['succeeded'] += 1
+            else:
+                self.stats['failed'] += 1
+
+    def run_phase(self, run: JobRun, phase: str, func: Callable[..., Any], timeout: float, *args,
+                  executor=None, **kwargs) -> Any:
+        """
+        在独立线程（或指定的执行器池）中执行任务的一个阶段，并在时限内等待结果
+
+        超时后调用方立即返回（释放调度器执行线程）；尚未开始执行的阶段会被取消，
+        已在执行的阶段线程被放弃并在后台自行结束，其结果会被丢弃
+
+        Args:
+            run: 任务心跳记录
+            phase: 阶段名称
+            func: 阶段函数
+            timeout: 阶段时间预算（秒）
+            executor: 执行器池（需提供 submit 方法），为 None 时使用独立的守护线程
+
+        Returns:
+            阶段函数的返回值
+
+        Raises:
+            JobCancelled: 任务在进入该阶段前已被取消
+            PhaseTimeout: 阶段执行超时（abandoned 表示阶段已开始执行，结果未知）
+            DeadlineExceeded: 阶段内某一跳用完了剩余的时间预算
+        """
+        if run.cancel_event.is_set():
+            raise JobCancelled(f"任务 {run.job_id} 已取消，跳过阶段 {phase}")
+
+        self.heartbeat(run, phase, timeout)
+        wait_seconds = max(0.0, run.phase_deadline - time.monotonic())
+
+        # 阶段的截止时间（和任务的取消事件）通过 contextvars 传递给阶段内的每一跳（进程池中无法传递上下文），
+        # 被放弃的阶段在下一跳开始前即停止
+        if not getattr(executor, 'use_processes', False):
+            func = functools.partial(
+                contextvars.copy_context().run, run_with_deadline,
+                Deadline.until(run.phase_deadline, run.cancel_event), phase, func
+            )
+
+        if executor is not None:
+            future = executor.submit(func, *args, **kwargs)
+            try:
+                result = future.result(timeout=wait_seconds + self.PHASE_GRACE_SECONDS)
+            except FutureTimeoutError:
+                # 仍在排队的阶段可以直接取消，已开始执行的只能放弃
+                abandoned = not future.cancel()
+                self._on_phase_timeout(run, phase, wait_seconds, abandoned)
+                raise PhaseTimeout(phase, wait_seconds, abandoned, future if abandoned else None)
+            except DeadlineExceeded as e:
+                self._on_phase_timeout(run, e.phase, wait_seconds, abandoned=False)
+                raise
+            self.heartbeat(run)
+            return result
+
+        outcome = {}
+        done = threading.Event()
+
+        def target():
+            try:
+                outcome['result'] = func(*args, **kwargs)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+
+        worker = threading.Thread(target=target, name=f'{run.job_id}-{phase}', daemon=True)
+        worker.start()
+
+        if not done.wait(wait_seconds + self.PHASE_GRACE_SECONDS):
+            self._on_phase_timeout(run, phase, wait_seconds, abandoned=True)
+            raise PhaseTimeout(phase, wait_seconds, abandoned=True)
+
+        self.heartbeat(run)
+        if 'error' in outcome:
+            if isinstance(outcome['error'], DeadlineExceeded):
+                self._on_phase_timeout(run, outcome['error'].phase, wait_seconds, abandoned=False)
+            raise outcome['error']
+        return outcome.get('result')
+
+    def _on_phase_timeout(self, run: JobRun, phase: str, wait_seconds: float, abandoned: bool):
+        """处理阶段超时: 取消任务并记录"""
+        run.overdue = True
+        run.cancel_event.set()
+        if abandoned:
+            with self._lock:
+                self.stats['abandoned_threads'] += 1
+        self._record_hung(run, reason=f'阶段 {phase} 超出时间预算 ({wait_seconds:.1f} 秒)')
+
+    def get_status(self) -> dict:
+        """
+        获取看门狗状态（执行中任务的心跳和最近的超时记录）
+
+        Returns:
+            状态字典
+        """
+        with self._lock:
+            return {
+                'running': bool(self._thread and self._thread.is_alive()),
+                'active_jobs': [run.to_dict() for run in self._active.values()],
+                'recent_timeouts': list(self._hung),
+                'stats': dict(self.stats)
+            }
@@ -0,0 +1,16 @@
+"""
+测试公共配置
+把项目根目录加入导入路径，并使用不写日志文件的最小配置（测试不读取 config/config.yaml）
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from utils.config_loader import config_loader  # noqa: E402
+
+# 各模块在导入时读取配置，其余配置项为空时使用代码中的默认值
+config_loader._config = {'logging': {'file_path': '', 'console_output': False}}
@@ -0,0 +1,114 @@
+"""
+MinHash / LSH 近似重复索引的测试：查找、索引文件的重新加载和与本地推文存储的同步
+"""
+
+import os
+import pytest
+import twitter.tweet_store as tweet_store_module
+from llm.near_duplicate import NearDuplicateIndex
+from twitter.tweet_store import TweetStore
+
+
+TWEET = 'Small daily habits compound into big results over time, so start with one tiny step today.'
+NEAR_COPY = 'Small daily habits compound into big results over time, so start with one tiny step today!!'
+OTHER = 'The new library release adds streaming support and cuts memory use in half for large files.'
+
+
+@pytest.fixture
+def tweets(tmp_path, monkeypatch):
+    """首次加载索引时读取的本地推文存储（替换全局实例，不读写 data/ 下的真实数据）"""
+    store = TweetStore(str(tmp_path / 'tweets.db'))
+    monkeypatch.setattr(tweet_store_module, 'tweet_store', store)
+    return store
+
+
+@pytest.fixture
+def index_config(tmp_path):
+    return {'index_path': str(tmp_path / 'near_duplicate.idx')}
+
+
+def test_find_near_copy(tweets, index_config):
+    index = NearDuplicateIndex(index_config)
+    assert index.find(TWEET) is None
+    index.add(TWEET, '101')
+
+    found = index.find(NEAR_COPY)
+    assert found['tweet_id'] == '101'
+    assert found['similarity'] >= index.threshold
+    assert index.find(TWEET)['similarity'] == 1.0
+    assert index.find(OTHER) is None
+
+
+def test_index_survives_reload(tweets, index_config):
+    index = NearDuplicateIndex(index_config)
+    index.add(TWEET, '101')
+    index.add(OTHER, '102')
+
+    reloaded = NearDuplicateIndex(index_config)
+    assert reloaded.get_status()['tweets'] == 2
+    assert reloaded.find(NEAR_COPY)['tweet_id'] == '101'
+    assert reloaded.find(OTHER)['tweet_id'] == '102'
+
+
+def test_torn_record_is_truncated(tweets, index_config):
+    index = NearDuplicateIndex(index_config)
+    index.add(TWEET, '101')
+    size = os.path.getsize(index_config['index_path'])
+    # 模拟写到一半时进程退出
+    with open(index_config['index_path'], 'ab') as f:
+        f.write(b'\x01' * 100)
+
+    reloaded = NearDuplicateIndex(index_config)
+    assert reloaded.get_status()['tweets'] == 1
+    assert os.path.getsize(index_config['index_path']) == size
+    reloaded.add(OTHER, '102')
+
+    # 截断后追加的记录仍然对齐
+    again = NearDuplicateIndex(index_config)
+    assert again.get_status()['tweets'] == 2
+    assert again.find(OTHER)['tweet_id'] == '102'
+
+
+def test_parameter_change_rebuilds_index(tweets, index_config):
+    NearDuplicateIndex(index_config).add(TWEET, '101')
+
+    rebuilt = NearDuplicateIndex({**index_config, 'num_perm': 64, 'bands': 16})
+    assert rebuilt.get_status()['tweets'] == 0
+    assert rebuilt.find(NEAR_COPY) is None
+
+
+def test_invalid_band_count(index_config):
+    with pytest.raises(ValueError):
+        NearDuplicateIndex({**index_config, 'num_perm': 100, 'bands': 32})
+
+
+def test_first_use_imports_tweet_store(tweets, index_config):
+    tweets.add_posted('201', TWEET)
+    index = NearDuplicateIndex(index_config)
+    assert index.find(NEAR_COPY)['tweet_id'] == '201'
+    # 已导入的推文写入索引文件，重新加载后不会重复加入
+    assert NearDuplicateIndex(index_config).get_status()['tweets'] == 1
+
+
+def test_sync_adds_only_new_tweets(tweets, index_config):
+    index = NearDuplicateIndex(index_config)
+    index.add(TWEET, '101')
+    tweets.add_posted('101', TWEET)
+    tweets.add_posted('102', OTHER)
+
+    assert index.sync(tweets) == 1
+    assert index.sync(tweets) == 0
+    assert index.find(OTHER)['tweet_id'] == '102'
+
+    reloaded = NearDuplicateIndex(index_config)
+    assert reloaded.get_status()['tweets'] == 2
+    assert reloaded.sync(tweets) == 0
+
+
+def test_disabled_index_is_noop(tweets, index_config):
+    index = NearDuplicateIndex({**index_config, 'enabled': False})
+    index.add(TWEET, '101')
+    tweets.add_posted('102', OTHER)
+    assert index.sync(tweets) == 0
+    assert index.get_status()['tweets'] == 0
+    assert not os.path.exists(index_config['index_path'])
@@ -0,0 +1,240 @@
+"""
+一次性定时推文的测试：发送时间解析、存储中的任务状态流转和调度器的发送流程
+"""
+
+import threading
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from scheduler.oneoff_store import OneOffStore, parse_due_time
+
+
+@pytest.fixture
+def store(tmp_path):
+    return OneOffStore(str(tmp_path / 'oneoff_posts.db'))
+
+
+def utc(*args) -> datetime:
+    return pytz.utc.localize(datetime(*args))
+
+
+@pytest.mark.parametrize('value, tz, expected', [
+    ('2026-11-03T14:35:00-05:00', None, utc(2026, 11, 3, 19, 35)),
+    ('2026-11-03 14:35 ET', None, utc(2026, 11, 3, 19, 35)),       # 夏令时已结束
+    ('2026-07-03 14:35 ET', None, utc(2026, 7, 3, 18, 35)),        # 夏令时
+    ('2026-11-03 14:35 Asia/Tokyo', None, utc(2026, 11, 3, 5, 35)),
+    ('2026-11-03 14:35', 'UTC', utc(2026, 11, 3, 14, 35)),
+    ('2026-11-03T14:35:00+09:00', 'America/New_York', utc(2026, 11, 3, 5, 35)),  # 自带偏移时忽略默认时区
+])
+def test_parse_due_time(value, tz, expected):
+    assert parse_due_time(value, tz) == expected
+
+
+@pytest.mark.parametrize('value, tz', [
+    ('2026-11-03 14:35', None),
+    ('2026-11-03 14:35 Mars/Olympus', None),
+    ('not a time', 'UTC'),
+])
+def test_parse_due_time_rejects_invalid(value, tz):
+    with pytest.raises(ValueError):
+        parse_due_time(value, tz)
+
+
+def test_claim_due_only_returns_due_posts_once(store):
+    now = utc(2026, 11, 3, 12, 0)
+    later = store.add('later', now + timedelta(hours=1))
+    second = store.add('second', now - timedelta(minutes=1))
+    first = store.add('first', now - timedelta(minutes=5))
+
+    assert store.next_due_time() == now - timedelta(minutes=5)
+    claimed = store.claim_due(now)
+    assert [post['id'] for post in claimed] == [first, second]
+    assert [post['id'] for post in store.list('posting')] == [first, second]
+
+    # 已取出的任务不会被再次取出
+    assert store.claim_due(now) == []
+    assert store.next_due_time() == now + timedelta(hours=1)
+    assert store.count_pending() == 1
+    assert [post['id'] for post in store.claim_due(now + timedelta(hours=2))] == [later]
+    assert store.next_due_time() is None
+
+
+def test_claim_due_respects_limit(store):
+    now = utc(2026, 11, 3, 12, 0)
+    for minute in range(3):
+        store.add(f'post {minute}', now - timedelta(minutes=minute))
+    assert len(store.claim_due(now, limit=2)) == 2
+    assert len(store.claim_due(now, limit=2)) == 1
+
+
+def test_posted_and_failed_transitions(store):
+    now = utc(2026, 11, 3, 12, 0)
+    posted = store.add('posted', now)
+    failed = store.add('failed', now)
+    store.claim_due(now)
+
+    store.mark_posted(posted, 12345)
+    store.mark_failed(failed, 'HTTP 403')
+    posts = {post['id']: post for post in store.list()}
+    assert posts[posted]['status'] == 'posted'
+    assert posts[posted]['tweet_id'] == '12345'
+    assert posts[posted]['posted_at'] is not None
+    assert posts[failed]['status'] == 'failed'
+    assert posts[failed]['error'] == 'HTTP 403'
+    assert store.claim_due(now + timedelta(days=1)) == []
+
+
+def test_cancel_only_pending(store):
+    now = utc(2026, 11, 3, 12, 0)
+    pending = store.add('pending', now + timedelta(hours=1))
+    claimed = store.add('claimed', now)
+    store.claim_due(now)
+
+    assert store.cancel(pending)
+    assert not store.cancel(pending)
+    assert not store.cancel(claimed)
+    assert not store.cancel(9999)
+    assert store.list('cancelled')[0]['id'] == pending
+    assert store.claim_due(now + timedelta(days=1)) == []
+
+
+def test_unknown_posts_are_never_claimed_again(store):
+    now = utc(2026, 11, 3, 12, 0)
+    abandoned = store.add('abandoned', now)
+    store.claim_due(now)
+    store.mark_unknown(abandoned, '发送阶段超时')
+
+    assert store.list('unknown')[0]['id'] == abandoned
+    assert store.claim_due(now + timedelta(days=1)) == []
+    assert store.count_pending() == 0
+    # 确认结果后可以再标记为已发送
+    store.mark_posted(abandoned, '777')
+    assert store.list('posted')[0]['error'] is None
+
+
+def test_recover_interrupted_marks_posting_as_unknown(tmp_path):
+    db_path = str(tmp_path / 'oneoff_posts.db')
+    now = utc(2026, 11, 3, 12, 0)
+    store = OneOffStore(db_path)
+    interrupted = store.add('interrupted', now)
+    pending = store.add('pending', now + timedelta(hours=1))
+    store.claim_due(now)
+
+    # 模拟重启：新的存储实例读取同一个数据库
+    restarted = OneOffStore(db_path)
+    assert restarted.recover_interrupted() == 1
+    assert restarted.recover_interrupted() == 0
+    statuses = {post['id']: post['status'] for post in restarted.list()}
+    assert statuses == {interrupted: 'unknown', pending: 'pending'}
+    assert [post['id'] for post in restarted.claim_due(now + timedelta(days=1))] == [pending]
+
+
+class FakeTwitterClient:
+    """只记录发推请求的客户端，release 事件未设置时发推会一直阻塞"""
+
+    def __init__(self, success: bool = True):
+        self.success = success
+        self.release = threading.Event()
+        self.release.set()
+        self.posts = []
+
+    def post_tweet(self, content, in_reply_to_tweet_id=None):
+        self.release.wait(5)
+        self.posts.append(content)
+        return {'id': str(100 + len(self.posts)), 'url': 'https://twitter.com/user/status/1', 'success': self.success}
+
+
+@pytest.fixture
+def job_scheduler(tmp_path):
+    from scheduler.job_scheduler import JobScheduler
+    clock = {'now': utc(2026, 1, 5, 12, 0)}
+    job_scheduler = JobScheduler(
+        scheduler_config={
+            'timezone': 'America/New_York',
+            'tweet_times': [],
+            'oneoff': {'db_path': str(tmp_path / 'oneoff_posts.db')},
+            'timeouts': {'post_seconds': 0.1}
+        },
+        clock=lambda: clock['now']
+    )
+    job_scheduler.twitter_backend = FakeTwitterClient()
+    job_scheduler.test_clock = clock
+    yield job_scheduler
+    job_scheduler.twitter_backend.release.set()
+    job_scheduler.watchdog.stop()
+    job_scheduler.pools.shutdown(wait=True)
+
+
+def test_schedule_post_validates_input(job_scheduler):
+    assert not job_scheduler.schedule_post('', '2026-01-05 08:00')['success']
+    assert not job_scheduler.schedule_post('past', '2026-01-05 06:59')['success']    # 调度器时区为纽约
+    assert not job_scheduler.schedule_post('bad', 'tomorrow')['success']
+    result = job_scheduler.schedule_post('future', '2026-01-05 07:30')
+    assert result['success']
+    assert result['due_at'] == '2026-01-05T12:30:00+00:00'
+    assert [post['id'] for post in job_scheduler.list_scheduled_posts()] == [result['id']]
+    assert job_scheduler.cancel_scheduled_post(result['id'])
+    assert job_scheduler.list_scheduled_posts() == []
+
+
+def test_timer_job_posts_due_posts(job_scheduler):
+    first = job_scheduler.schedule_post('first', '2026-01-05 07:05')['id']
+    later = job_scheduler.schedule_post('later', '2026-01-05 09:00')['id']
+    job_scheduler.test_clock['now'] = utc(2026, 1, 5, 12, 10)
+    job_scheduler._oneoff_timer_job()
+
+    assert job_scheduler.twitter_backend.posts == ['first']
+    statuses = {post['id']: post['status'] for post in job_scheduler.list_scheduled_posts(status=None)}
+    assert statuses == {first: 'posted', later: 'pending'}
+    # 定时器指向下一条待发送的推文
+    assert job_scheduler.oneoff_store.next_due_time() == utc(2026, 1, 5, 14, 0)
+
+
+def test_failed_post_is_marked_failed(job_scheduler):
+    post_id = job_scheduler.schedule_post('fails', '2026-01-05 07:05')['id']
+    job_scheduler.twitter_backend.success = False
+    job_scheduler.test_clock['now'] = utc(2026, 1, 5, 12, 10)
+    job_scheduler._oneoff_timer_job()
+    assert job_scheduler.oneoff_store.list('failed')[0]['id'] == post_id
+
+
+def test_abandoned_post_is_unknown_until_the_phase_finishes(job_scheduler):
+    post_id = job_scheduler.schedule_post('slow', '2026-01-05 07:05')['id']
+    client = job_scheduler.twitter_backend
+    client.release.clear()
+    job_scheduler.test_clock['now'] = utc(2026, 1, 5, 12, 10)
+    job_scheduler._oneoff_timer_job()
+
+    # 发送阶段超时被放弃：结果未知，不会再次发送
+    assert job_scheduler.oneoff_store.list('unknown')[0]['id'] == post_id
+    job_scheduler._oneoff_timer_job()
+    assert job_scheduler.oneoff_store.list('unknown')[0]['id'] == post_id
+
+    # 被放弃的发送阶段结束后按实际结果标记
+    client.release.set()
+    job_scheduler.pools.shutdown(wait=True)
+    posted = job_scheduler.oneoff_store.list('posted')
+    assert [post['id'] for post in posted] == [post_id]
+    assert posted[0]['tweet_id'] == '101'
+    assert client.posts == ['slow']
+
+
+def test_unknown_posts_are_verified_against_the_timeline(job_scheduler, tmp_path, monkeypatch):
+    import scheduler.job_scheduler as job_scheduler_module
+    from twitter.tweet_store import TweetStore
+    tweets = TweetStore(str(tmp_path / 'tweets.db'))
+    monkeypatch.setattr(job_scheduler_module, 'tweet_store', tweets)
+
+    store = job_scheduler.oneoff_store
+    sent = store.add('sent & found', utc(2026, 1, 5, 12, 5))
+    lost = store.add('never sent', utc(2026, 1, 5, 12, 5))
+    store.claim_due(utc(2026, 1, 5, 12, 10))
+    assert store.recover_interrupted() == 2
+    # 时间线返回的推文内容经过 HTML 转义
+    tweets.add_posted('555', 'sent &amp; found')
+
+    job_scheduler._verify_unknown_oneoffs()
+    posts = {post['id']: post for post in store.list()}
+    assert posts[sent]['status'] == 'posted'
+    assert posts[sent]['tweet_id'] == '555'
+    assert posts[lost]['status'] == 'failed'
@@ -0,0 +1,157 @@
+"""
+推文串发送的测试：逐条记录进度，中断或失败后从中断处续发且不重复发送
+"""
+
+import pytest
+from twitter.thread_poster import ThreadPoster
+from utils.deadline import DeadlineExceeded
+
+
+CONTENT = ' '.join(f'Sentence number {i} is right here.' for i in range(12))
+
+
+class FakeTwitterClient:
+    """记录发推请求的客户端，fail_at 指定第几次请求（从 0 开始）失败"""
+
+    def __init__(self, fail_at=None, error=None, timeline=None):
+        self.fail_at = fail_at
+        self.error = error
+        self.timeline = list(timeline or [])
+        self.posts = []
+        self.next_id = 1000
+
+    def post_tweet(self, content, in_reply_to_tweet_id=None):
+        if self.fail_at is not None and len(self.posts) == self.fail_at:
+            self.fail_at = None
+            if self.error:
+                raise self.error
+            return {'success': False}
+        self.next_id += 1
+        self.posts.append({'id': str(self.next_id), 'text': content, 'in_reply_to': in_reply_to_tweet_id})
+        return {'id': str(self.next_id), 'url': f'https://twitter.com/user/status/{self.next_id}', 'success': True}
+
+    def get_recent_tweets(self, count=5):
+        # 从新到旧，与接口一致
+        return list(reversed(self.timeline + self.posts))[:count]
+
+
+@pytest.fixture
+def poster(tmp_path):
+    return ThreadPoster({'db_path': str(tmp_path / 'threads.db'), 'max_length': 100, 'max_attempts': 3})
+
+
+def create_thread(poster):
+    created = poster.create(CONTENT)
+    assert created['success']
+    assert len(created['parts']) >= 4
+    return created['thread_id'], created['parts']
+
+
+def test_create_rejects_too_many_parts(tmp_path):
+    poster = ThreadPoster({'db_path': str(tmp_path / 'threads.db'), 'max_length': 100, 'max_parts': 2})
+    assert not poster.create(CONTENT)['success']
+    assert not poster.create('   ')['success']
+
+
+def test_post_replies_to_previous_part(poster):
+    thread_id, parts = create_thread(poster)
+    client = FakeTwitterClient()
+    result = poster.post(thread_id, client)
+
+    assert result['success']
+    assert [post['text'] for post in client.posts] == parts
+    assert client.posts[0]['in_reply_to'] is None
+    for previous, post in zip(client.posts, client.posts[1:]):
+        assert post['in_reply_to'] == previous['id']
+    assert result['id'] == client.posts[0]['id']
+    assert result['tweet_ids'] == [post['id'] for post in client.posts]
+    # 已发送完的推文串再次发送时直接返回结果
+    assert poster.post(thread_id, client) == result
+    assert len(client.posts) == len(parts)
+
+
+def test_failed_part_resumes_without_reposting(poster):
+    thread_id, parts = create_thread(poster)
+    client = FakeTwitterClient(fail_at=2)
+    result = poster.post(thread_id, client)
+    assert not result['success']
+    assert result['posted'] == 2
+    assert poster.store.get(thread_id)['status'] == 'failed'
+
+    results = poster.resume_all(client)
+    assert [item['success'] for item in results] == [True]
+    assert [post['text'] for post in client.posts] == parts
+    assert client.posts[2]['in_reply_to'] == client.posts[1]['id']
+    assert poster.store.get(thread_id)['attempts'] == 2
+
+
+def test_deadline_marks_thread_failed(poster):
+    thread_id, parts = create_thread(poster)
+    client = FakeTwitterClient(fail_at=1, error=DeadlineExceeded('post'))
+    with pytest.raises(DeadlineExceeded):
+        poster.post(thread_id, client)
+    thread = poster.store.get(thread_id)
+    assert thread['status'] == 'failed'
+    assert [part['status'] for part in thread['parts'][:2]] == ['posted', 'posting']
+
+    # 超时的那条没有发出，续发时在最近的推文中找不到，会重新发送
+    assert poster.post(thread_id, client)['success']
+    assert [post['text'] for post in client.posts] == parts
+
+
+def interrupt_after_posting(poster, thread_id, client, posted: int, sent: bool):
+    """模拟程序在发送第 posted + 1 条时中断（sent 表示中断前该条是否已经发出）"""
+    poster.store.start_attempt(thread_id)
+    thread = poster.store.get(thread_id)
+    for part in thread['parts'][:posted]:
+        result = client.post_tweet(part['content'])
+        poster.store.mark_part_posted(thread_id, part['position'], result['id'])
+    poster.store.mark_part_posting(thread_id, posted)
+    if sent:
+        client.post_tweet(thread['parts'][posted]['content'])
+
+
+@pytest.mark.parametrize('sent', [True, False])
+def test_resume_after_part_left_posting(poster, sent):
+    thread_id, parts = create_thread(poster)
+    client = FakeTwitterClient(timeline=[{'id': '1', 'text': parts[2]}])    # 更早的同内容推文不算
+    interrupt_after_posting(poster, thread_id, client, posted=2, sent=sent)
+
+    # 重启后，中断在发送中的推文串等待续发
+    restarted = ThreadPoster({'db_path': poster.store.db_path, 'max_length': 100, 'max_attempts': 3})
+    assert restarted.recover_interrupted() == 1
+    assert restarted.store.get(thread_id)['status'] == 'failed'
+    result = restarted.resume_all(client)[0]
+
+    assert result['success']
+    # 每条推文都只发出一次
+    assert [post['text'] for post in client.posts] == parts
+    assert result['tweet_ids'] == [post['id'] for post in client.posts]
+
+
+def test_resume_matches_escaped_timeline_text(tmp_path):
+    poster = ThreadPoster({'db_path': str(tmp_path / 'threads.db'), 'max_length': 100})
+    content = ' '.join(f'Q&A number {i} is right <here>.' for i in range(8))
+    thread_id = poster.create(content)['thread_id']
+    parts = poster.store.get(thread_id)['parts']
+    client = FakeTwitterClient()
+    poster.store.start_attempt(thread_id)
+    poster.store.mark_part_posting(thread_id, 0)
+    # 时间线返回的推文内容经过 HTML 转义
+    client.timeline.append({'id': '5000', 'text': parts[0]['content'].replace('&', '&amp;').replace('<', '&lt;')})
+    poster.recover_interrupted()
+
+    result = poster.post(thread_id, client)
+    assert result['success']
+    assert result['tweet_ids'][0] == '5000'
+    assert [post['text'] for post in client.posts] == [part['content'] for part in parts[1:]]
+    assert client.posts[0]['in_reply_to'] == '5000'
+
+
+def test_resume_stops_after_max_attempts(poster):
+    thread_id, _ = create_thread(poster)
+    for _ in range(3):
+        poster.post(thread_id, FakeTwitterClient(fail_at=0))
+    assert poster.store.get(thread_id)['attempts'] == 3
+    assert poster.resume_all(FakeTwitterClient()) == []
+    assert poster.get_status()['unfinished'] == 0
@@ -0,0 +1,116 @@
+"""
+推文加权长度、截断和推文串拆分的测试（规则与 Twitter 的 twitter-text 一致）
+"""
+
+import pytest
+from utils.twitter_text import (
+    weighted_length, is_valid_length, truncate_tweet, split_thread, MAX_WEIGHTED_LENGTH, URL_LENGTH
+)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('hello', 5),
+    ('你好', 4),
+    ('こんにちは', 10),
+    ('e\u0301', 1),                # NFC 规范化后为一个字符
+    ('“quoted”', 8),                     # 常用标点计 1
+    ('😀', 2),
+    ('👍🏽', 2),                          # 肤色修饰
+    ('\U0001F468\u200d\U0001F469\u200d\U0001F467', 2),  # ZWJ 序列
+    ('🇯🇵', 2),                           # 国旗
+    ('1\ufe0f\u20e3', 2),             # 键帽
+])
+def test_weighted_length_of_characters(text, expected):
+    assert weighted_length(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('https://example.com/a/very/long/path?with=query', URL_LENGTH),
+    ('see https://t.co/abc and http://example.org', 4 + URL_LENGTH + 5 + URL_LENGTH),
+    ('visit example.com now', 6 + URL_LENGTH + 4),
+    ('t.co', URL_LENGTH),                # .co 上的单段域名也是链接
+    ('bit.ly/x', URL_LENGTH),            # 带路径时是链接
+    ('example.jp', 10),                  # 国家顶级域名上的单段域名不是链接
+    ('mail a@example.com', 18),          # 邮箱不是链接
+    ('v1.2.3 e.g. foo', 15),
+])
+def test_weighted_length_of_links(text, expected):
+    assert weighted_length(text) == expected
+
+
+def test_length_limit_boundary():
+    assert is_valid_length('x' * MAX_WEIGHTED_LENGTH)
+    assert not is_valid_length('x' * (MAX_WEIGHTED_LENGTH + 1))
+    assert is_valid_length('中' * (MAX_WEIGHTED_LENGTH // 2))
+    assert not is_valid_length('中' * (MAX_WEIGHTED_LENGTH // 2) + 'x')
+
+
+def test_truncate_keeps_short_text():
+    assert truncate_tweet('short tweet') == 'short tweet'
+
+
+def test_truncate_prefers_sentence_end():
+    result = truncate_tweet('Hello world. ' * 30)
+    assert weighted_length(result) <= MAX_WEIGHTED_LENGTH
+    assert result.endswith('world.')
+
+
+def test_truncate_at_space_adds_ellipsis():
+    result = truncate_tweet('word ' * 100)
+    assert weighted_length(result) <= MAX_WEIGHTED_LENGTH
+    assert result.endswith('word...')
+
+
+@pytest.mark.parametrize('tail', ['\U0001F468\u200d\U0001F469\u200d\U0001F467' * 10, '😀' * 10, '🇯🇵' * 10])
+def test_truncate_never_splits_emoji(tail):
+    text = 'a' * 270 + tail
+    result = truncate_tweet(text)
+    assert weighted_length(result) <= MAX_WEIGHTED_LENGTH
+    kept = result[270:].rstrip('.')
+    # 保留的部分由完整的 emoji 组成
+    unit = tail[:len(tail) // 10]
+    assert kept == unit * (len(kept) // len(unit))
+
+
+def test_truncate_never_splits_link():
+    url = 'https://example.com/' + 'p' * 50
+    # 链接放不下时整个舍去
+    result = truncate_tweet('x ' * 130 + url + ' trailing words here')
+    assert result == ('x ' * 130).rstrip() + '...'
+    # 链接按 23 计算，能放下时完整保留
+    result = truncate_tweet('x ' * 100 + url + ' trailing' * 20)
+    assert weighted_length(result) <= MAX_WEIGHTED_LENGTH
+    assert url in result
+
+
+def test_split_thread_short_text_is_single_part():
+    assert split_thread('  short tweet  ') == ['short tweet']
+    assert split_thread('   ') == []
+
+
+def test_split_thread_numbers_parts_within_limit():
+    text = '这是第一句话。' * 30
+    parts = split_thread(text)
+    assert len(parts) == 2
+    for index, part in enumerate(parts, 1):
+        assert weighted_length(part) <= MAX_WEIGHTED_LENGTH
+        assert part.endswith(f' {index}/2')
+        # 在句末拆分
+        assert part[:-len(f' {index}/2')].endswith('。')
+    assert ''.join(split_thread(text, numbering=False)) == text
+
+
+def test_split_thread_reserves_room_for_wider_numbers():
+    text = ' '.join(f'Sentence number {i} is right here.' for i in range(120))
+    parts = split_thread(text)
+    assert len(parts) >= 10
+    assert all(weighted_length(part) <= MAX_WEIGHTED_LENGTH for part in parts)
+    assert parts[-1].endswith(f' {len(parts)}/{len(parts)}')
+
+
+def test_split_thread_keeps_links_whole():
+    url = 'https://example.com/' + 'q' * 40
+    text = 'Read this. ' * 24 + url + ' and more text afterwards.'
+    parts = split_thread(text, numbering=False)
+    assert sum(part.count(url) for part in parts) == 1
+    assert all(weighted_length(part) <= MAX_WEIGHTED_LENGTH for part in parts)
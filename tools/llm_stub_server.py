@@ -0,0 +1,203 @@
+"""
+LLM 后端模拟服务器
+模拟 OpenAI 兼容的 Chat Completions 接口（支持流式响应），可配置延迟、慢请求比例和错误率，
+用于在本地验证多后端路由、对冲请求和取消（不调用真实的 API）
+
+用法:
+    python tools/llm_stub_server.py --port 18001 --latency 0.2
+    python tools/llm_stub_server.py --port 18002 --latency 0.3 --slow-rate 0.2 --slow-latency 5
+    python tools/llm_stub_server.py --port 18003 --error-rate 0.1 --rate-limit-rate 0.1
+
+然后在 config.yaml 中配置:
+    openai:
+      backends:
+        - name: "fast"
+          base_url: "http://127.0.0.1:18001/v1"
+          api_key: "stub"
+          model: "stub-model"
+          use_proxy: false
+"""
+
+import json
+import random
+import threading
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_CONTENT = "这是一条来自模拟后端的测试推文 #test"
+
+
+class StubStats:
+    """请求统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'completed': 0, 'errors': 0, 'rate_limited': 0, 'disconnected': 0}
+
+    def add(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+def make_handler(args, stats: StubStats):
+    """根据命令行参数创建请求处理类"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *log_args):
+            if not args.quiet:
+                super().log_message(format, *log_args)
+
+        def _send_json(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/models'):
+                self._send_json(200, {'object': 'list', 'data': [{'id': args.model, 'object': 'model'}]})
+            elif self.path.rstrip('/').endswith('/stats'):
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'not found'}})
+                return
+            stats.add('requests')
+
+            roll = random.random()
+            if roll < args.rate_limit_rate:
+                stats.add('rate_limited')
+                self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                                {'retry-after-ms': str(args.retry_after_ms)})
+                return
+            if roll < args.rate_limit_rate + args.error_rate:
+                stats.add('errors')
+                self._send_json(500, {'error': {'message': 'stub server error', 'type': 'server_error'}})
+                return
+
+            latency = args.latency + random.uniform(0, args.jitter)
+            if random.random() < args.slow_rate:
+                latency = args.slow_latency
+            time.sleep(latency)
+
+            content = args.content
+            model = request.get('model') or args.model
+            completion_id = f"chatcmpl-stub-{int(time.time() * 1000)}"
+            if request.get('stream'):
+                self._stream(completion_id, model, content)
+            else:
+                stats.add('completed')
+                self._send_json(200, {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {'prompt_tokens': 10, 'completion_tokens': len(content), 'total_tokens': 10 + len(content)}
+                }, {'x-ratelimit-remaining-requests': '1000'})
+
+        def _stream(self, completion_id: str, model: str, content: str):
+            """以 SSE 分段发送内容，客户端断开时停止"""
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            def send_event(payload: str):
+                data = f"data: {payload}\n\n".encode('utf-8')
+                self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            try:
+                pieces = [content[i:i + args.chunk_chars] for i in range(0, len(content), args.chunk_chars)]
+                for index, piece in enumerate(pieces):
+                    chunk = {
+                        'id': completion_id,
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': model,
+                        'choices': [{
+                            'index': 0,
+                            'delta': {'content': piece} if index else {'role': 'assistant', 'content': piece},
+                            'finish_reason': None
+                        }]
+                    }
+                    send_event(json.dumps(chunk, ensure_ascii=False))
+                    time.sleep(args.chunk_delay)
+                send_event('[DONE]')
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+                stats.add('completed')
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端取消了请求
+                stats.add('disconnected')
+                self.close_connection = True
+
+    return StubHandler
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="OpenAI 兼容接口模拟服务器")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址，默认 127.0.0.1")
+    parser.add_argument('--port', type=int, default=18001, help="监听端口，默认 18001")
+    parser.add_argument('--latency', type=float, default=0.2, help="首字节前的基础延迟（秒）")
+    parser.add_argument('--jitter', type=float, default=0.05, help="额外的随机延迟上限（秒）")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="慢请求比例（0-1）")
+    parser.add_argument('--slow-latency', type=float, default=5.0, help="慢请求的延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回 500 的比例（0-1）")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="返回 429 的比例（0-1）")
+    parser.add_argument('--retry-after-ms', type=int, default=500, help="429 响应的 retry-after-ms")
+    parser.add_argument('--content', default=DEFAULT_CONTENT, help="返回的内容")
+    parser.add_argument('--model', default='stub-model', help="模型名称")
+    parser.add_argument('--chunk-chars', type=int, default=8, help="流式响应每段的字符数")
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help="流式响应每段之间的间隔（秒）")
+    parser.add_argument('--quiet', action='store_true', help="不输出请求日志")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+    stats = StubStats()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args, stats))
+    server.daemon_threads = True
+    print(f"模拟后端已启动: http://{args.host}:{args.port}/v1 "
+          f"(延迟 {args.latency}s, 慢请求 {args.slow_rate:.0%} x {args.slow_latency}s, 错误率 {args.error_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"请求统计: {json.dumps(stats.snapshot(), ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -183,7 +183,7 @@ def main():
     print("\n📋 步骤 1: 浏览器授权")
     print("-" * 60)
 
-    scopes = ['tweet.read', 'tweet.write', 'users.read', 'offline.access']
+    scopes = ['tweet.read', 'tweet.write', 'users.read', 'offline.access', 'media.write']
     auth_url = oauth_client.get_authorization_url(scopes=scopes)
 
     print(f"\n请在浏览器中打开以下 URL 进行授权：\n")
@@ -114,7 +114,7 @@ def main():
     print("\n📋 步骤 1: 获取授权 URL")
     print("-" * 70)
     
-    scopes = ['tweet.read', 'tweet.write', 'users.read', 'offline.access']
+    scopes = ['tweet.read', 'tweet.write', 'users.read', 'offline.access', 'media.write']
     auth_url = oauth_client.get_authorization_url(scopes=scopes)
     
     print(f"\n请在您的本地浏览器中打开以下 URL 进行授权：\n")
@@ -0,0 +1,106 @@
+"""
+一次性定时推文管理工具
+直接读写定时推文数据库，运行中的系统会在 rearm_seconds（默认 60 秒）内发现新增的推文
+
+用法:
+    python tools/schedule_post.py add "2026-11-03 14:35 ET" "推文内容"
+    python tools/schedule_post.py list [--status all]
+    python tools/schedule_post.py cancel 42
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from utils.config_loader import config_loader
+from scheduler.oneoff_store import OneOffStore, parse_due_time
+
+
+def get_store() -> OneOffStore:
+    """根据配置创建存储"""
+    oneoff_config = config_loader.get_scheduler_config().get('oneoff') or {}
+    return OneOffStore(oneoff_config.get('db_path', 'data/oneoff_posts.db'))
+
+
+def cmd_add(args):
+    """添加定时推文"""
+    scheduler_config = config_loader.get_scheduler_config()
+    timezone_str = args.timezone or scheduler_config.get('timezone', 'America/New_York')
+
+    try:
+        due_at = parse_due_time(args.run_at, timezone_str)
+    except ValueError as e:
+        print(f"❌ 时间格式错误: {e}")
+        return False
+
+    if due_at <= datetime.now(pytz.utc):
+        print("❌ 发送时间必须晚于当前时间")
+        return False
+
+    post_id = get_store().add(args.content, due_at, args.timezone)
+    local_time = due_at.astimezone(pytz.timezone(timezone_str))
+    print(f"✅ 已安排定时推文 #{post_id}")
+    print(f"  发送时间: {local_time.strftime('%Y-%m-%d %H:%M:%S %Z')} ({due_at.isoformat()})")
+    return True
+
+
+def cmd_list(args):
+    """列出定时推文"""
+    status = None if args.status == 'all' else args.status
+    posts = get_store().list(status=status, limit=args.limit)
+    if not posts:
+        print("没有定时推文")
+        return True
+
+    for post in posts:
+        line = f"#{post['id']:<6} {post['status']:<10} {post['due_at']}  {post['content'][:50]}"
+        if post.get('tweet_id'):
+            line += f"  (tweet {post['tweet_id']})"
+        if post.get('error'):
+            line += f"  [{post['error']}]"
+        print(line)
+    print(f"\n共 {len(posts)} 条")
+    return True
+
+
+def cmd_cancel(args):
+    """取消定时推文"""
+    if get_store().cancel(args.id):
+        print(f"✅ 已取消定时推文 #{args.id}")
+        return True
+    print(f"❌ 定时推文 #{args.id} 不存在或已发送")
+    return False
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="管理一次性定时推文")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="安排一条定时推文")
+    add_parser.add_argument('run_at', help='发送时间，如 "2026-11-03 14:35 ET"')
+    add_parser.add_argument('content', help="推文内容")
+    add_parser.add_argument('--timezone', help="时间未带时区时使用的时区，默认为调度器时区")
+    add_parser.set_defaults(func=cmd_add)
+
+    list_parser = subparsers.add_parser('list', help="列出定时推文")
+    list_parser.add_argument('--status', default='pending',
+                             help="pending / posting / posted / unknown / failed / cancelled / all，默认 pending")
+    list_parser.add_argument('--limit', type=int, default=100)
+    list_parser.set_defaults(func=cmd_list)
+
+    cancel_parser = subparsers.add_parser('cancel', help="取消定时推文")
+    cancel_parser.add_argument('id', type=int, help="定时推文 ID")
+    cancel_parser.set_defaults(func=cmd_cancel)
+
+    args = parser.parse_args()
+    sys.exit(0 if args.func(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+调度模拟工具
+使用虚拟时钟快速回放定时发推（不调用 OpenAI / Twitter API）
+用于在修改 tweet_times、时区或内容日历后立即验证效果，无需等待真实时间
+
+用法:
+    python tools/simulate_schedule.py --days 30
+    python tools/simulate_schedule.py --start 2026-03-01 --days 30 --timezones America/New_York Europe/London
+    python tools/simulate_schedule.py --times 08:00 02:30 --output simulation.json
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytz
+from utils.config_loader import config_loader
+from utils.logger import logger
+from scheduler.simulation import ScheduleSimulator
+
+
+def print_separator(title=""):
+    """打印分隔线"""
+    print("\n" + "=" * 60)
+    if title:
+        print(f"  {title}")
+        print("=" * 60)
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="快速模拟定时发推")
+    parser.add_argument('--start', help="起始日期 (YYYY-MM-DD，UTC)，默认为今天")
+    parser.add_argument('--days', type=int, default=30, help="模拟天数，默认 30")
+    parser.add_argument('--timezones', nargs='+', help="要模拟的时区，默认为配置中的时区")
+    parser.add_argument('--times', nargs='+', help="覆盖配置中的 tweet_times (HH:MM)")
+    parser.add_argument('--fixed-content', help="覆盖配置中的 fixed_content")
+    parser.add_argument('--output', help="将完整报告写入 JSON 文件")
+    parser.add_argument('--verbose', action='store_true', help="显示调度器日志")
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_args()
+
+    if not args.verbose:
+        logger.logger.setLevel('WARNING')
+
+    scheduler_config = dict(config_loader.get_scheduler_config())
+    if args.times:
+        scheduler_config['tweet_times'] = args.times
+    if args.fixed_content is not None:
+        scheduler_config['fixed_content'] = args.fixed_content
+
+    if args.start:
+        start = pytz.utc.localize(datetime.strptime(args.start, '%Y-%m-%d'))
+    else:
+        start = pytz.utc.localize(datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0))
+
+    simulator = ScheduleSimulator(
+        start=start,
+        days=args.days,
+        timezones=args.timezones,
+        scheduler_config=scheduler_config
+    )
+
+    started = time.time()
+    report = simulator.run()
+    elapsed = time.time() - started
+
+    print_separator("模拟发推记录")
+    for post in report['posts']:
+        print(f"  {post['local_time']:26s} [{post['timezone']}] {post['content'][:60]}")
+
+    print_separator("夏令时切换")
+    if report['dst_transitions']:
+        for transition in report['dst_transitions']:
+            print(f"  {transition['timezone']}: UTC{transition['before']} -> UTC{transition['after']}"
+                  f"，切换后首次发推 {transition['first_run_after']}")
+    else:
+        print("  模拟期间没有夏令时切换")
+
+    print_separator("汇总")
+    print(f"  时间范围: {report['start']} ~ {report['end']}")
+    for timezone_str, count in report['posts_per_timezone'].items():
+        print(f"  {timezone_str:25s}: {count} 条")
+    print(f"  总计: {report['total_posts']} 条，LLM 调用 {report['llm_calls']} 次")
+    print(f"  耗时: {elapsed:.2f} 秒")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n完整报告已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+候选推文排序模型训练工具
+用本地推文存储（twitter.timeline）和指标时序存储（twitter.metrics）中已满 horizon_hours 的推文离线训练，
+模型写入 scheduler.drafts.model_path，运行中的系统在下次打分时自动加载
+
+用法:
+    python tools/train_ranker.py
+    python tools/train_ranker.py --score "候选推文一" "候选推文二"
+"""
+
+import sys
+import os
+import argparse
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config_loader import config_loader
+from llm.draft_ranker import DraftRanker
+
+
+def get_ranker() -> DraftRanker:
+    """根据配置创建排序器"""
+    return DraftRanker(config_loader.get_scheduler_config().get('drafts') or {})
+
+
+def cmd_train(args):
+    """训练模型"""
+    from twitter.tweet_store import TweetStore
+    from twitter.metrics_store import MetricsStore
+
+    ranker = get_ranker()
+    if args.horizon_hours:
+        ranker.horizon_hours = args.horizon_hours
+    result = ranker.train_from_history(TweetStore(), MetricsStore())
+    if not result.get('success'):
+        print(f"❌ 训练失败: {result.get('message')}")
+        return False
+    print(f"✅ 模型已保存到 {ranker.model_path}")
+    print(f"   样本数: {result['samples']}，互动率中位数: {result['median_rate']:.4f}，验证 AUC: {result['auc']}")
+    return True
+
+
+def cmd_score(args):
+    """为候选推文打分"""
+    ranker = get_ranker()
+    scores = ranker.score(args.score)
+    if scores is None:
+        print("❌ 没有可用的模型，请先训练")
+        return False
+    for text, score in sorted(zip(args.score, scores), key=lambda item: -item[1]):
+        print(f"{score:.4f}  {text[:60]}")
+    return True
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="训练候选推文排序模型")
+    parser.add_argument('--horizon-hours', type=int, help="按发送后多少小时的互动率训练，默认使用配置")
+    parser.add_argument('--score', nargs='+', help="不训练，用现有模型为给出的候选推文打分")
+    args = parser.parse_args()
+
+    ok = cmd_score(args) if args.score else cmd_train(args)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 """
 Twitter API 客户端模块
-负责与 Twitter API v2 交互，发送推文（支持 OAuth 2.0）
+负责与 Twitter API v2 交互，发送推文（支持 OAuth 2.0，可附带图片和视频）
 """
 
+import time
+import threading
 import tweepy
 import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from auth.token_manager import token_manager
+from utils.config_loader import config_loader
 from utils.proxy import proxy_manager
+from utils.transport import transport_manager
+from utils.circuit_breaker import circuit_breakers, CircuitOpenError
+from utils.deadline import DeadlineExceeded, check_deadline
+from utils.twitter_text import weighted_length, MAX_WEIGHTED_LENGTH
 from utils.logger import logger
+from twitter.media_uploader import MediaUploader, MediaUploadError
+from twitter.identity_cache import IdentityCache
 
 
 class TwitterAPIClient:
@@ -18,7 +27,19 @@ class TwitterAPIClient:
         """初始化 Twitter API 客户端"""
         self.client = None
         self.api = None
+        # 每个代理各自的 tweepy 客户端（session 固定为该代理的共享会话，不在请求之间修改）
+        self._clients: Dict[Optional[str], tweepy.Client] = {}
+        self._clients_lock = threading.Lock()
+        self._client_options: Dict[str, Any] = {}
         self.use_oauth2 = False
+        # 最近一次成功请求的耗时（秒）
+        self.last_request_latency = None
+        # 媒体上传（分段并行上传，按内容缓存 media id）
+        self.media_uploader = MediaUploader(config_loader.get_twitter_config().get('media'))
+        # 当前账号的用户 ID 和资料缓存（避免重复调用 users/me）
+        self.identity = IdentityCache(
+            self._fetch_identity, token_manager, config_loader.get_twitter_config().get('identity_cache')
+        )
         self._setup_client()
 
     def _setup_client(self):
@@ -32,21 +53,12 @@ class TwitterAPIClient:
             # 获取 OAuth 2.0 访问令牌
             access_token = token_manager.get_access_token()
 
-            # 设置代理（如果启用）
-            proxy_url = None
-            if proxy_manager.is_proxy_enabled():
-                proxies = proxy_manager.get_proxies()
-                if proxies:
-                    proxy_url = proxies.get('https')
-                    logger.info("为 Twitter 客户端配置代理")
-
             # 优先使用 OAuth 2.0
             if access_token and token_manager.get_refresh_token():
                 logger.info("使用 OAuth 2.0 认证方式")
                 self.use_oauth2 = True
 
                 # 获取 client_id 和 client_secret（OAuth 2.0 需要）
-                from utils.config_loader import config_loader
                 twitter_config = config_loader.get_twitter_config()
                 client_id = twitter_config.get('client_id')
                 client_secret = twitter_config.get('client_secret')
@@ -54,12 +66,17 @@ class TwitterAPIClient:
                 # 创建 Tweepy 客户端 (OAuth 2.0)
                 # 注意：tweepy 的 Client 在使用 OAuth 2.0 User Context 时需要 consumer_key 和 consumer_secret
                 # 这里我们使用 client_id 作为 consumer_key，client_secret 作为 consumer_secret
-                self.client = tweepy.Client(
-                    bearer_token=access_token,
+                # wait_on_rate_limit 开启时遇到速率限制会在当前线程中休眠至限制重置（最长 15 分钟），
+                # 调度任务由看门狗限制发送阶段的执行时间
+                self._client_options = dict(
                     consumer_key=client_id,
                     consumer_secret=client_secret,
-                    wait_on_rate_limit=True
+                    wait_on_rate_limit=twitter_config.get('wait_on_rate_limit', True)
                 )
+                self.client = tweepy.Client(bearer_token=access_token, **self._client_options)
+
+                if proxy_manager.is_proxy_enabled():
+                    logger.info("为 Twitter 客户端配置代理（每次请求从代理池中选择）")
 
                 logger.info("Twitter API 客户端初始化成功（OAuth 2.0）")
 
@@ -72,12 +89,83 @@ class TwitterAPIClient:
         except Exception as e:
             logger.error(f"初始化 Twitter API 客户端失败: {e}", exc_info=True)
     
-    def post_tweet(self, content: str) -> Optional[Dict[str, Any]]:
+    def _get_client(self, proxy_url: Optional[str]) -> tweepy.Client:
+        """
+        获取通过指定代理访问的 tweepy 客户端（同一代理始终返回同一个客户端）
+
+        Args:
+            proxy_url: 代理 URL，为 None 时直连
+        """
+        with self._clients_lock:
+            client = self._clients.get(proxy_url)
+            if client is None:
+                client = tweepy.Client(bearer_token=self.client.bearer_token, **self._client_options)
+                # 使用传输层中该代理对应的共享长连接会话
+                client.session = transport_manager.get_session(proxy_url)
+                self._clients[proxy_url] = client
+        return client
+
+    def _request(self, method: str, *args, **kwargs) -> Any:
+        """
+        通过代理池中选出的代理和共享连接池调用 Twitter API，并上报代理的请求结果
+
+        每个代理使用各自的 tweepy 客户端，并发请求不会经由其他线程选出的代理发送
+
+        Args:
+            method: tweepy 客户端的方法名
+        """
+        # Twitter 熔断时直接失败
+        breaker = circuit_breakers.get('twitter')
+        breaker.before_call()
+
+        # 令牌即将过期时会先刷新（预热阶段通常已经提前刷新）
+        try:
+            access_token = token_manager.get_access_token()
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        proxy_url = proxy_manager.select_proxy()
+        client = self._get_client(proxy_url)
+        if access_token and client.bearer_token != access_token:
+            # 令牌刷新后更新（新旧令牌在刷新期间都有效）
+            client.bearer_token = access_token
+
+        started = time.monotonic()
+        try:
+            result = getattr(client, method)(*args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            proxy_manager.report(proxy_url, False, error=str(e))
+            breaker.record_failure(e)
+            raise
+        except tweepy.HTTPException as e:
+            # 收到了 HTTP 响应，说明代理本身可用；只有 5xx 计入 Twitter 的熔断失败
+            proxy_manager.report(proxy_url, True, time.monotonic() - started)
+            if isinstance(e, tweepy.TwitterServerError):
+                breaker.record_failure(e)
+            else:
+                breaker.record_success()
+            raise
+        except DeadlineExceeded:
+            # 截止时间到了，不能说明代理或 Twitter 有问题
+            breaker.release()
+            raise
+        except BaseException:
+            breaker.record_success()
+            raise
+        self.last_request_latency = time.monotonic() - started
+        proxy_manager.report(proxy_url, True, self.last_request_latency)
+        breaker.record_success()
+        return result
+
+    def post_tweet(self, content: str, in_reply_to_tweet_id: Optional[str] = None,
+                   media_paths: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """
         发送推文
         
         Args:
             content: 推文内容
+            in_reply_to_tweet_id: 回复的推文 ID（发送推文串时回复上一条）
+            media_paths: 附带的图片或视频文件路径（最多 4 张图片或 1 个视频）
             
         Returns:
             推文信息字典，失败时返回 None
@@ -90,19 +178,31 @@ class TwitterAPIClient:
             logger.error("推文内容为空")
             return None
         
-        # 检查推文长度
-        if len(content) > 280:
-            logger.error(f"推文内容过长: {len(content)} 字符")
+        # 按 Twitter 的加权规则检查推文长度（中日韩文字计 2，链接计 23），避免发送必然被拒绝的请求
+        length = weighted_length(content)
+        if length > MAX_WEIGHTED_LENGTH:
+            logger.error(f"推文内容过长: 加权长度 {length}，上限 {MAX_WEIGHTED_LENGTH}")
             return None
         
         try:
-            logger.info(f"开始发送推文，内容长度: {len(content)} 字符")
+            logger.info(f"开始发送推文，内容长度: {length}（加权）")
             logger.debug(f"推文内容: {content}")
 
+            # 先并行上传媒体文件（相同内容的文件复用已上传的 media id）
+            media_ids = None
+            if media_paths:
+                media_ids = self.media_uploader.upload_all(media_paths)
+
+            # 发送前最后一次检查截止时间：看门狗已放弃（超时或取消）的发送阶段在这里停止，不会在任务记为失败后才发出
+            check_deadline('post')
+
             # 使用 Twitter API v2 发送推文
             # 注意：使用 OAuth 2.0 时必须设置 user_auth=False
             # 默认 user_auth=True 会尝试使用 OAuth 1.0a 认证
-            response = self.client.create_tweet(text=content, user_auth=False)
+            response = self._request(
+                'create_tweet', text=content, media_ids=media_ids,
+                in_reply_to_tweet_id=in_reply_to_tweet_id, user_auth=False
+            )
             
             if response.data:
                 tweet_id = response.data['id']
@@ -112,17 +212,44 @@ class TwitterAPIClient:
                     'id': tweet_id,
                     'url': tweet_url,
                     'content': content,
+                    'in_reply_to': in_reply_to_tweet_id,
+                    'media_ids': media_ids,
                     'success': True
                 }
                 
                 logger.info(f"推文发送成功! ID: {tweet_id}")
                 logger.info(f"推文链接: {tweet_url}")
+
+                # 记录已发送的推文，生成新推文时用于检查重复；同时写入本地推文存储
+                from llm.validators import tweet_history
+                from llm.near_duplicate import near_duplicate_index
+                from llm.semantic_duplicate import semantic_duplicate_index
+                from llm.prompt_bandit import prompt_bandit
+                from twitter.tweet_store import tweet_store
+                tweet_history.add(content, tweet_id)
+                # 先于本地推文存储写入（索引首次加载时从本地推文存储导入历史推文）
+                near_duplicate_index.add(content, tweet_id)
+                semantic_duplicate_index.add(content, tweet_id)
+                prompt_bandit.record_post(content, tweet_id)
+                try:
+                    tweet_store.add_posted(tweet_id, content, in_reply_to_tweet_id)
+                except Exception as e:
+                    logger.warning(f"写入本地推文存储失败: {e}")
                 
                 return result
             else:
                 logger.error("推文发送失败，API 返回空数据")
                 return None
                 
+        except DeadlineExceeded:
+            # 交给调用方报告超时的阶段
+            raise
+        except CircuitOpenError as e:
+            logger.error(f"Twitter API 暂时不可用，跳过发送: {e}")
+            return None
+        except MediaUploadError as e:
+            logger.error(f"媒体上传失败，未发送推文: {e}")
+            return None
         except tweepy.TooManyRequests as e:
             logger.error(f"Twitter API 速率限制，请稍后重试: {e}")
             return None
@@ -153,10 +280,46 @@ class TwitterAPIClient:
             logger.error(f"错误堆栈: {traceback.format_exc()}")
             return None
     
-    def get_user_info(self) -> Optional[Dict[str, Any]]:
+    def _fetch_identity(self) -> Optional[Dict[str, Any]]:
+        """
+        调用 users/me 获取当前账号资料（由身份缓存调用）
+
+        Returns:
+            资料字典，API 返回空数据时返回 None
+
+        Raises:
+            请求的异常
         """
-        获取当前用户信息
+        if not self.client:
+            return None
+        user = self._request(
+            'get_me',
+            user_fields=['public_metrics', 'created_at', 'description', 'profile_image_url', 'verified']
+        )
+        if not user.data:
+            logger.error("获取用户信息失败，API 返回空数据")
+            return None
+        metrics = user.data.public_metrics or {}
+        return {
+            'id': str(user.data.id),
+            'username': user.data.username,
+            'name': user.data.name,
+            'description': user.data.description,
+            'profile_image_url': user.data.profile_image_url,
+            'verified': user.data.verified,
+            'created_at': user.data.created_at.isoformat() if user.data.created_at else None,
+            'followers_count': metrics.get('followers_count', 0),
+            'following_count': metrics.get('following_count', 0),
+            'tweet_count': metrics.get('tweet_count', 0)
+        }
+
+    def get_user_info(self, refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        获取当前用户信息（使用身份缓存，TTL 内不重复请求 users/me）
         
+        Args:
+            refresh: 是否忽略缓存重新获取
+
         Returns:
             用户信息字典，失败时返回 None
         """
@@ -165,23 +328,12 @@ class TwitterAPIClient:
             return None
         
         try:
-            # 获取当前认证用户信息
-            user = self.client.get_me()
-            
-            if user.data:
-                user_info = {
-                    'id': user.data.id,
-                    'username': user.data.username,
-                    'name': user.data.name,
-                    'followers_count': getattr(user.data, 'public_metrics', {}).get('followers_count', 0),
-                    'following_count': getattr(user.data, 'public_metrics', {}).get('following_count', 0),
-                    'tweet_count': getattr(user.data, 'public_metrics', {}).get('tweet_count', 0)
-                }
-                
-                logger.info(f"获取用户信息成功: @{user_info['username']}")
+            user_info = self.identity.get(force=refresh)
+            if user_info:
+                logger.debug(f"获取用户信息成功: @{user_info['username']}")
                 return user_info
             else:
-                logger.error("获取用户信息失败，API 返回空数据")
+                logger.error("获取用户信息失败")
                 return None
                 
         except Exception as e:
@@ -223,15 +375,16 @@ class TwitterAPIClient:
             return []
         
         try:
-            # 获取当前用户信息
-            user = self.client.get_me()
-            if not user.data:
+            # 获取当前用户 ID（使用身份缓存）
+            user_id = self.identity.get_user_id()
+            if not user_id:
                 logger.error("无法获取用户信息")
                 return []
             
             # 获取用户最近的推文
-            tweets = self.client.get_users_tweets(
-                id=user.data.id,
+            tweets = self._request(
+                'get_users_tweets',
+                id=user_id,
                 max_results=min(count, 100),  # API 限制
                 tweet_fields=['created_at', 'public_metrics']
             )
@@ -258,5 +411,67 @@ class TwitterAPIClient:
             return []
 
 
+    def get_timeline_page(self, max_results: int = 100, tweet_fields: Optional[List[str]] = None,
+                          since_id: Optional[str] = None, until_id: Optional[str] = None,
+                          pagination_token: Optional[str] = None) -> Tuple[list, Dict[str, Any]]:
+        """
+        获取本账号时间线的一页推文（用于同步本地推文存储）
+
+        Args:
+            max_results: 每页条数（5-100）
+            tweet_fields: 请求的推文字段
+            since_id: 只返回 ID 大于该值的推文
+            until_id: 只返回 ID 小于该值的推文
+            pagination_token: 翻页令牌
+
+        Returns:
+            (tweepy.Tweet 列表, meta 字典，包含 newest_id / oldest_id / next_token)
+
+        Raises:
+            请求的异常
+        """
+        if not self.client:
+            raise RuntimeError("Twitter API 客户端未初始化")
+        user_id = self.identity.get_user_id()
+        if not user_id:
+            raise RuntimeError("无法获取用户信息")
+        response = self._request(
+            'get_users_tweets',
+            id=user_id,
+            max_results=max_results,
+            tweet_fields=tweet_fields,
+            since_id=since_id,
+            until_id=until_id,
+            pagination_token=pagination_token,
+            user_auth=False
+        )
+        return response.data or [], response.meta or {}
+
+    def get_tweet_metrics(self, tweet_ids: List[str]) -> Tuple[Dict[str, Dict[str, int]], List[str]]:
+        """
+        批量获取推文的公开指标（一次最多 100 条）
+
+        Args:
+            tweet_ids: 推文 ID 列表
+
+        Returns:
+            ({推文 ID: public_metrics}, 已不存在的推文 ID 列表)
+
+        Raises:
+            请求的异常
+        """
+        if not self.client:
+            raise RuntimeError("Twitter API 客户端未初始化")
+        response = self._request(
+            'get_tweets',
+            ids=tweet_ids[:100],
+            tweet_fields=['public_metrics'],
+            user_auth=False
+        )
+        metrics = {str(tweet.id): dict(tweet.public_metrics or {}) for tweet in response.data or []}
+        missing = [str(error.get('resource_id') or error.get('value')) for error in response.errors or []
+                   if str(error.get('type', '')).endswith('resource-not-found')]
+        return metrics, missing
+
 # 全局 Twitter API 客户端实例
 twitter_client = TwitterAPIClient()
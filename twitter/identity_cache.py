@@ -0,0 +1,177 @@
+"""
+账号身份缓存模块
+缓存当前授权账号的用户 ID 和资料（users/me），避免每次获取最近推文、用户信息或测试连接时都调用 get_me：
+资料在 TTL 内直接返回，接近过期时在后台刷新，过期后先返回旧资料并在后台刷新；
+访问令牌刷新后（同一账号）在后台重新确认，令牌被撤销或替换为其他授权时立即失效
+"""
+
+import threading
+import time
+from typing import Optional, Dict, Any, Callable
+from utils.logger import logger
+
+
+class IdentityCache:
+    """账号身份缓存类"""
+
+    def __init__(self, fetch: Callable[[], Dict[str, Any]], token_source, cache_config: Optional[dict] = None):
+        """
+        初始化身份缓存
+
+        Args:
+            fetch: 获取当前账号资料的函数（调用 users/me，失败时抛出异常）
+            token_source: 令牌管理器（提供 get_token_fingerprint 和 auth_generation）
+            cache_config: 缓存配置（twitter.identity_cache）
+        """
+        cache_config = cache_config or {}
+        self.fetch = fetch
+        self.token_source = token_source
+        self.ttl = cache_config.get('ttl_seconds', 3600)
+        # 超过 TTL 的这一比例后在后台提前刷新
+        self.refresh_ahead = cache_config.get('refresh_ahead_ratio', 0.8)
+        # 过期后仍可返回旧资料的最长时间（后台刷新期间或刷新失败时）
+        self.max_stale = cache_config.get('max_stale_seconds', 86400)
+        # 两次请求 users/me 的最小间隔（失败后也按此间隔重试，避免消耗 15 分钟窗口的配额）
+        self.min_fetch_interval = cache_config.get('min_fetch_interval_seconds', 60)
+
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._profile: Optional[Dict[str, Any]] = None
+        self._fetched_at = 0.0
+        self._fingerprint = None
+        self._generation = None
+        self._last_attempt = 0.0
+        self._refreshing = False
+        self.stats = {'hits': 0, 'misses': 0, 'stale_served': 0, 'fetches': 0, 'background_refreshes': 0,
+                      'errors': 0, 'invalidations': 0}
+
+    def _count(self, key: str):
+        """累加统计（调用方需持有锁）"""
+        self.stats[key] += 1
+
+    def _check_generation(self):
+        """令牌被撤销或替换为其他授权时丢弃缓存（调用方需持有锁）"""
+        generation = getattr(self.token_source, 'auth_generation', 0)
+        if self._profile is not None and self._generation != generation:
+            logger.info("授权已变化，清除账号身份缓存")
+            self._profile = None
+            self._last_attempt = 0.0
+            self._count('invalidations')
+
+    def get(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        获取当前账号资料
+
+        Args:
+            force: 是否忽略缓存立即请求（仍受 min_fetch_interval 限制）
+
+        Returns:
+            资料字典，无法获取时返回 None
+        """
+        with self._lock:
+            self._check_generation()
+            profile = self._profile
+            if profile is not None and not force:
+                age = time.monotonic() - self._fetched_at
+                token_changed = self._fingerprint != self.token_source.get_token_fingerprint()
+                if age < self.ttl and not token_changed:
+                    self._count('hits')
+                    if age >= self.ttl * self.refresh_ahead:
+                        self._refresh_in_background()
+                    return profile
+                if age < self.max_stale:
+                    # 资料已过期或令牌已刷新（同一账号）: 先返回旧资料，后台重新获取
+                    self._count('stale_served')
+                    self._refresh_in_background()
+                    return profile
+            self._count('misses')
+        return self._fetch()
+
+    def get_user_id(self) -> Optional[str]:
+        """
+        获取当前账号的用户 ID（同一授权下用户 ID 不会变化，不受 TTL 限制）
+
+        Returns:
+            用户 ID，无法获取时返回 None
+        """
+        with self._lock:
+            self._check_generation()
+            if self._profile is not None:
+                self._count('hits')
+                return self._profile['id']
+        profile = self.get()
+        return profile['id'] if profile else None
+
+    def _fetch(self) -> Optional[Dict[str, Any]]:
+        """
+        同步获取资料（同一时间只有一个请求，其他线程等待后使用其结果）
+
+        Returns:
+            资料字典，失败时返回缓存中的旧资料（没有时为 None）
+        """
+        started = time.monotonic()
+        with self._fetch_lock:
+            with self._lock:
+                # 等待期间其他线程已经获取
+                if self._profile is not None and self._fetched_at >= started:
+                    return self._profile
+                if time.monotonic() - self._last_attempt < self.min_fetch_interval:
+                    logger.debug("距上次请求 users/me 时间过短，使用缓存的账号资料")
+                    return self._profile
+                self._last_attempt = time.monotonic()
+            return self._do_fetch()
+
+    def _do_fetch(self) -> Optional[Dict[str, Any]]:
+        """请求 users/me 并更新缓存（调用方需持有 _fetch_lock）"""
+        fingerprint = self.token_source.get_token_fingerprint()
+        generation = getattr(self.token_source, 'auth_generation', 0)
+        try:
+            profile = self.fetch()
+        except Exception as e:
+            with self._lock:
+                self._count('errors')
+                logger.warning(f"获取账号资料失败: {e}")
+                return self._profile
+        with self._lock:
+            self._count('fetches')
+            if profile:
+                self._profile = profile
+                self._fetched_at = time.monotonic()
+                self._fingerprint = fingerprint
+                self._generation = generation
+            return self._profile
+
+    def _refresh_in_background(self):
+        """在后台线程中刷新资料（调用方需持有锁；已有刷新在进行或间隔过短时跳过）"""
+        if self._refreshing or time.monotonic() - self._last_attempt < self.min_fetch_interval:
+            return
+        self._refreshing = True
+        self._count('background_refreshes')
+
+        def refresh():
+            try:
+                self._fetch()
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=refresh, name='identity-refresh', daemon=True).start()
+
+    def invalidate(self):
+        """清除缓存（下次访问时重新获取）"""
+        with self._lock:
+            self._profile = None
+            self._last_attempt = 0.0
+            self._count('invalidations')
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取缓存状态和命中统计"""
+        with self._lock:
+            age = time.monotonic() - self._fetched_at if self._profile is not None else None
+            return {
+                'cached': self._profile is not None,
+                'user_id': self._profile['id'] if self._profile else None,
+                'age_seconds': round(age, 1) if age is not None else None,
+                'ttl_seconds': self.ttl,
+                **self.stats
+            }
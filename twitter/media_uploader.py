@@ -0,0 +1,412 @@
+"""
+媒体上传模块
+通过 Twitter API v2 的分段上传接口（INIT / APPEND / FINALIZE / STATUS）上传图片和视频：
+文件以内存映射方式按块读取，不会整体加载到内存；各块在有并发上限的线程池中并行上传，
+视频的服务端处理状态在后台轮询；内容相同的文件在 media id 有效期内复用缓存，不重复上传
+"""
+
+import contextvars
+import hashlib
+import json
+import mimetypes
+import mmap
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Optional, List, Dict, Any
+import requests
+from auth.token_manager import token_manager
+from utils.proxy import proxy_manager
+from utils.transport import transport_manager
+from utils.circuit_breaker import circuit_breakers
+from utils.deadline import remaining_timeout, check_deadline, current_phase, DeadlineExceeded
+from utils.logger import logger
+
+
+DEFAULT_UPLOAD_URL = 'https://api.x.com/2/media/upload'
+
+
+class MediaUploadError(Exception):
+    """媒体上传失败"""
+
+
+def media_category(media_type: str) -> str:
+    """
+    根据 MIME 类型获取媒体分类
+
+    Args:
+        media_type: MIME 类型
+
+    Returns:
+        tweet_gif / tweet_video / tweet_image
+    """
+    if media_type == 'image/gif':
+        return 'tweet_gif'
+    if media_type.startswith('video/'):
+        return 'tweet_video'
+    return 'tweet_image'
+
+
+class MediaCache:
+    """media id 缓存类（按文件内容的 SHA-256 索引，持久化到 JSON 文件）"""
+
+    def __init__(self, path: str = 'data/media_cache.json', ttl: float = 23 * 3600):
+        """
+        初始化缓存
+
+        Args:
+            path: JSON 文件路径
+            ttl: media id 的有效期（秒），Twitter 的 media id 在上传后约 24 小时内可用
+        """
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        """从文件加载缓存（跳过已过期的条目）"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载媒体缓存失败: {e}")
+            return
+        now = time.time()
+        self._items = {key: item for key, item in items.items() if item.get('expires_at', 0) > now}
+
+    def _save(self):
+        """写入文件（调用方需持有锁）"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._items, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, key: str) -> Optional[str]:
+        """获取未过期的 media id"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item['expires_at'] <= time.time():
+                del self._items[key]
+                return None
+            return item['media_id']
+
+    def put(self, key: str, media_id: str, expires_in: Optional[float] = None):
+        """
+        记录上传结果
+
+        Args:
+            key: 缓存键
+            media_id: media id
+            expires_in: 服务端返回的有效期（秒），为 None 时使用 ttl
+        """
+        ttl = self.ttl if expires_in is None else min(self.ttl, expires_in)
+        with self._lock:
+            now = time.time()
+            self._items = {k: v for k, v in self._items.items() if v['expires_at'] > now}
+            self._items[key] = {'media_id': str(media_id), 'expires_at': now + ttl}
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"保存媒体缓存失败: {e}")
+
+    def size(self) -> int:
+        """缓存条目数"""
+        with self._lock:
+            return len(self._items)
+
+
+class MediaUploader:
+    """媒体上传类"""
+
+    def __init__(self, media_config: Optional[dict] = None):
+        """
+        初始化媒体上传器
+
+        Args:
+            media_config: 媒体上传配置（twitter.media）
+        """
+        media_config = media_config or {}
+        self.upload_url = media_config.get('upload_url', DEFAULT_UPLOAD_URL).rstrip('/')
+        self.chunk_size = int(media_config.get('chunk_size_mb', 4) * 1024 * 1024)
+        self.concurrency = media_config.get('concurrency', 3)
+        self.chunk_retries = media_config.get('chunk_retries', 2)
+        self.status_timeout = media_config.get('status_timeout', 300)
+        self.media_dir = media_config.get('media_dir', 'data/media')
+        self.cache = MediaCache(
+            media_config.get('cache_path', 'data/media_cache.json'),
+            media_config.get('cache_ttl_seconds', 23 * 3600)
+        )
+        # 分块上传线程池（所有文件共用，限制同时上传的块数）和单个文件的上传流程线程池分开，避免互相等待
+        self._chunk_pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='media-chunk')
+        self._upload_pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='media-upload')
+        self._lock = threading.Lock()
+        # 同一文件同时只上传一次（相同内容的并发请求共用一个上传结果）
+        self._inflight: Dict[str, Future] = {}
+        self.stats = {'uploads': 0, 'cache_hits': 0, 'chunks': 0, 'bytes': 0, 'failures': 0}
+
+    def _count(self, key: str, value: int = 1):
+        """累加统计"""
+        with self._lock:
+            self.stats[key] += value
+
+    def _submit(self, pool: ThreadPoolExecutor, func, *args) -> Future:
+        """提交任务到线程池（传递当前上下文中的截止时间）"""
+        return pool.submit(contextvars.copy_context().run, func, *args)
+
+    def _http(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        """
+        通过代理池和共享连接池调用媒体上传接口
+
+        Returns:
+            响应 JSON（没有响应体时为空字典）
+
+        Raises:
+            MediaUploadError: 请求失败或返回错误状态码
+        """
+        breaker = circuit_breakers.get('twitter')
+        breaker.before_call()
+        try:
+            access_token = token_manager.get_access_token()
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        headers = {'Authorization': f'Bearer {access_token}'}
+
+        proxy_url = proxy_manager.select_proxy()
+        session = transport_manager.get_session(proxy_url)
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, headers=headers, **kwargs)
+        except requests.exceptions.RequestException as e:
+            proxy_manager.report(proxy_url, False, error=str(e))
+            breaker.record_failure(e)
+            raise MediaUploadError(f"媒体上传请求失败: {e}") from e
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        proxy_manager.report(proxy_url, True, time.monotonic() - started)
+
+        if response.status_code >= 500:
+            breaker.record_failure(MediaUploadError(f"HTTP {response.status_code}"))
+        else:
+            breaker.record_success()
+        if response.status_code >= 400:
+            raise MediaUploadError(f"媒体上传接口返回 HTTP {response.status_code}: {response.text[:200]}")
+        if not response.content:
+            return {}
+        return response.json()
+
+    def resolve_path(self, path: str) -> str:
+        """
+        将相对路径解析到媒体目录下（拒绝目录之外的路径，用于接口传入的文件名）
+
+        Raises:
+            MediaUploadError: 路径不在媒体目录中
+        """
+        base = os.path.realpath(self.media_dir)
+        full_path = os.path.realpath(os.path.join(base, path))
+        if os.path.commonpath([base, full_path]) != base:
+            raise MediaUploadError(f"媒体文件不在媒体目录中: {path}")
+        return full_path
+
+    def upload_async(self, path: str) -> Future:
+        """
+        在后台上传一个媒体文件
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            Future，结果为 media id（处理完成后才可用于发推），失败时抛出 MediaUploadError
+        """
+        return self._submit(self._upload_pool, self._upload, path)
+
+    def upload(self, path: str) -> str:
+        """
+        上传一个媒体文件并等待服务端处理完成
+
+        Args:
+            path: 文件路径
+
+        Returns:
+            media id
+
+        Raises:
+            MediaUploadError: 上传或处理失败
+        """
+        return self.upload_async(path).result()
+
+    def upload_all(self, paths: List[str]) -> List[str]:
+        """
+        并行上传多个媒体文件
+
+        Args:
+            paths: 文件路径列表
+
+        Returns:
+            media id 列表（与 paths 顺序一致）
+
+        Raises:
+            MediaUploadError: 任一文件上传或处理失败
+            DeadlineExceeded: 截止时间已到
+        """
+        futures = [self.upload_async(path) for path in paths]
+        media_ids = []
+        for future in futures:
+            timeout = remaining_timeout(current_phase('post'))
+            try:
+                media_ids.append(future.result(timeout=timeout))
+            except FutureTimeoutError:
+                raise DeadlineExceeded(current_phase('post'))
+        return media_ids
+
+    def _upload(self, path: str) -> str:
+        """上传流程: 计算内容哈希、查缓存，未命中时分段上传"""
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    raise MediaUploadError(f"媒体文件为空: {path}")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                    category = media_category(media_type)
+                    key = f"{hashlib.sha256(mapped).hexdigest()}:{category}"
+
+                    cached = self.cache.get(key)
+                    if cached:
+                        self._count('cache_hits')
+                        logger.info(f"媒体文件已上传过，复用 media id {cached}: {path}")
+                        return cached
+
+                    with self._lock:
+                        future = self._inflight.get(key)
+                        owner = future is None
+                        if owner:
+                            future = Future()
+                            self._inflight[key] = future
+                    if not owner:
+                        return future.result()
+
+                    try:
+                        media_id, expires_in = self._upload_chunked(path, mapped, size, media_type, category)
+                        self.cache.put(key, media_id, expires_in)
+                        future.set_result(media_id)
+                        return media_id
+                    except BaseException as e:
+                        future.set_exception(e)
+                        raise
+                    finally:
+                        with self._lock:
+                            self._inflight.pop(key, None)
+        except OSError as e:
+            self._count('failures')
+            raise MediaUploadError(f"读取媒体文件失败: {e}") from e
+        except Exception:
+            self._count('failures')
+            raise
+
+    def _upload_chunked(self, path: str, mapped: mmap.mmap, size: int, media_type: str,
+                        category: str) -> tuple:
+        """
+        INIT / APPEND / FINALIZE，视频等需要服务端处理的媒体再轮询 STATUS
+
+        Returns:
+            (media id, 有效期秒数或 None)
+        """
+        started = time.monotonic()
+        init = self._http('POST', f"{self.upload_url}/initialize", json={
+            'media_type': media_type,
+            'total_bytes': size,
+            'media_category': category
+        }).get('data') or {}
+        media_id = init.get('id')
+        if not media_id:
+            raise MediaUploadError(f"初始化上传失败，未返回 media id: {path}")
+
+        # 各块按 segment_index 并行上传，服务端在 FINALIZE 时按序号拼接
+        offsets = range(0, size, self.chunk_size)
+        futures = [
+            self._submit(self._chunk_pool, self._append, media_id, mapped, index, offset)
+            for index, offset in enumerate(offsets)
+        ]
+        try:
+            for future in futures:
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        final = self._http('POST', f"{self.upload_url}/{media_id}/finalize").get('data') or {}
+        expires_in = final.get('expires_after_secs') or init.get('expires_after_secs')
+        processing = final.get('processing_info')
+        if processing:
+            self._wait_processing(media_id, processing)
+
+        self._count('uploads')
+        self._count('bytes', size)
+        logger.info(f"媒体上传完成: {os.path.basename(path)} ({size} 字节，{len(futures)} 块，"
+                    f"{time.monotonic() - started:.1f} 秒)，media id {media_id}")
+        return str(media_id), expires_in
+
+    def _append(self, media_id: str, mapped: mmap.mmap, index: int, offset: int):
+        """上传一块（失败时重试 chunk_retries 次）"""
+        # 只复制当前块，同时在内存中的数据不超过 concurrency 块
+        chunk = mapped[offset:offset + self.chunk_size]
+        for attempt in range(self.chunk_retries + 1):
+            check_deadline()
+            try:
+                self._http(
+                    'POST', f"{self.upload_url}/{media_id}/append",
+                    data={'segment_index': index},
+                    files={'media': ('chunk', chunk, 'application/octet-stream')}
+                )
+                self._count('chunks')
+                return
+            except MediaUploadError as e:
+                if attempt >= self.chunk_retries:
+                    raise
+                logger.warning(f"媒体分块 {index} 上传失败，重试 ({attempt + 1}/{self.chunk_retries}): {e}")
+                time.sleep(min(2 ** attempt, 5))
+
+    def _wait_processing(self, media_id: str, processing: Dict[str, Any]):
+        """
+        轮询服务端处理状态直到完成
+
+        Raises:
+            MediaUploadError: 处理失败或超时
+        """
+        give_up_at = time.monotonic() + self.status_timeout
+        while processing.get('state') in ('pending', 'in_progress'):
+            wait = processing.get('check_after_secs') or 1
+            if time.monotonic() + wait > give_up_at:
+                raise MediaUploadError(f"媒体 {media_id} 处理超时")
+            timeout = remaining_timeout(current_phase('post'))
+            if timeout is not None and timeout < wait:
+                raise DeadlineExceeded(current_phase('post'))
+            logger.debug(f"媒体 {media_id} 处理中 ({processing.get('progress_percent', 0)}%)，{wait} 秒后查询")
+            time.sleep(wait)
+            status = self._http('GET', self.upload_url, params={'command': 'STATUS', 'media_id': media_id})
+            processing = (status.get('data') or {}).get('processing_info') or {'state': 'succeeded'}
+
+        if processing.get('state') == 'failed':
+            error = processing.get('error') or {}
+            raise MediaUploadError(f"媒体 {media_id} 处理失败: {error.get('message') or error}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取上传统计和缓存大小"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['cache_size'] = self.cache.size()
+        stats['concurrency'] = self.concurrency
+        stats['chunk_size'] = self.chunk_size
+        return stats
@@ -0,0 +1,414 @@
+"""
+推文指标时序存储模块
+定期批量获取本账号推文的公开指标（每次请求 100 条，遵守速率限制），按列保存为时间序列：
+每条推文一行，时间戳和每个指标各占一列，列中按差值编码（zigzag + varint）依次追加；
+与上一次相比没有变化的快照不写入，只更新检查时间，因此反复采集不变的指标几乎不占空间
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Iterable
+import tweepy
+from utils.config_loader import config_loader
+from utils.logger import logger
+
+
+# 保存的公开指标（每个指标一列）
+METRICS = ('impression_count', 'like_count', 'retweet_count', 'reply_count', 'quote_count', 'bookmark_count')
+# 计入互动数的指标
+ENGAGEMENT_METRICS = ('like_count', 'retweet_count', 'reply_count', 'quote_count', 'bookmark_count')
+
+
+def engagement_of(values: Dict[str, Any]) -> int:
+    """计算一组指标的互动数（点赞、转推、回复、引用、收藏之和）"""
+    return sum(values.get(name) or 0 for name in ENGAGEMENT_METRICS)
+
+
+def _encode_delta(delta: int) -> bytes:
+    """将一个差值编码为 zigzag varint"""
+    value = (delta << 1) ^ (delta >> 63)
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_column(data: bytes) -> List[int]:
+    """
+    解码一列差值编码的数据
+
+    Args:
+        data: 列数据
+
+    Returns:
+        还原后的数值列表
+    """
+    values = []
+    current = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        current += (value >> 1) ^ -(value & 1)
+        values.append(current)
+        value = 0
+        shift = 0
+    return values
+
+
+class MetricsStore:
+    """推文指标时序存储类"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tweet_metrics (
+            tweet_id INTEGER PRIMARY KEY,
+            posted_at REAL NOT NULL,
+            points INTEGER NOT NULL,
+            ts BLOB NOT NULL,
+            impression_count BLOB NOT NULL,
+            like_count BLOB NOT NULL,
+            retweet_count BLOB NOT NULL,
+            reply_count BLOB NOT NULL,
+            quote_count BLOB NOT NULL,
+            bookmark_count BLOB NOT NULL,
+            last_ts INTEGER NOT NULL,
+            last_values TEXT NOT NULL,
+            checked_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化存储（首次使用时才创建数据库文件）
+
+        Args:
+            db_path: SQLite 数据库文件路径，为 None 时使用配置（twitter.metrics.db_path）
+        """
+        if db_path is None:
+            metrics_config = config_loader.get_twitter_config().get('metrics') or {}
+            db_path = metrics_config.get('db_path', 'data/metrics.db')
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.stats = {'snapshots': 0, 'stored': 0, 'unchanged': 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接"""
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def record(self, snapshots: Dict[int, Dict[str, int]], posted_at: Dict[int, float],
+               observed_at: Optional[float] = None) -> int:
+        """
+        写入一批指标快照
+
+        Args:
+            snapshots: {推文 ID: public_metrics}
+            posted_at: {推文 ID: 发送时间戳}（首次写入时使用）
+            observed_at: 采集时间，默认为当前时间
+
+        Returns:
+            实际追加的数据点数（与上次相同的快照不追加）
+        """
+        if not snapshots:
+            return 0
+        observed_at = time.time() if observed_at is None else observed_at
+        ts = int(observed_at)
+        stored = 0
+        columns = ', '.join(METRICS)
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for tweet_id, metrics in snapshots.items():
+                    tweet_id = int(tweet_id)
+                    row = conn.execute(
+                        f"SELECT points, ts, {columns}, last_ts, last_values FROM tweet_metrics WHERE tweet_id = ?",
+                        (tweet_id,)
+                    ).fetchone()
+                    if row is None:
+                        values = [int(metrics.get(name) or 0) for name in METRICS]
+                        conn.execute(
+                            f"INSERT INTO tweet_metrics (tweet_id, posted_at, points, ts, {columns}, "
+                            f"last_ts, last_values, checked_at) VALUES (?, ?, 1, ?, "
+                            f"{', '.join('?' for _ in METRICS)}, ?, ?, ?)",
+                            (tweet_id, posted_at.get(tweet_id, observed_at), _encode_delta(ts),
+                             *(_encode_delta(value) for value in values), ts, json.dumps(values), observed_at)
+                        )
+                        stored += 1
+                        continue
+
+                    last = json.loads(row['last_values'])
+                    # 响应中缺少的指标（如未开放的 impression_count）沿用上一次的值
+                    values = [int(metrics[name]) if metrics.get(name) is not None else last[index]
+                              for index, name in enumerate(METRICS)]
+                    if values == last:
+                        conn.execute("UPDATE tweet_metrics SET checked_at = ? WHERE tweet_id = ?",
+                                     (observed_at, tweet_id))
+                        continue
+                    appended = [row['ts'] + _encode_delta(ts - row['last_ts'])]
+                    appended.extend(row[name] + _encode_delta(value - last[index])
+                                    for index, (name, value) in enumerate(zip(METRICS, values)))
+                    conn.execute(
+                        f"UPDATE tweet_metrics SET points = ?, ts = ?, "
+                        f"{', '.join(f'{name} = ?' for name in METRICS)}, "
+                        f"last_ts = ?, last_values = ?, checked_at = ? WHERE tweet_id = ?",
+                        (row['points'] + 1, *appended, ts, json.dumps(values), observed_at, tweet_id)
+                    )
+                    stored += 1
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self.stats['snapshots'] += len(snapshots)
+            self.stats['stored'] += stored
+            self.stats['unchanged'] += len(snapshots) - stored
+        return stored
+
+    def checked_times(self) -> Dict[int, float]:
+        """获取每条推文最近一次采集的时间 {推文 ID: 时间戳}"""
+        with self._lock:
+            rows = self._connect().execute("SELECT tweet_id, checked_at FROM tweet_metrics").fetchall()
+        return {row['tweet_id']: row['checked_at'] for row in rows}
+
+    def series(self, tweet_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取一条推文的完整时间序列（只包含指标发生变化的数据点）
+
+        Args:
+            tweet_id: 推文 ID
+
+        Returns:
+            {'posted_at', 'checked_at', 'ts': [...], 指标名: [...]}，没有数据时返回 None
+        """
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT posted_at, checked_at, ts, {', '.join(METRICS)} FROM tweet_metrics WHERE tweet_id = ?",
+                (int(tweet_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        result = {'posted_at': row['posted_at'], 'checked_at': row['checked_at'], 'ts': decode_column(row['ts'])}
+        for name in METRICS:
+            result[name] = decode_column(row[name])
+        return result
+
+    def values_at(self, offset_seconds: float, exclude: Optional[set] = None,
+                  tweet_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        获取已满 offset_seconds 的推文在发送后该时刻的指标（用于按固定时间点比较推文表现）
+
+        Args:
+            offset_seconds: 发送后的秒数
+            exclude: 跳过的推文 ID（调用方已处理过的推文）
+            tweet_ids: 只查询这些推文，为 None 时查询全部
+
+        Returns:
+            {推文 ID: {'posted_at', 指标名...}}，只包含最近一次采集时已满 offset_seconds 的推文
+        """
+        exclude = exclude or set()
+        sql = (f"SELECT tweet_id, posted_at, ts, {', '.join(METRICS)} FROM tweet_metrics "
+               f"WHERE checked_at >= posted_at + ?")
+        params: List[Any] = [offset_seconds]
+        if tweet_ids is not None:
+            if not tweet_ids:
+                return {}
+            sql += f" AND tweet_id IN ({', '.join('?' for _ in tweet_ids)})"
+            params.extend(int(tweet_id) for tweet_id in tweet_ids)
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        result = {}
+        for row in rows:
+            if row['tweet_id'] in exclude:
+                continue
+            moment = row['posted_at'] + offset_seconds
+            timestamps = decode_column(row['ts'])
+            index = sum(1 for ts in timestamps if ts <= moment) - 1
+            if index < 0:
+                # 第一次采集已晚于该时刻，取最早的数据点
+                index = 0
+            values = {'posted_at': row['posted_at']}
+            for name in METRICS:
+                values[name] = decode_column(row[name])[index]
+            result[row['tweet_id']] = values
+        return result
+
+    def performance(self, tweet_id: int, hours: int = 48, step_minutes: int = 60) -> Optional[Dict[str, Any]]:
+        """
+        按发送后的固定间隔取样指标（取每个时刻之前最近的数据点），用于查看发送后前 N 小时的表现
+
+        Args:
+            tweet_id: 推文 ID
+            hours: 发送后的小时数
+            step_minutes: 取样间隔（分钟）
+
+        Returns:
+            {'tweet_id', 'posted_at', 'points', 'samples': [{'minutes', 指标名...}]}，没有数据时返回 None；
+            第一次采集之前的时刻没有数据，最近一次采集之后的时刻不返回
+        """
+        data = self.series(tweet_id)
+        if data is None:
+            return None
+        timestamps = data['ts']
+        samples = []
+        index = -1
+        step = max(int(step_minutes), 1) * 60
+        for offset in range(0, int(hours) * 3600 + 1, step):
+            moment = data['posted_at'] + offset
+            if moment > data['checked_at']:
+                break
+            while index + 1 < len(timestamps) and timestamps[index + 1] <= moment:
+                index += 1
+            sample = {'minutes': offset // 60}
+            for name in METRICS:
+                sample[name] = data[name][index] if index >= 0 else None
+            samples.append(sample)
+        return {'tweet_id': str(tweet_id), 'posted_at': data['posted_at'], 'points': len(timestamps),
+                'samples': samples}
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取存储规模和写入统计"""
+        sizes = ' + '.join(f'LENGTH({name})' for name in ('ts',) + METRICS)
+        with self._lock:
+            row = self._connect().execute(
+                f"SELECT COUNT(*), COALESCE(SUM(points), 0), COALESCE(SUM({sizes}), 0) FROM tweet_metrics"
+            ).fetchone()
+            stats = dict(self.stats)
+        return {'tweets': row[0], 'points': row[1], 'series_bytes': row[2], **stats}
+
+
+class MetricsCollector:
+    """推文指标采集类"""
+
+    def __init__(self, store: MetricsStore, tweet_store, metrics_config: Optional[dict] = None):
+        """
+        初始化采集器
+
+        Args:
+            store: 指标时序存储
+            tweet_store: 本地推文存储（提供推文 ID 和发送时间）
+            metrics_config: 采集配置（twitter.metrics）
+        """
+        metrics_config = metrics_config or {}
+        self.store = store
+        self.tweet_store = tweet_store
+        # 发送后的这段时间内每次都采集，之后按 refresh_after_hours 的间隔采集
+        self.track_hours = metrics_config.get('track_hours', 48)
+        self.refresh_after_hours = metrics_config.get('refresh_after_hours', 24)
+        self.batch_size = min(metrics_config.get('batch_size', 100), 100)
+        self.max_requests_per_run = metrics_config.get('max_requests_per_run', 5)
+        # 推文查询接口的速率限制（每个窗口的请求数），采集器自己计数，不等到 429
+        self.window_requests = metrics_config.get('rate_limit_requests', 15)
+        self.window_seconds = metrics_config.get('rate_limit_window_seconds', 900)
+        self._requests = deque()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'runs': 0, 'requests': 0, 'tweets': 0, 'rate_limited': 0, 'errors': 0}
+
+    def _acquire(self) -> bool:
+        """在速率限制内占用一次请求额度，额度用完时返回 False"""
+        now = time.time()
+        if now < self._blocked_until:
+            return False
+        while self._requests and now - self._requests[0] >= self.window_seconds:
+            self._requests.popleft()
+        if len(self._requests) >= self.window_requests:
+            return False
+        self._requests.append(now)
+        return True
+
+    def _due_ids(self, now: float) -> List[int]:
+        """需要采集的推文 ID（发送不久的推文从新到旧在前，其余按上次采集时间从早到晚）"""
+        posted = self.tweet_store.posted_times()
+        checked = self.store.checked_times()
+        young = sorted((tweet_id for tweet_id, created_at in posted.items()
+                        if now - created_at < self.track_hours * 3600), reverse=True)
+        young_set = set(young)
+        old = sorted((tweet_id for tweet_id in posted
+                      if tweet_id not in young_set
+                      and now - checked.get(tweet_id, 0) >= self.refresh_after_hours * 3600),
+                     key=lambda tweet_id: checked.get(tweet_id, 0))
+        return young + old
+
+    @staticmethod
+    def _batches(ids: List[int], size: int) -> Iterable[List[int]]:
+        """按 size 分批"""
+        for start in range(0, len(ids), size):
+            yield ids[start:start + size]
+
+    def collect(self, twitter_client) -> Dict[str, Any]:
+        """
+        采集一轮指标
+
+        Args:
+            twitter_client: Twitter 客户端（需提供 get_tweet_metrics）
+
+        Returns:
+            采集结果字典
+        """
+        with self._lock:
+            self.stats['runs'] += 1
+            now = time.time()
+            ids = self._due_ids(now)
+            posted = self.tweet_store.posted_times()
+            collected = 0
+            stored = 0
+            requests_made = 0
+            for batch in self._batches(ids, self.batch_size):
+                if requests_made >= self.max_requests_per_run or not self._acquire():
+                    break
+                requests_made += 1
+                self.stats['requests'] += 1
+                try:
+                    metrics, missing = twitter_client.get_tweet_metrics([str(tweet_id) for tweet_id in batch])
+                except tweepy.TooManyRequests as e:
+                    self.stats['rate_limited'] += 1
+                    reset = getattr(getattr(e, 'response', None), 'headers', {}).get('x-rate-limit-reset')
+                    self._blocked_until = float(reset) if reset else time.time() + self.window_seconds
+                    logger.warning("获取推文指标遇到速率限制，暂停采集至限制重置")
+                    break
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    logger.error(f"获取推文指标失败: {e}")
+                    return {'success': False, 'collected': collected, 'stored': stored,
+                            'pending': len(ids) - collected, 'error': str(e)}
+                snapshots = {int(tweet_id): values for tweet_id, values in metrics.items()}
+                stored += self.store.record(snapshots, posted, observed_at=time.time())
+                self.tweet_store.update_metrics(snapshots)
+                if missing:
+                    # 已删除的推文不再采集
+                    self.tweet_store.remove([int(tweet_id) for tweet_id in missing])
+                    logger.info(f"{len(missing)} 条推文已不存在，已从本地推文存储中移除")
+                collected += len(batch)
+                self.stats['tweets'] += len(snapshots)
+
+            if collected:
+                logger.info(f"采集了 {collected} 条推文的指标，其中 {stored} 条有变化")
+            return {'success': True, 'collected': collected, 'stored': stored, 'pending': len(ids) - collected}
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取采集统计和存储状态"""
+        with self._lock:
+            stats = dict(self.stats)
+            blocked = max(self._blocked_until - time.time(), 0.0)
+        return {**self.store.get_status(), **stats, 'blocked_for_seconds': round(blocked, 1)}
+
+
+# 全局推文指标存储实例
+metrics_store = MetricsStore()
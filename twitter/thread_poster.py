@@ -0,0 +1,471 @@
+"""
+推文串（thread）发送模块
+将超长内容在句末拆分为带编号的多条推文，以回复链的形式依次发送；
+每条推文的发送进度持久化到 SQLite，发送中途失败或程序重启后从上次成功的位置继续，不会重复发送
+"""
+
+import html
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+import pytz
+from utils.deadline import DeadlineExceeded
+from utils.twitter_text import split_thread, MAX_WEIGHTED_LENGTH
+from utils.logger import logger
+
+
+class ThreadStore:
+    """推文串存储类"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS threads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            total INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            media TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            error TEXT
+        );
+        CREATE TABLE IF NOT EXISTS thread_parts (
+            thread_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            tweet_id TEXT,
+            posted_at REAL,
+            PRIMARY KEY (thread_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS idx_threads_unfinished
+            ON threads(id) WHERE status IN ('pending', 'posting', 'failed');
+    """
+
+    def __init__(self, db_path: str = 'data/threads.db'):
+        """
+        初始化存储（首次使用时才创建数据库文件）
+
+        Args:
+            db_path: SQLite 数据库文件路径
+        """
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接"""
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    @staticmethod
+    def _format_time(value: Optional[float]) -> Optional[str]:
+        """将时间戳转换为 ISO 字符串"""
+        if value is None:
+            return None
+        return datetime.fromtimestamp(value, pytz.utc).isoformat()
+
+    def create(self, parts: List[str], media_paths: Optional[List[str]] = None) -> int:
+        """
+        保存一个待发送的推文串
+
+        Args:
+            parts: 各条推文内容（按发送顺序）
+            media_paths: 第一条推文附带的媒体文件路径
+
+        Returns:
+            推文串 ID
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO threads (total, media, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (len(parts), json.dumps(media_paths) if media_paths else None, now, now)
+                )
+                thread_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO thread_parts (thread_id, position, content) VALUES (?, ?, ?)",
+                    [(thread_id, position, content) for position, content in enumerate(parts)]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return thread_id
+
+    def get(self, thread_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取推文串及其各条推文
+
+        Returns:
+            推文串字典（parts 按顺序排列），不存在时返回 None
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT * FROM threads WHERE id = ?", (thread_id,)).fetchone()
+            if row is None:
+                return None
+            parts = conn.execute(
+                "SELECT position, content, status, tweet_id, posted_at FROM thread_parts "
+                "WHERE thread_id = ? ORDER BY position",
+                (thread_id,)
+            ).fetchall()
+        thread = dict(row)
+        thread['media'] = json.loads(thread['media']) if thread['media'] else None
+        thread['parts'] = [dict(part) for part in parts]
+        return thread
+
+    def start_attempt(self, thread_id: int) -> bool:
+        """
+        开始发送（记录尝试次数）
+
+        Returns:
+            是否可以发送（已完成、已取消或正在发送的推文串返回 False）
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE threads SET status = 'posting', attempts = attempts + 1, updated_at = ?, error = NULL "
+                "WHERE id = ? AND status IN ('pending', 'failed')",
+                (time.time(), thread_id)
+            )
+            return cursor.rowcount > 0
+
+    def mark_part_posting(self, thread_id: int, position: int):
+        """发送前标记该条推文为发送中（重启后据此确认是否已经发出）"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE thread_parts SET status = 'posting' WHERE thread_id = ? AND position = ?",
+                (thread_id, position)
+            )
+
+    def mark_part_posted(self, thread_id: int, position: int, tweet_id: str):
+        """标记该条推文已发送"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE thread_parts SET status = 'posted', tweet_id = ?, posted_at = ? "
+                "WHERE thread_id = ? AND position = ?",
+                (str(tweet_id), now, thread_id, position)
+            )
+            conn.execute("UPDATE threads SET updated_at = ? WHERE id = ?", (now, thread_id))
+
+    def set_status(self, thread_id: int, status: str, error: Optional[str] = None):
+        """设置推文串状态（posted / failed / cancelled）"""
+        with self._lock:
+            self._connect().execute(
+                "UPDATE threads SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), thread_id)
+            )
+
+    def recover_interrupted(self) -> List[int]:
+        """
+        将上次运行时中断在"发送中"状态的推文串标记为失败（等待续发）
+
+        Returns:
+            推文串 ID 列表
+        """
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT id FROM threads WHERE status = 'posting'").fetchall()
+            conn.execute(
+                "UPDATE threads SET status = 'failed', error = ? WHERE status = 'posting'",
+                ('发送过程中程序中断',)
+            )
+        return [row['id'] for row in rows]
+
+    def resumable(self, max_attempts: int) -> List[int]:
+        """
+        获取可以续发的推文串（待发送或失败且尝试次数未达上限）
+
+        Args:
+            max_attempts: 最大尝试次数
+
+        Returns:
+            推文串 ID 列表（从旧到新）
+        """
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM threads WHERE status IN ('pending', 'failed') AND attempts < ? ORDER BY id",
+                (max_attempts,)
+            ).fetchall()
+        return [row['id'] for row in rows]
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        列出推文串
+
+        Args:
+            status: 按状态过滤（pending / posting / posted / failed / cancelled）
+            limit: 最多返回条数
+
+        Returns:
+            推文串列表（从新到旧，包含已发送条数和第一条推文 ID）
+        """
+        query = (
+            "SELECT t.*, "
+            "(SELECT COUNT(*) FROM thread_parts p WHERE p.thread_id = t.id AND p.status = 'posted') AS posted, "
+            "(SELECT tweet_id FROM thread_parts p WHERE p.thread_id = t.id AND p.position = 0) AS root_tweet_id "
+            "FROM threads t"
+        )
+        with self._lock:
+            if status:
+                rows = self._connect().execute(
+                    f"{query} WHERE t.status = ? ORDER BY t.id DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._connect().execute(f"{query} ORDER BY t.id DESC LIMIT ?", (limit,)).fetchall()
+        items = []
+        for row in rows:
+            item = dict(row)
+            item['created_at'] = self._format_time(item['created_at'])
+            item['updated_at'] = self._format_time(item['updated_at'])
+            items.append(item)
+        return items
+
+
+class ThreadPoster:
+    """推文串发送类"""
+
+    def __init__(self, thread_config: Optional[dict] = None):
+        """
+        初始化推文串发送器
+
+        Args:
+            thread_config: 推文串配置（scheduler.thread）
+        """
+        thread_config = thread_config or {}
+        self.max_length = thread_config.get('max_length', MAX_WEIGHTED_LENGTH)
+        self.max_parts = thread_config.get('max_parts', 10)
+        self.numbering = thread_config.get('numbering', True)
+        self.number_format = thread_config.get('number_format', ' {index}/{total}')
+        self.max_attempts = thread_config.get('max_attempts', 3)
+        self.store = ThreadStore(thread_config.get('db_path', 'data/threads.db'))
+        # 同一推文串同时只由一个线程发送
+        self._posting = set()
+        self._lock = threading.Lock()
+
+    def split(self, content: str) -> List[str]:
+        """
+        将内容拆分为推文串
+
+        Args:
+            content: 内容
+
+        Returns:
+            各条推文内容
+        """
+        return split_thread(content, self.max_length, self.numbering, self.number_format)
+
+    def create(self, content: str, media_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        拆分内容并保存为待发送的推文串
+
+        Args:
+            content: 内容
+            media_paths: 第一条推文附带的媒体文件路径
+
+        Returns:
+            结果字典（包含推文串 ID 和各条推文内容）
+        """
+        parts = self.split(content)
+        if not parts:
+            return {'success': False, 'error': '推文内容为空'}
+        if len(parts) > self.max_parts:
+            return {'success': False, 'error': f'内容过长: 需要 {len(parts)} 条推文，上限 {self.max_parts} 条'}
+        thread_id = self.store.create(parts, media_paths)
+        logger.info(f"已创建推文串 #{thread_id}，共 {len(parts)} 条")
+        return {'success': True, 'thread_id': thread_id, 'parts': parts}
+
+    def post_content(self, content: str, twitter_client, media_paths: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        拆分内容并以回复链的形式发送
+
+        Args:
+            content: 内容
+            twitter_client: Twitter 客户端（需提供 post_tweet）
+            media_paths: 第一条推文附带的媒体文件路径
+
+        Returns:
+            发送结果字典
+        """
+        created = self.create(content, media_paths)
+        if not created.get('success'):
+            logger.error(f"创建推文串失败: {created.get('error')}")
+            return created
+        return self.post(created['thread_id'], twitter_client)
+
+    def post(self, thread_id: int, twitter_client) -> Dict[str, Any]:
+        """
+        发送（或续发）推文串
+
+        从第一条未发送的推文开始，每条回复上一条；每条发送前后都记录进度，
+        上次中断在发送中的推文会先在最近的推文中确认是否已经发出
+
+        Args:
+            thread_id: 推文串 ID
+            twitter_client: Twitter 客户端（需提供 post_tweet）
+
+        Returns:
+            发送结果字典（id / url 为第一条推文）
+
+        Raises:
+            DeadlineExceeded: 截止时间已到（进度已保存，可以续发）
+        """
+        with self._lock:
+            if thread_id in self._posting:
+                return {'success': False, 'thread_id': thread_id, 'error': '推文串正在发送中'}
+            self._posting.add(thread_id)
+        try:
+            if not self.store.start_attempt(thread_id):
+                thread = self.store.get(thread_id)
+                if thread is None:
+                    return {'success': False, 'thread_id': thread_id, 'error': '推文串不存在'}
+                if thread['status'] == 'posted':
+                    return self._result(thread)
+                return {'success': False, 'thread_id': thread_id, 'error': f"推文串状态为 {thread['status']}，无法发送"}
+            return self._post_parts(thread_id, twitter_client)
+        finally:
+            with self._lock:
+                self._posting.discard(thread_id)
+
+    def _post_parts(self, thread_id: int, twitter_client) -> Dict[str, Any]:
+        """依次发送推文串中尚未发送的推文"""
+        thread = self.store.get(thread_id)
+        previous_id = None
+        for part in thread['parts']:
+            position = part['position']
+            if part['status'] == 'posted':
+                previous_id = part['tweet_id']
+                continue
+
+            if part['status'] == 'posting':
+                # 上次发送这条推文时中断，无法确定是否已经发出
+                found = self._find_posted(part['content'], previous_id, twitter_client)
+                if found:
+                    logger.info(f"推文串 #{thread_id} 第 {position + 1} 条已在上次发出 (ID: {found})")
+                    self.store.mark_part_posted(thread_id, position, found)
+                    part.update(status='posted', tweet_id=found)
+                    previous_id = found
+                    continue
+
+            self.store.mark_part_posting(thread_id, position)
+            kwargs = {'media_paths': thread['media']} if position == 0 and thread['media'] else {}
+            try:
+                result = twitter_client.post_tweet(part['content'], in_reply_to_tweet_id=previous_id, **kwargs)
+            except DeadlineExceeded:
+                self.store.set_status(thread_id, 'failed', f"第 {position + 1} 条发送超时")
+                raise
+            if not result or not result.get('success'):
+                error = f"第 {position + 1} 条发送失败"
+                self.store.set_status(thread_id, 'failed', error)
+                logger.error(f"推文串 #{thread_id} {error}，已发送 {position}/{len(thread['parts'])} 条，可稍后续发")
+                return {**self._result(self.store.get(thread_id)), 'success': False, 'error': error}
+
+            self.store.mark_part_posted(thread_id, position, result['id'])
+            part.update(status='posted', tweet_id=str(result['id']))
+            previous_id = str(result['id'])
+
+        self.store.set_status(thread_id, 'posted')
+        logger.info(f"推文串 #{thread_id} 发送完成，共 {len(thread['parts'])} 条")
+        return self._result(self.store.get(thread_id))
+
+    def _find_posted(self, content: str, previous_id: Optional[str], twitter_client) -> Optional[str]:
+        """
+        在最近的推文中查找内容相同、且晚于上一条的推文
+
+        Returns:
+            推文 ID，未找到时返回 None
+        """
+        get_recent = getattr(twitter_client, 'get_recent_tweets', None)
+        if get_recent is None:
+            return None
+        # 延迟导入，避免循环导入
+        from llm.validators import normalize_text
+        expected = normalize_text(content)
+        for tweet in get_recent(count=20):
+            if previous_id is not None and int(tweet['id']) <= int(previous_id):
+                continue
+            if normalize_text(html.unescape(tweet.get('text') or '')) == expected:
+                return str(tweet['id'])
+        return None
+
+    @staticmethod
+    def _result(thread: Dict[str, Any]) -> Dict[str, Any]:
+        """根据推文串记录生成发送结果"""
+        tweet_ids = [part['tweet_id'] for part in thread['parts'] if part['status'] == 'posted']
+        root_id = tweet_ids[0] if tweet_ids else None
+        return {
+            'success': thread['status'] == 'posted',
+            'thread_id': thread['id'],
+            'id': root_id,
+            'url': f"https://twitter.com/user/status/{root_id}" if root_id else None,
+            'tweet_ids': tweet_ids,
+            'posted': len(tweet_ids),
+            'total': thread['total'],
+            'content': '\n'.join(part['content'] for part in thread['parts'])
+        }
+
+    def recover_interrupted(self) -> int:
+        """
+        处理上次运行时中断在"发送中"状态的推文串（程序启动时调用），之后由 resume_all 从中断处续发
+
+        Returns:
+            处理的推文串数
+        """
+        interrupted = self.store.recover_interrupted()
+        if interrupted:
+            logger.warning(f"有 {len(interrupted)} 个推文串在上次运行中断时处于发送中状态，将从中断处续发")
+        return len(interrupted)
+
+    def resume_all(self, twitter_client) -> List[Dict[str, Any]]:
+        """
+        续发所有未完成的推文串（尝试次数未达上限）
+
+        Args:
+            twitter_client: Twitter 客户端
+
+        Returns:
+            各推文串的发送结果
+        """
+        results = []
+        for thread_id in self.store.resumable(self.max_attempts):
+            logger.info(f"续发推文串 #{thread_id}")
+            results.append(self.post(thread_id, twitter_client))
+        return results
+
+    def cancel(self, thread_id: int) -> bool:
+        """
+        取消一个未发送完的推文串（已发送的推文不会删除）
+
+        Returns:
+            是否取消成功
+        """
+        thread = self.store.get(thread_id)
+        if thread is None or thread['status'] in ('posted', 'cancelled') or thread_id in self._posting:
+            return False
+        self.store.set_status(thread_id, 'cancelled')
+        return True
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取推文串配置和未完成的推文串数"""
+        return {
+            'max_length': self.max_length,
+            'max_parts': self.max_parts,
+            'numbering': self.numbering,
+            'max_attempts': self.max_attempts,
+            'unfinished': len(self.store.resumable(self.max_attempts))
+        }
@@ -0,0 +1,444 @@
+"""
+本地推文存储模块
+将本账号的推文保存到 SQLite，并与时间线增量同步：
+新推文使用 since_id 增量获取（超过一页时按 pagination_token 翻页），
+历史推文按 pagination_token 回填（进度持久化，可分多次完成）；
+/tweets/recent 直接从本地查询，支持任意深度和过滤，不消耗 API 配额
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+import pytz
+from utils.config_loader import config_loader
+from utils.logger import logger
+
+
+# 同步时请求的推文字段
+TWEET_FIELDS = ['created_at', 'public_metrics', 'conversation_id', 'in_reply_to_user_id', 'referenced_tweets', 'lang']
+
+
+def tweet_to_record(tweet) -> Dict[str, Any]:
+    """
+    将 tweepy 的 Tweet 对象转换为存储记录
+
+    Args:
+        tweet: tweepy.Tweet
+
+    Returns:
+        记录字典
+    """
+    referenced = getattr(tweet, 'referenced_tweets', None) or []
+    kinds = {getattr(item, 'type', None) for item in referenced}
+    if 'retweeted' in kinds:
+        kind = 'retweet'
+    elif 'replied_to' in kinds:
+        kind = 'reply'
+    elif 'quoted' in kinds:
+        kind = 'quote'
+    else:
+        kind = 'original'
+    created_at = getattr(tweet, 'created_at', None)
+    metrics = getattr(tweet, 'public_metrics', None)
+    return {
+        'id': int(tweet.id),
+        'text': tweet.text,
+        'created_at': created_at.timestamp() if created_at else time.time(),
+        'kind': kind,
+        'conversation_id': str(tweet.conversation_id) if getattr(tweet, 'conversation_id', None) else None,
+        'lang': getattr(tweet, 'lang', None),
+        'public_metrics': json.dumps(metrics) if metrics else None
+    }
+
+
+class TweetStore:
+    """本地推文存储类"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tweets (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            kind TEXT NOT NULL DEFAULT 'original',
+            conversation_id TEXT,
+            lang TEXT,
+            public_metrics TEXT,
+            synced_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tweets_created ON tweets(created_at);
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化存储（首次使用时才创建数据库文件）
+
+        Args:
+            db_path: SQLite 数据库文件路径，为 None 时使用配置（twitter.timeline.db_path）
+        """
+        if db_path is None:
+            timeline_config = config_loader.get_twitter_config().get('timeline') or {}
+            db_path = timeline_config.get('db_path', 'data/tweets.db')
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取数据库连接"""
+        if self._conn is None:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    def upsert(self, records: List[Dict[str, Any]]) -> int:
+        """
+        写入推文（已存在时更新内容和指标）
+
+        Args:
+            records: tweet_to_record 生成的记录
+
+        Returns:
+            写入的条数
+        """
+        if not records:
+            return 0
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    "INSERT INTO tweets (id, text, created_at, kind, conversation_id, lang, public_metrics, synced_at) "
+                    "VALUES (:id, :text, :created_at, :kind, :conversation_id, :lang, :public_metrics, :synced_at) "
+                    "ON CONFLICT(id) DO UPDATE SET text = excluded.text, created_at = excluded.created_at, "
+                    "kind = excluded.kind, conversation_id = excluded.conversation_id, lang = excluded.lang, "
+                    "public_metrics = COALESCE(excluded.public_metrics, tweets.public_metrics), "
+                    "synced_at = excluded.synced_at",
+                    [{**record, 'synced_at': now} for record in records]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return len(records)
+
+    def add_posted(self, tweet_id: str, content: str, in_reply_to_tweet_id: Optional[str] = None):
+        """
+        记录刚发送成功的推文（下次同步时补全字段）
+
+        Args:
+            tweet_id: 推文 ID
+            content: 推文内容
+            in_reply_to_tweet_id: 回复的推文 ID
+        """
+        self.upsert([{
+            'id': int(tweet_id),
+            'text': content,
+            'created_at': time.time(),
+            'kind': 'reply' if in_reply_to_tweet_id else 'original',
+            'conversation_id': None,
+            'lang': None,
+            'public_metrics': None
+        }])
+
+    def remove(self, tweet_ids: List[int]):
+        """删除推文（推文在时间线上已不存在时）"""
+        if not tweet_ids:
+            return
+        with self._lock:
+            self._connect().execute(
+                f"DELETE FROM tweets WHERE id IN ({', '.join('?' for _ in tweet_ids)})", [int(i) for i in tweet_ids]
+            )
+
+    def get_state(self, key: str) -> Optional[str]:
+        """获取同步状态"""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_state(self, key: str, value: Optional[str]):
+        """设置同步状态"""
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    def newest_id(self) -> Optional[int]:
+        """本地最新的推文 ID"""
+        with self._lock:
+            row = self._connect().execute("SELECT MAX(id) FROM tweets").fetchone()
+        return row[0]
+
+    def oldest_id(self) -> Optional[int]:
+        """本地最早的推文 ID"""
+        with self._lock:
+            row = self._connect().execute("SELECT MIN(id) FROM tweets").fetchone()
+        return row[0]
+
+    def count(self) -> int:
+        """本地推文数"""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM tweets").fetchone()[0]
+
+    def query(self, limit: int = 5, before_id: Optional[int] = None, since: Optional[datetime] = None,
+              until: Optional[datetime] = None, contains: Optional[str] = None,
+              kinds: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        查询本地推文（按 ID 从新到旧，ID 即时间顺序）
+
+        Args:
+            limit: 最多返回条数
+            before_id: 只返回 ID 小于该值的推文（用于翻页）
+            since: 只返回该时间之后发送的推文
+            until: 只返回该时间之前发送的推文
+            contains: 内容包含的文本（不区分 ASCII 大小写）
+            kinds: 推文类型（original / reply / quote / retweet）
+
+        Returns:
+            推文列表，字段与 get_recent_tweets 一致
+        """
+        conditions = []
+        params: List[Any] = []
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(int(before_id))
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until.timestamp())
+        if contains:
+            conditions.append("text LIKE ? ESCAPE '\\'")
+            escaped = contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        if kinds:
+            conditions.append(f"kind IN ({', '.join('?' for _ in kinds)})")
+            params.extend(kinds)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        params.append(limit)
+
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT id, text, created_at, kind, public_metrics FROM tweets {where} ORDER BY id DESC LIMIT ?",
+                params
+            ).fetchall()
+        return [{
+            'id': str(row['id']),
+            'text': row['text'],
+            'created_at': datetime.fromtimestamp(row['created_at'], pytz.utc).isoformat(),
+            'kind': row['kind'],
+            'public_metrics': json.loads(row['public_metrics']) if row['public_metrics'] else None,
+            'url': f"https://twitter.com/user/status/{row['id']}"
+        } for row in rows]
+
+    def posted_times(self, include_retweets: bool = False) -> Dict[int, float]:
+        """
+        获取推文的发送时间
+
+        Args:
+            include_retweets: 是否包含转推（转推的指标属于原推文）
+
+        Returns:
+            {推文 ID: 发送时间戳}
+        """
+        where = '' if include_retweets else "WHERE kind != 'retweet'"
+        with self._lock:
+            rows = self._connect().execute(f"SELECT id, created_at FROM tweets {where}").fetchall()
+        return {row['id']: row['created_at'] for row in rows}
+
+    def texts(self) -> Dict[int, str]:
+        """获取推文内容 {推文 ID: 内容}（不含转推）"""
+        with self._lock:
+            rows = self._connect().execute("SELECT id, text FROM tweets WHERE kind != 'retweet'").fetchall()
+        return {row['id']: row['text'] for row in rows}
+
+    def update_metrics(self, metrics: Dict[int, Dict[str, int]]):
+        """
+        更新推文的最新公开指标
+
+        Args:
+            metrics: {推文 ID: public_metrics}
+        """
+        if not metrics:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    "UPDATE tweets SET public_metrics = ? WHERE id = ?",
+                    [(json.dumps(values), int(tweet_id)) for tweet_id, values in metrics.items()]
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+
+class TimelineSync:
+    """时间线同步类"""
+
+    def __init__(self, store: TweetStore, timeline_config: Optional[dict] = None):
+        """
+        初始化时间线同步
+
+        Args:
+            store: 本地推文存储
+            timeline_config: 同步配置（twitter.timeline）
+        """
+        timeline_config = timeline_config or {}
+        self.store = store
+        self.page_size = min(max(timeline_config.get('page_size', 100), 5), 100)
+        self.max_pages = timeline_config.get('max_pages_per_sync', 10)
+        self.backfill_pages = timeline_config.get('backfill_pages_per_run', 5)
+        self._lock = threading.Lock()
+        self.stats = {'syncs': 0, 'backfill_runs': 0, 'requests': 0, 'fetched': 0, 'errors': 0}
+
+    def _fetch_page(self, twitter_client, **kwargs):
+        """请求一页时间线，返回 (记录列表, meta)"""
+        self.stats['requests'] += 1
+        tweets, meta = twitter_client.get_timeline_page(
+            max_results=self.page_size, tweet_fields=TWEET_FIELDS, **kwargs
+        )
+        records = [tweet_to_record(tweet) for tweet in tweets]
+        self.stats['fetched'] += len(records)
+        return records, meta or {}
+
+    def sync(self, twitter_client) -> Dict[str, Any]:
+        """
+        增量同步新推文（since_id 之后的推文，超过一页时按 pagination_token 翻页）
+
+        翻页位置和本轮的最新 ID 在每页之后持久化，超过 max_pages 或中途失败时下次从原位置继续；
+        全部翻完后才把 since_id 推进到本轮开始时时间线上的最新 ID
+
+        Args:
+            twitter_client: Twitter 客户端（需提供 get_timeline_page）
+
+        Returns:
+            同步结果字典
+        """
+        with self._lock:
+            self.stats['syncs'] += 1
+            since_id = self.store.get_state('since_id')
+            token = self.store.get_state('sync_token')
+            pending_newest = self.store.get_state('sync_newest')
+            added = 0
+            pages = 0
+            try:
+                while pages < self.max_pages:
+                    kwargs = {'since_id': since_id} if since_id else {}
+                    if token:
+                        kwargs['pagination_token'] = token
+                    records, meta = self._fetch_page(twitter_client, **kwargs)
+                    pages += 1
+                    added += self.store.upsert(records)
+                    if not token and meta.get('newest_id'):
+                        pending_newest = str(meta['newest_id'])
+                        self.store.set_state('sync_newest', pending_newest)
+                    token = meta.get('next_token')
+                    self.store.set_state('sync_token', token)
+                    if not token:
+                        break
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"同步时间线失败: {e}")
+                return {'success': False, 'added': added, 'pages': pages, 'error': str(e)}
+
+            if token:
+                logger.info(f"新推文超过 {self.max_pages} 页，下次同步继续翻页")
+            else:
+                if pending_newest:
+                    self.store.set_state('since_id', pending_newest)
+                self.store.set_state('sync_newest', None)
+            self.store.set_state('last_sync_at', str(time.time()))
+            if added:
+                logger.info(f"时间线同步完成，新增或更新 {added} 条推文")
+            return {'success': True, 'added': added, 'pages': pages, 'complete': not token}
+
+    def backfill(self, twitter_client, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """
+        回填历史推文（从本地最早的推文往前翻页，翻页位置持久化，可分多次完成）
+
+        Args:
+            twitter_client: Twitter 客户端
+            max_pages: 本次最多请求的页数，默认为 backfill_pages_per_run
+
+        Returns:
+            回填结果字典（done 表示已到达时间线的最早位置）
+        """
+        max_pages = self.backfill_pages if max_pages is None else max_pages
+        with self._lock:
+            if self.store.get_state('backfill_done') == '1':
+                return {'success': True, 'added': 0, 'pages': 0, 'done': True}
+            self.stats['backfill_runs'] += 1
+            token = self.store.get_state('backfill_token')
+            until_id = self.store.get_state('backfill_until_id')
+            if not token and not until_id:
+                oldest = self.store.oldest_id()
+                until_id = str(oldest) if oldest else None
+                self.store.set_state('backfill_until_id', until_id)
+
+            added = 0
+            pages = 0
+            done = False
+            try:
+                while pages < max_pages:
+                    kwargs = {'until_id': until_id} if until_id else {}
+                    if token:
+                        kwargs['pagination_token'] = token
+                    records, meta = self._fetch_page(twitter_client, **kwargs)
+                    pages += 1
+                    added += self.store.upsert(records)
+                    token = meta.get('next_token')
+                    self.store.set_state('backfill_token', token)
+                    if not token:
+                        done = True
+                        break
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"回填历史推文失败: {e}")
+                return {'success': False, 'added': added, 'pages': pages, 'done': False, 'error': str(e)}
+
+            if done:
+                self.store.set_state('backfill_done', '1')
+                logger.info(f"历史推文回填完成，本地共 {self.store.count()} 条推文")
+            elif added:
+                logger.info(f"回填了 {added} 条历史推文，下次继续")
+            return {'success': True, 'added': added, 'pages': pages, 'done': done}
+
+    def reset_backfill(self):
+        """重新开始回填"""
+        with self._lock:
+            for key in ('backfill_done', 'backfill_token', 'backfill_until_id'):
+                self.store.set_state(key, None)
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取同步状态和统计"""
+        last_sync = self.store.get_state('last_sync_at')
+        return {
+            'tweets': self.store.count(),
+            'since_id': self.store.get_state('since_id'),
+            'last_sync_at': (datetime.fromtimestamp(float(last_sync), pytz.utc).isoformat()
+                             if last_sync else None),
+            'backfill_done': self.store.get_state('backfill_done') == '1',
+            **self.stats
+        }
+
+
+# 全局本地推文存储实例
+tweet_store = TweetStore()
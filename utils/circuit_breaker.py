@@ -0,0 +1,209 @@
+"""
+熔断器模块
+为 Twitter、OpenAI 和 OAuth 令牌端点分别维护熔断器（关闭 / 打开 / 半开），
+上游连续失败达到阈值后熔断，熔断期间的调用立即失败，不再等待完整的超时时间
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Any
+from utils.config_loader import config_loader
+from utils.logger import logger
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} 熔断中，{retry_after:.0f} 秒后重试")
+
+
+class CircuitBreaker:
+    """熔断器类"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30,
+                 half_open_max_calls: int = 1, success_threshold: int = 1):
+        """
+        初始化熔断器
+
+        Args:
+            name: 上游名称
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后多少秒进入半开状态，允许试探请求
+            half_open_max_calls: 半开状态下同时允许的试探请求数
+            success_threshold: 半开状态下连续成功多少次后恢复
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.success_threshold = success_threshold
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._consecutive_failures = 0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+        self._last_error = None
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        """当前状态（打开状态超过恢复时间后视为半开）"""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        """当前状态（调用方需持有锁）"""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+            logger.info(f"熔断器 {self.name} 进入半开状态，允许试探请求")
+        return self._state
+
+    def before_call(self):
+        """
+        调用上游前检查是否允许请求
+
+        Raises:
+            CircuitOpenError: 熔断器打开，或半开状态下试探请求已满
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                self._stats['rejected'] += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            if state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._half_open_calls += 1
+            self._stats['calls'] += 1
+
+    def record_success(self):
+        """记录一次成功调用"""
+        with self._lock:
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                self._half_open_calls = max(self._half_open_calls - 1, 0)
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.success_threshold:
+                    self._state = self.CLOSED
+                    self._opened_at = None
+                    logger.info(f"熔断器 {self.name} 已恢复（关闭）")
+
+    def release(self):
+        """调用因自身原因（如截止时间已到）结束，不计入成功或失败，只释放半开状态的试探名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._half_open_calls = max(self._half_open_calls - 1, 0)
+
+    def record_failure(self, error: Optional[Any] = None):
+        """
+        记录一次失败调用（只应记录上游故障：网络错误、超时、5xx）
+
+        Args:
+            error: 错误信息
+        """
+        with self._lock:
+            self._stats['failures'] += 1
+            self._consecutive_failures += 1
+            self._last_error = str(error) if error is not None else None
+            if self._state == self.HALF_OPEN or (
+                    self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._open()
+
+    def _open(self):
+        """打开熔断器（调用方需持有锁）"""
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+        self._stats['opened'] += 1
+        logger.warning(f"熔断器 {self.name} 已打开（连续失败 {self._consecutive_failures} 次），"
+                       f"{self.recovery_timeout} 秒内的调用将直接失败: {self._last_error}")
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态
+
+        Returns:
+            状态字典
+        """
+        with self._lock:
+            state = self._current_state()
+            retry_after = None
+            if state == self.OPEN:
+                retry_after = round(max(self.recovery_timeout - (time.monotonic() - self._opened_at), 0), 1)
+            return {
+                'state': state,
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout': self.recovery_timeout,
+                'retry_after_seconds': retry_after,
+                'last_error': self._last_error,
+                **self._stats
+            }
+
+
+class CircuitBreakerRegistry:
+    """熔断器注册表类 - 每个上游一个熔断器"""
+
+    # 预先创建的上游熔断器（状态接口中始终显示）
+    UPSTREAMS = ('twitter', 'openai', 'oauth_token')
+
+    def __init__(self, breaker_config: Optional[dict] = None):
+        """
+        初始化熔断器注册表
+
+        Args:
+            breaker_config: 熔断器配置，default 为默认参数，其余键按上游名称覆盖
+        """
+        if breaker_config is None:
+            breaker_config = config_loader.get_circuit_breaker_config() or {}
+        self.breaker_config = breaker_config
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        for name in self.UPSTREAMS:
+            self.get(name)
+
+    def get(self, name: str) -> CircuitBreaker:
+        """
+        获取指定上游的熔断器（首次使用时创建）
+
+        Args:
+            name: 上游名称（twitter / openai / oauth_token）
+        """
+        breaker = self._breakers.get(name)
+        if breaker is not None:
+            return breaker
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                options = dict(self.breaker_config.get('default') or {})
+                options.update(self.breaker_config.get(name) or {})
+                breaker = CircuitBreaker(name, **options)
+                self._breakers[name] = breaker
+        return breaker
+
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有熔断器状态
+
+        Returns:
+            {上游名称: 状态字典}
+        """
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.get_status() for breaker in breakers}
+
+
+# 全局熔断器注册表实例
+circuit_breakers = CircuitBreakerRegistry()
@@ -68,6 +68,16 @@ class ConfigLoader:
         config = self.get_config()
         return config.get('proxy', {})
     
+    def get_transport_config(self) -> Dict[str, Any]:
+        """获取 HTTP 传输层配置"""
+        config = self.get_config()
+        return config.get('transport', {})
+    
+    def get_circuit_breaker_config(self) -> Dict[str, Any]:
+        """获取熔断器配置"""
+        config = self.get_config()
+        return config.get('circuit_breakers', {})
+    
     def get_scheduler_config(self) -> Dict[str, Any]:
         """获取调度器配置"""
         config = self.get_config()
@@ -0,0 +1,176 @@
+"""
+截止时间模块
+为一次发推请求（手动发推接口或定时任务）建立统一的截止时间，通过 contextvars 向下传递，
+令牌刷新、LLM 生成和发送推文的每一跳都只使用剩余的时间预算，超时时报告超时的阶段
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Callable, Any
+
+
+class DeadlineExceeded(Exception):
+    """超出截止时间"""
+
+    def __init__(self, phase: str, timeout: Optional[float] = None):
+        self.phase = phase
+        self.timeout = timeout
+        if timeout is None:
+            super().__init__(f"阶段 {phase} 超出截止时间")
+        else:
+            super().__init__(f"阶段 {phase} 超时 ({timeout:.1f} 秒)")
+
+
+class Deadline:
+    """截止时间类（基于单调时钟）"""
+
+    def __init__(self, seconds: float, cancel_event: Optional[threading.Event] = None):
+        """
+        初始化截止时间
+
+        Args:
+            seconds: 从现在开始的时间预算（秒）
+            cancel_event: 取消事件（看门狗取消任务时设置），设置后视为已过期
+        """
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.cancel_event = cancel_event
+
+    @classmethod
+    def until(cls, expires_at: float, cancel_event: Optional[threading.Event] = None) -> 'Deadline':
+        """根据单调时钟的到期时间创建截止时间"""
+        deadline = cls(0, cancel_event)
+        deadline.expires_at = expires_at
+        deadline.budget = max(expires_at - time.monotonic(), 0.0)
+        return deadline
+
+    def remaining(self) -> float:
+        """获取剩余时间（秒），已过期或已取消时为负数"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return -1.0
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        """是否已过期"""
+        return self.remaining() <= 0
+
+    def timeout(self, phase: str, cap: Optional[float] = None) -> float:
+        """
+        获取某一跳可用的超时时间
+
+        Args:
+            phase: 阶段名称（过期时用于报告）
+            cap: 该跳自身的超时上限
+
+        Returns:
+            min(剩余时间, cap)
+
+        Raises:
+            DeadlineExceeded: 已没有剩余时间
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(phase, self.budget)
+        return remaining if cap is None else min(remaining, cap)
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar('deadline', default=None)
+_current_phase: ContextVar[Optional[str]] = ContextVar('deadline_phase', default=None)
+
+
+def get_deadline() -> Optional[Deadline]:
+    """获取当前上下文的截止时间，没有时返回 None"""
+    return _current_deadline.get()
+
+
+def current_phase(default: str = 'request') -> str:
+    """获取当前阶段名称"""
+    return _current_phase.get() or default
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """
+    在当前上下文中设置截止时间（外层截止时间更早时保留外层截止时间）
+
+    Args:
+        deadline: 截止时间，为 None 时不做修改
+    """
+    outer = _current_deadline.get()
+    if deadline is None or (outer is not None and outer.expires_at <= deadline.expires_at):
+        yield outer
+        return
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+@contextmanager
+def phase_scope(phase: str):
+    """
+    进入一个阶段（进入前检查截止时间，超时报告为该阶段）
+
+    Args:
+        phase: 阶段名称
+
+    Raises:
+        DeadlineExceeded: 进入阶段时已没有剩余时间
+    """
+    check_deadline(phase)
+    token = _current_phase.set(phase)
+    try:
+        yield
+    finally:
+        _current_phase.reset(token)
+
+
+def remaining_timeout(phase: str, cap: Optional[float] = None) -> Optional[float]:
+    """
+    获取某一跳可用的超时时间
+
+    Args:
+        phase: 阶段名称
+        cap: 该跳自身的超时上限
+
+    Returns:
+        没有截止时间时返回 cap，否则返回 min(剩余时间, cap)
+
+    Raises:
+        DeadlineExceeded: 已没有剩余时间
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout(phase, cap)
+
+
+def check_deadline(phase: Optional[str] = None):
+    """
+    检查截止时间是否已过
+
+    Args:
+        phase: 阶段名称，默认为当前阶段
+
+    Raises:
+        DeadlineExceeded: 已超出截止时间
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(phase or current_phase(), deadline.budget)
+
+
+def run_with_deadline(deadline: Optional[Deadline], phase: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在指定截止时间和阶段下执行函数（用于在线程池中执行时传递截止时间）
+
+    Args:
+        deadline: 截止时间
+        phase: 阶段名称
+        func: 要执行的函数
+    """
+    with deadline_scope(deadline), phase_scope(phase):
+        return func(*args, **kwargs)
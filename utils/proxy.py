@@ -1,111 +1,320 @@
 """
 代理管理模块
 提供 SOCKS5 代理配置和管理功能
+支持配置多个上游代理组成代理池：后台健康检查，按 EWMA 延迟和错误率加权选择，
+连续失败的代理会被自动摘除，恢复后重新加入
 """
 
+import random
+import threading
+import time
 import requests
-from typing import Dict, Optional
+from typing import Dict, Optional, List
+from urllib.parse import urlparse
 from utils.config_loader import config_loader
 from utils.logger import logger
 
 
+def mask_proxy_url(url: str) -> str:
+    """隐藏代理地址中的密码"""
+    parsed = urlparse(url)
+    if parsed.password:
+        return url.replace(f":{parsed.password}@", ":***@", 1)
+    return url
+
+
+class ProxyEndpoint:
+    """单个上游代理的健康状态"""
+
+    # 没有延迟样本时假设的延迟（秒）
+    DEFAULT_LATENCY = 1.0
+
+    def __init__(self, url: str, alpha: float):
+        self.url = url
+        self.alpha = alpha
+        self.ewma_latency = None
+        self.ewma_error_rate = 0.0
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.ejected = False
+        self.ejected_at = None
+        self.total_requests = 0
+        self.total_failures = 0
+        self.last_error = None
+        self.last_probe_at = None
+
+    def record(self, success: bool, latency: Optional[float] = None, error: Optional[str] = None):
+        """记录一次请求结果"""
+        self.total_requests += 1
+        self.ewma_error_rate = self.alpha * (0.0 if success else 1.0) + (1 - self.alpha) * self.ewma_error_rate
+        if success:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+            if latency is not None:
+                if self.ewma_latency is None:
+                    self.ewma_latency = latency
+                else:
+                    self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+        else:
+            self.total_failures += 1
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    def weight(self) -> float:
+        """选择权重: 延迟越低、错误率越低权重越大"""
+        latency = self.ewma_latency if self.ewma_latency is not None else self.DEFAULT_LATENCY
+        return max((1.0 - self.ewma_error_rate) ** 2, 0.01) / max(latency, 0.001)
+
+    def to_dict(self) -> dict:
+        """转换为状态字典"""
+        return {
+            'url': mask_proxy_url(self.url),
+            'ejected': self.ejected,
+            'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            'ewma_error_rate': round(self.ewma_error_rate, 4),
+            'consecutive_failures': self.consecutive_failures,
+            'total_requests': self.total_requests,
+            'total_failures': self.total_failures,
+            'weight': round(self.weight(), 4),
+            'last_error': self.last_error,
+            'last_probe_at': self.last_probe_at
+        }
+
+
 class ProxyManager:
     """代理管理器类"""
-    
+
     def __init__(self):
         """初始化代理管理器"""
         self.proxy_config = config_loader.get_proxy_config()
+        self.health_config = self.proxy_config.get('health_check') or {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._probe_thread = None
+        self.endpoints = self._setup_endpoints()
         self.proxies = self._setup_proxies()
-    
-    def _setup_proxies(self) -> Optional[Dict[str, str]]:
+
+    def _setup_endpoints(self) -> List[ProxyEndpoint]:
         """
-        设置代理配置
-        
+        根据配置创建代理池
+
         Returns:
-            代理配置字典，如果未启用代理则返回 None
+            代理列表，如果未启用代理则返回空列表
         """
         if not self.proxy_config.get('enabled', False):
             logger.info("代理未启用")
-            return None
-        
+            return []
+
+        urls = list(self.proxy_config.get('pool') or [])
         socks5_url = self.proxy_config.get('socks5_url')
-        if not socks5_url:
+        if socks5_url and socks5_url not in urls:
+            urls.insert(0, socks5_url)
+
+        if not urls:
             logger.warning("代理已启用但未配置 SOCKS5 URL")
+            return []
+
+        alpha = self.health_config.get('ewma_alpha', 0.3)
+        for url in urls:
+            logger.info(f"代理已配置: {mask_proxy_url(url)}")
+        return [ProxyEndpoint(url, alpha) for url in urls]
+
+    def _setup_proxies(self) -> Optional[Dict[str, str]]:
+        """
+        设置代理配置（代理池中的第一个代理，用于兼容只读取 proxies 属性的调用方）
+
+        Returns:
+            代理配置字典，如果未启用代理则返回 None
+        """
+        if not self.endpoints:
             return None
-        
+
         # 构建代理配置
-        proxies = {
-            'http': socks5_url,
-            'https': socks5_url
+        return self._to_proxies(self.endpoints[0].url)
+
+    @staticmethod
+    def _to_proxies(url: str) -> Dict[str, str]:
+        """构建 requests 使用的代理配置字典"""
+        return {
+            'http': url,
+            'https': url
         }
-        
-        logger.info(f"代理已配置: {socks5_url}")
-        return proxies
-    
+
+    def select_proxy(self) -> Optional[str]:
+        """
+        从代理池中选择一个代理（按权重随机选择，跳过已摘除的代理）
+
+        所有代理都被摘除时，选择最早被摘除的代理，避免完全无法请求
+
+        Returns:
+            代理 URL，如果未启用代理则返回 None
+        """
+        if not self.endpoints:
+            return None
+        if len(self.endpoints) == 1:
+            return self.endpoints[0].url
+
+        with self._lock:
+            healthy = [endpoint for endpoint in self.endpoints if not endpoint.ejected]
+            if not healthy:
+                return min(self.endpoints, key=lambda endpoint: endpoint.ejected_at or 0).url
+            weights = [endpoint.weight() for endpoint in healthy]
+            return random.choices(healthy, weights=weights, k=1)[0].url
+
+    def _find_endpoint(self, url: str) -> Optional[ProxyEndpoint]:
+        """根据 URL 查找代理"""
+        for endpoint in self.endpoints:
+            if endpoint.url == url:
+                return endpoint
+        return None
+
+    def report(self, url: Optional[str], success: bool, latency: Optional[float] = None,
+               error: Optional[str] = None):
+        """
+        上报一次通过代理的请求结果，用于更新延迟、错误率和摘除状态
+
+        Args:
+            url: 代理 URL
+            success: 请求是否成功（仅网络层面，HTTP 错误状态码不算代理失败）
+            latency: 请求耗时（秒）
+            error: 错误信息
+        """
+        if not url:
+            return
+        endpoint = self._find_endpoint(url)
+        if endpoint is None:
+            return
+
+        eject_after = self.health_config.get('eject_after_failures', 3)
+        readmit_after = self.health_config.get('readmit_after_successes', 2)
+        with self._lock:
+            endpoint.record(success, latency, error)
+            if not endpoint.ejected and endpoint.consecutive_failures >= eject_after:
+                endpoint.ejected = True
+                endpoint.ejected_at = time.time()
+                logger.warning(f"代理连续失败 {endpoint.consecutive_failures} 次，已摘除: {mask_proxy_url(url)}")
+            elif endpoint.ejected and endpoint.consecutive_successes >= readmit_after:
+                endpoint.ejected = False
+                endpoint.ejected_at = None
+                logger.info(f"代理已恢复，重新加入代理池: {mask_proxy_url(url)}")
+
     def get_proxies(self) -> Optional[Dict[str, str]]:
         """
-        获取代理配置
-        
+        获取代理配置（每次调用都会从代理池中重新选择）
+
         Returns:
             代理配置字典，如果未启用代理则返回 None
         """
-        return self.proxies
-    
-    def test_proxy(self) -> bool:
+        url = self.select_proxy()
+        return self._to_proxies(url) if url else None
+
+    def _probe(self, endpoint: ProxyEndpoint) -> bool:
         """
-        测试代理连接
-        
+        对单个代理做一次健康检查
+
         Returns:
             代理是否可用
         """
-        if not self.proxies:
-            logger.info("未配置代理，跳过代理测试")
-            return True
-        
+        from utils.transport import transport_manager
+
+        probe_url = self.health_config.get('url', 'https://httpbin.org/ip')
+        started = time.monotonic()
         try:
-            # 使用代理访问一个测试 URL
-            test_url = "https://httpbin.org/ip"
-            response = requests.get(
-                test_url,
-                proxies=self.proxies,
-                timeout=30  # 增加超时时间
+            # 使用共享连接池检查，检查成功的同时也保持了连接
+            response = transport_manager.get_session(endpoint.url).get(
+                probe_url,
+                timeout=self.health_config.get('timeout', 10)
             )
-            
-            if response.status_code == 200:
-                logger.info("代理连接测试成功")
-                logger.debug(f"代理 IP 信息: {response.json()}")
-                return True
-            else:
-                logger.error(f"代理连接测试失败，状态码: {response.status_code}")
-                return False
-                
+            ok = response.status_code < 500
+            error = None if ok else f"HTTP {response.status_code}"
         except requests.exceptions.RequestException as e:
-            logger.error(f"代理连接测试失败: {e}")
-            return False
-    
+            ok = False
+            error = str(e)
+
+        endpoint.last_probe_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.report(endpoint.url, ok, time.monotonic() - started if ok else None, error)
+        return ok
+
+    def _probe_loop(self):
+        """后台健康检查循环"""
+        interval = self.health_config.get('interval_seconds', 30)
+        while not self._stop_event.wait(interval):
+            for endpoint in self.endpoints:
+                if self._stop_event.is_set():
+                    return
+                self._probe(endpoint)
+
+    def start_health_checks(self):
+        """启动后台健康检查线程"""
+        if not self.endpoints or not self.health_config.get('enabled', True):
+            return
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._probe_thread = threading.Thread(target=self._probe_loop, name='proxy-health', daemon=True)
+        self._probe_thread.start()
+        logger.info(f"代理健康检查已启动，共 {len(self.endpoints)} 个代理")
+
+    def stop_health_checks(self):
+        """停止后台健康检查线程"""
+        self._stop_event.set()
+
+    def test_proxy(self) -> bool:
+        """
+        测试代理连接（检查代理池中的每个代理）
+
+        Returns:
+            是否至少有一个代理可用
+        """
+        if not self.endpoints:
+            logger.info("未配置代理，跳过代理测试")
+            return True
+
+        available = 0
+        for endpoint in self.endpoints:
+            if self._probe(endpoint):
+                available += 1
+                logger.info(f"代理连接测试成功: {mask_proxy_url(endpoint.url)}")
+            else:
+                logger.error(f"代理连接测试失败: {mask_proxy_url(endpoint.url)} ({endpoint.last_error})")
+
+        return available > 0
+
+    def get_status(self) -> dict:
+        """
+        获取代理池状态
+
+        Returns:
+            状态字典（包含每个代理的延迟、错误率和摘除状态）
+        """
+        with self._lock:
+            return {
+                'pool_size': len(self.endpoints),
+                'healthy': sum(1 for endpoint in self.endpoints if not endpoint.ejected),
+                'health_check_running': bool(self._probe_thread and self._probe_thread.is_alive()),
+                'proxies': [endpoint.to_dict() for endpoint in self.endpoints]
+            }
+
     def get_session(self) -> requests.Session:
         """
-        获取配置了代理的 requests 会话
-        
+        获取配置了代理的 requests 会话（从代理池中选择代理，返回传输层中共享的长连接会话）
+
         Returns:
             配置了代理的 requests.Session 对象
         """
-        session = requests.Session()
-        
-        if self.proxies:
-            session.proxies.update(self.proxies)
-            logger.debug("已为会话配置代理")
-        
-        return session
-    
+        from utils.transport import transport_manager
+
+        return transport_manager.get_session(self.select_proxy())
+
     def is_proxy_enabled(self) -> bool:
         """
         检查代理是否启用
-        
+
         Returns:
             代理是否启用
         """
-        return self.proxies is not None
+        return bool(self.endpoints)
 
 
 # 全局代理管理器实例
@@ -0,0 +1,225 @@
+"""
+HTTP 传输层模块
+统一管理所有上游请求使用的长连接池：每个代理对应一个 requests 会话和 httpx 客户端，
+会话内按上游主机维护 keep-alive 连接池，避免每次请求都重新建立 TCP、SOCKS 和 TLS 连接
+"""
+
+import threading
+import time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Optional, Tuple, Any
+from urllib.parse import urlparse
+from utils.config_loader import config_loader
+from utils.deadline import get_deadline, current_phase, DeadlineExceeded
+from utils.logger import logger
+
+
+class PooledSession(requests.Session):
+    """带默认超时的 requests 会话（requests 本身没有默认超时）"""
+
+    def __init__(self, timeouts: Dict[str, Tuple[float, float]], default_timeout: Tuple[float, float]):
+        """
+        初始化会话
+
+        Args:
+            timeouts: 按主机配置的 (连接超时, 读取超时)
+            default_timeout: 默认的 (连接超时, 读取超时)
+        """
+        super().__init__()
+        self.timeouts = timeouts
+        self.default_timeout = default_timeout
+
+    def request(self, method, url, *args, **kwargs):
+        """
+        发送请求，未指定超时时使用按主机配置的超时；
+        当前上下文有截止时间时，超时不超过剩余的时间预算
+        """
+        if kwargs.get('timeout') is None:
+            host = urlparse(url).hostname
+            kwargs['timeout'] = self.timeouts.get(host, self.default_timeout)
+
+        deadline = get_deadline()
+        if deadline is not None:
+            remaining = deadline.timeout(current_phase())
+            timeout = kwargs['timeout']
+            if isinstance(timeout, tuple):
+                kwargs['timeout'] = tuple(min(value, remaining) for value in timeout)
+            else:
+                kwargs['timeout'] = min(timeout, remaining)
+
+        try:
+            return super().request(method, url, *args, **kwargs)
+        except requests.exceptions.Timeout as e:
+            # 因截止时间缩短了超时，报告为超时的阶段
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded(current_phase(), deadline.budget) from e
+            raise
+
+
+class TransportManager:
+    """HTTP 传输层管理器类"""
+
+    def __init__(self, transport_config: Optional[dict] = None):
+        """
+        初始化传输层管理器
+
+        Args:
+            transport_config: 传输层配置，默认读取配置文件中的 transport 配置
+        """
+        if transport_config is None:
+            transport_config = config_loader.get_transport_config() or {}
+        self.transport_config = transport_config
+        # 按主机覆盖的配置，如 {'api.openai.com': {'pool_maxsize': 20, 'read_timeout': 120}}
+        self.host_config = transport_config.get('hosts') or {}
+        self._sessions: Dict[Optional[str], PooledSession] = {}
+        self._httpx_clients: Dict[Tuple[Optional[str], Optional[str]], httpx.Client] = {}
+        self._lock = threading.Lock()
+
+    def _get_option(self, key: str, default: Any, host: Optional[str] = None) -> Any:
+        """读取配置项（主机级配置优先）"""
+        if host and key in (self.host_config.get(host) or {}):
+            return self.host_config[host][key]
+        return self.transport_config.get(key, default)
+
+    def _get_timeout(self, host: Optional[str] = None) -> Tuple[float, float]:
+        """获取 (连接超时, 读取超时)"""
+        return (
+            self._get_option('connect_timeout', 10, host),
+            self._get_option('read_timeout', 60, host)
+        )
+
+    def _create_adapter(self, host: Optional[str] = None) -> HTTPAdapter:
+        """创建连接池适配器"""
+        return HTTPAdapter(
+            pool_connections=self._get_option('pool_connections', 10, host),
+            pool_maxsize=self._get_option('pool_maxsize', 10, host),
+            # 重试由各客户端自行处理，连接池不重试
+            max_retries=0
+        )
+
+    def _create_session(self, proxy_url: Optional[str]) -> PooledSession:
+        """创建通过指定代理访问的会话"""
+        session = PooledSession(
+            timeouts={host: self._get_timeout(host) for host in self.host_config},
+            default_timeout=self._get_timeout()
+        )
+        session.mount('http://', self._create_adapter())
+        session.mount('https://', self._create_adapter())
+        # 配置了单独参数的主机使用独立的连接池
+        for host in self.host_config:
+            session.mount(f'https://{host}/', self._create_adapter(host))
+        if proxy_url:
+            session.proxies.update({'http': proxy_url, 'https': proxy_url})
+        return session
+
+    def get_session(self, proxy_url: Optional[str] = None) -> requests.Session:
+        """
+        获取通过指定代理访问的共享会话（同一代理始终返回同一个会话）
+
+        Args:
+            proxy_url: 代理 URL，为 None 时直连
+
+        Returns:
+            requests.Session 对象
+        """
+        session = self._sessions.get(proxy_url)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(proxy_url)
+            if session is None:
+                session = self._create_session(proxy_url)
+                self._sessions[proxy_url] = session
+                logger.debug("已创建新的 HTTP 连接池会话")
+        return session
+
+    def get_httpx_client(self, proxy_url: Optional[str] = None, host: Optional[str] = None) -> httpx.Client:
+        """
+        获取通过指定代理访问的共享 httpx 客户端（供 OpenAI 客户端使用）
+
+        Args:
+            proxy_url: 代理 URL，为 None 时直连
+            host: 上游主机，用于读取主机级的连接池和超时配置
+
+        Returns:
+            httpx.Client 对象
+        """
+        key = (proxy_url, host)
+        client = self._httpx_clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._httpx_clients.get(key)
+            if client is None:
+                connect_timeout, read_timeout = self._get_timeout(host)
+                pool_maxsize = self._get_option('pool_maxsize', 10, host)
+                client = httpx.Client(
+                    proxy=proxy_url,
+                    limits=httpx.Limits(
+                        max_connections=pool_maxsize,
+                        max_keepalive_connections=pool_maxsize,
+                        keepalive_expiry=self._get_option('keepalive_expiry', 60, host)
+                    ),
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+                )
+                self._httpx_clients[key] = client
+        return client
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        从代理池中选择代理，通过共享会话发送请求，并上报代理的请求结果
+
+        Args:
+            method: HTTP 方法
+            url: 请求 URL
+            **kwargs: 传给 requests 的其他参数
+
+        Returns:
+            响应对象
+
+        Raises:
+            requests.exceptions.RequestException: 网络错误
+        """
+        from utils.proxy import proxy_manager
+
+        proxy_url = proxy_manager.select_proxy()
+        session = self.get_session(proxy_url)
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            proxy_manager.report(proxy_url, False, error=str(e))
+            raise
+        proxy_manager.report(proxy_url, True, time.monotonic() - started)
+        return response
+
+    def get_status(self) -> dict:
+        """
+        获取连接池状态
+
+        Returns:
+            状态字典
+        """
+        with self._lock:
+            return {
+                'requests_sessions': len(self._sessions),
+                'httpx_clients': len(self._httpx_clients),
+                'pool_maxsize': self.transport_config.get('pool_maxsize', 10),
+                'hosts': list(self.host_config)
+            }
+
+    def close(self):
+        """关闭所有连接池"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            for client in self._httpx_clients.values():
+                client.close()
+            self._sessions.clear()
+            self._httpx_clients.clear()
+
+
+# 全局传输层管理器实例
+transport_manager = TransportManager()
@@ -0,0 +1,455 @@
+"""
+推文长度计算模块
+按 Twitter 的加权规则计算推文长度（与 twitter-text v3 一致）：
+拉丁字母等常用字符计 1，中日韩文字等其他字符计 2，链接（含不带协议的域名）固定计 23，emoji 序列计 2；
+并提供按句子、字素（grapheme）边界截断推文或拆分为推文串（thread）的方法，不会拆开 emoji、代理对或链接
+"""
+
+import re
+import unicodedata
+from typing import Iterator, List, Tuple, Optional
+
+
+# 推文最大加权长度
+MAX_WEIGHTED_LENGTH = 280
+
+# 链接（经 t.co 转换后）的固定长度
+URL_LENGTH = 23
+
+# 计 1 的码点范围（闭区间），其余码点计 2
+_LIGHT_RANGES = (
+    (0x0000, 0x10FF),
+    (0x2000, 0x200D),
+    (0x2010, 0x201F),
+    (0x2032, 0x2037),
+)
+
+# emoji 码点范围（近似 Extended_Pictographic，一个 emoji 序列整体计 2）
+_EMOJI_RANGES = (
+    (0x00A9, 0x00A9),
+    (0x00AE, 0x00AE),
+    (0x203C, 0x203C),
+    (0x2049, 0x2049),
+    (0x2122, 0x2122),
+    (0x2139, 0x2139),
+    (0x2194, 0x21AA),
+    (0x231A, 0x23FF),
+    (0x24C2, 0x24C2),
+    (0x25AA, 0x25FE),
+    (0x2600, 0x27BF),
+    (0x2934, 0x2935),
+    (0x2B05, 0x2B55),
+    (0x3030, 0x3030),
+    (0x303D, 0x303D),
+    (0x3297, 0x3299),
+    (0x1F000, 0x1FAFF),
+)
+
+
+def _char_class(ranges, negate: bool = False) -> str:
+    """将码点区间表编译为正则字符类"""
+    body = ''.join(f'\\U{start:08X}-\\U{end:08X}' for start, end in ranges)
+    return f"[{'^' if negate else ''}{body}]"
+
+
+# 计 1 的码点：删除后剩下的码点数即计 2 的码点数（由正则引擎一次扫描完成）
+_LIGHT_RE = re.compile(_char_class(_LIGHT_RANGES))
+
+# emoji 序列：区旗（两个区旗字母）、keycap、带变体选择符 / 肤色修饰符 / 标签字符并以 ZWJ 连接的序列
+_EMOJI_BASE = _char_class(_EMOJI_RANGES)
+# 快速判断文本中是否可能有 emoji（绝大多数推文没有，可以跳过完整的序列匹配）
+_EMOJI_HINT_RE = re.compile(f'{_EMOJI_BASE}|\u20E3')
+_EMOJI_MODIFIER = '(?:\uFE0F|[\U0001F3FB-\U0001F3FF]|[\U000E0020-\U000E007F])'
+_EMOJI_RE = re.compile(
+    '[\U0001F1E6-\U0001F1FF]{2}'
+    '|[0-9#*]\uFE0F?\u20E3'
+    f'|{_EMOJI_BASE}{_EMOJI_MODIFIER}*(?:\u200D{_EMOJI_BASE}{_EMOJI_MODIFIER}*)*'
+)
+
+_ZWJ = 0x200D
+
+# 顶级域名（twitter-text 按 IANA 列表识别不带协议的域名；通用顶级域名只收录常见的，
+# 不在列表中的罕见顶级域名不会被识别为链接，按普通文本计算长度）
+_GENERIC_TLDS = (
+    'com net org edu gov mil int info biz name pro aero asia cat coop jobs mobi museum post tel travel xxx '
+    'academy agency app art audio bar best bid bike blog blue book build business buzz cafe camera camp capital '
+    'care careers cash center chat city click cloud club codes coffee college community company computer cool '
+    'dance data date deals design dev digital direct directory domains download earth education email energy '
+    'engineering enterprises equipment estate events exchange expert exposed express farm fashion finance fit '
+    'foundation free fun fund futbol gallery game games garden gift gifts global gold golf graphics green group '
+    'guide guru health help holdings host house inc industries ink institute international investments kim land '
+    'lat life lighting limited link live loan love ltd luxury management market marketing media men menu moe '
+    'money movie network news ninja one online ooo page partners party photo photography photos pics pink pizza '
+    'place plus press productions properties pub recipes red rehab rentals repair report rest review reviews rip '
+    'rocks run sale school science services shoes shop show site social software solar solutions space store '
+    'studio style support surf systems tattoo team tech technology tips today tools top town toys trade training '
+    'tube university uno vacations ventures video vip vision vote voyage watch webcam website wiki win wine work '
+    'works world xyz zone'
+).split()
+_COUNTRY_TLDS = (
+    'ac ad ae af ag ai al am ao aq ar as at au aw ax az ba bb bd be bf bg bh bi bj bm bn bo br bs bt bw by bz '
+    'ca cc cd cf cg ch ci ck cl cm cn co cr cu cv cw cx cy cz de dj dk dm do dz ec ee eg er es et eu fi fj fk fm '
+    'fo fr ga gd ge gf gg gh gi gl gm gn gp gq gr gs gt gu gw gy hk hm hn hr ht hu id ie il im in io iq ir is it '
+    'je jm jo jp ke kg kh ki km kn kp kr kw ky kz la lb lc li lk lr ls lt lu lv ly ma mc md me mg mh mk ml mm mn '
+    'mo mp mq mr ms mt mu mv mw mx my mz na nc ne nf ng ni nl no np nr nu nz om pa pe pf pg ph pk pl pm pn pr ps '
+    'pt pw py qa re ro rs ru rw sa sb sc sd se sg sh si sk sl sm sn so sr ss st su sv sx sy sz tc td tf tg th tj '
+    'tk tl tm tn to tr tt tv tw tz ua ug uk us uy uz va vc ve vg vi vn vu wf ws ye yt za zm zw'
+).split()
+# 不带路径时也算链接的国家顶级域名短域名（如 t.co）
+_SPECIAL_COUNTRY_TLDS = frozenset(('co', 'tv'))
+
+# 链接的结尾（结尾的标点不属于链接）
+_URL_TAIL = r'[^\s<>"]*[^\s<>"\.,;:!?。，；：！？、)\]）】」』]'
+_TLDS = '|'.join(sorted(set(_GENERIC_TLDS) | set(_COUNTRY_TLDS), key=len, reverse=True))
+
+# 链接：带协议的 URL、以 www. 开头的地址，以及不带协议的域名（与 twitter-text 一致：
+# 前面不能是字母数字、@、$、# 或 -_./，顶级域名后可带端口和路径）
+_URL_RE = re.compile(
+    r'(?:https?://|www\.)[^\s<>"]+[^\s<>"\.,;:!?。，；：！？、)\]）】」』]'
+    r'|(?<![A-Za-z0-9@＠$#＃\-_./])'
+    rf'(?P<domain>(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+(?P<tld>{_TLDS}))(?![a-z0-9@-])'
+    rf'(?P<path>(?::\d+)?(?:/{_URL_TAIL}|/)?)',
+    re.IGNORECASE
+)
+# 快速判断文本中是否可能有链接
+_URL_HINT_RE = re.compile(r'://|www\.|[a-z0-9]\.[a-z]{2}', re.IGNORECASE)
+
+# 句末标点（英文句点和问号、感叹号需后跟空白或位于结尾才算句末）
+_SENTENCE_ENDS = frozenset('。！？…\n')
+_LATIN_SENTENCE_ENDS = frozenset('.!?')
+
+# 分句（拆分推文串时，过长的句子优先在这些标点或空白处断开）
+_CLAUSE_ENDS = frozenset('，、；：,;:')
+
+
+def _code_point_weight(text: str) -> int:
+    """按码点计算权重（每个码点计 1 或 2）"""
+    if text.isascii():
+        return len(text)
+    return len(text) + len(_LIGHT_RE.sub('', text))
+
+
+def char_weight(char: str) -> int:
+    """
+    获取单个码点的权重
+
+    Args:
+        char: 单个字符
+
+    Returns:
+        1 或 2
+    """
+    return 1 if _LIGHT_RE.match(char) else 2
+
+
+def iter_graphemes(text: str) -> Iterator[str]:
+    """
+    按字素（用户看到的一个字符）切分文本
+
+    简化的 Unicode 字素规则：组合符号、变体选择符、肤色修饰符、keycap 和标签字符附加在前一个字符上，
+    ZWJ 连接前后两个字符，两个区旗字母组成一面旗帜，CRLF 不拆开
+
+    Args:
+        text: 文本
+
+    Yields:
+        字素
+    """
+    start = 0
+    previous = None
+    regional_count = 0
+    for index, char in enumerate(text):
+        code_point = ord(char)
+        if index > 0:
+            join = (
+                previous == _ZWJ
+                or _extends_cluster(code_point, char)
+                or (previous == 0x0D and code_point == 0x0A)
+                or (0x1F1E6 <= code_point <= 0x1F1FF and regional_count % 2 == 1)
+            )
+            if not join:
+                yield text[start:index]
+                start = index
+                regional_count = 0
+        if 0x1F1E6 <= code_point <= 0x1F1FF:
+            regional_count += 1
+        previous = code_point
+    if start < len(text):
+        yield text[start:]
+
+
+def _extends_cluster(code_point: int, char: str) -> bool:
+    """码点是否附加在前一个字素上（组合符号、变体选择符、肤色修饰符、keycap、标签字符）"""
+    if code_point in (_ZWJ, 0x20E3):
+        return True
+    if 0xFE00 <= code_point <= 0xFE0F or 0xE0100 <= code_point <= 0xE01EF:
+        return True
+    if 0x1F3FB <= code_point <= 0x1F3FF or 0xE0020 <= code_point <= 0xE007F:
+        return True
+    return code_point >= 0x300 and unicodedata.category(char) in ('Mn', 'Me', 'Mc')
+
+
+def _plain_weight(text: str) -> int:
+    """获取不含链接的文本的权重（emoji 序列整体计 2）"""
+    weight = _code_point_weight(text)
+    if text.isascii() or not _EMOJI_HINT_RE.search(text):
+        return weight
+    for match in _EMOJI_RE.finditer(text):
+        weight += 2 - _code_point_weight(match.group(0))
+    return weight
+
+
+def _may_contain_url(text: str) -> bool:
+    """快速判断文本中是否可能有链接"""
+    return _URL_HINT_RE.search(text) is not None
+
+
+def _iter_urls(text: str) -> Iterator[re.Match]:
+    """
+    查找文本中的链接
+
+    不带协议、只有一级标签且顶级域名为国家顶级域名的短域名（如 example.jp）没有路径时不算链接，
+    .co 和 .tv 除外（与 twitter-text 一致）
+
+    Args:
+        text: 文本
+
+    Yields:
+        链接的匹配对象
+    """
+    for match in _URL_RE.finditer(text):
+        domain = match.group('domain')
+        if (domain and not match.group('path') and domain.count('.') == 1
+                and match.group('tld').lower() in _COUNTRY_TLDS
+                and match.group('tld').lower() not in _SPECIAL_COUNTRY_TLDS):
+            continue
+        yield match
+
+
+def weighted_length(text: str) -> int:
+    """
+    按 Twitter 规则计算推文的加权长度（先做 NFC 规范化）
+
+    Args:
+        text: 推文内容
+
+    Returns:
+        加权长度
+    """
+    text = unicodedata.normalize('NFC', text)
+    if not _may_contain_url(text):
+        return _plain_weight(text)
+    total = 0
+    position = 0
+    for match in _iter_urls(text):
+        total += _plain_weight(text[position:match.start()]) + URL_LENGTH
+        position = match.end()
+    return total + _plain_weight(text[position:])
+
+
+def is_valid_length(text: str, max_length: int = MAX_WEIGHTED_LENGTH) -> bool:
+    """
+    推文长度是否在限制内
+
+    Args:
+        text: 推文内容
+        max_length: 最大加权长度
+    """
+    return weighted_length(text) <= max_length
+
+
+def segment(text: str) -> List[Tuple[str, int, Optional[str]]]:
+    """
+    将文本切分为不可再分的片段（链接和 emoji 序列整体为一段，其余每个字素一段）
+
+    Args:
+        text: 文本（已做 NFC 规范化）
+
+    Returns:
+        [(片段, 权重, 边界类型)]，边界类型为 'sentence'（句末）、'space'（空白）或 None
+    """
+    segments = []
+
+    def add_graphemes(part: str):
+        for grapheme in iter_graphemes(part):
+            if grapheme in _SENTENCE_ENDS:
+                kind = 'sentence'
+            elif grapheme.isspace():
+                kind = 'space'
+            else:
+                kind = None
+            segments.append((grapheme, _code_point_weight(grapheme), kind))
+
+    def add_plain(part: str):
+        position = 0
+        for match in _EMOJI_RE.finditer(part):
+            add_graphemes(part[position:match.start()])
+            segments.append((match.group(0), 2, None))
+            position = match.end()
+        add_graphemes(part[position:])
+
+    position = 0
+    for match in _iter_urls(text):
+        add_plain(text[position:match.start()])
+        segments.append((match.group(0), URL_LENGTH, None))
+        position = match.end()
+    add_plain(text[position:])
+
+    # 英文句末标点后跟空白或位于结尾时才算句末（避免把小数点、缩写当作句末）
+    for index, (part, weight, kind) in enumerate(segments):
+        if part in _LATIN_SENTENCE_ENDS:
+            following = segments[index + 1][0] if index + 1 < len(segments) else None
+            if following is None or following.isspace():
+                segments[index] = (part, weight, 'sentence')
+    return segments
+
+
+def truncate_tweet(text: str, max_length: int = MAX_WEIGHTED_LENGTH, ellipsis: str = '...',
+                   min_ratio: float = 0.5) -> str:
+    """
+    将推文截断到加权长度限制内
+
+    优先在句末截断（不加省略号），其次在空白处截断，最后在字素边界截断并加省略号；
+    截断位置保留的长度少于 min_ratio * max_length 时不采用该位置。不会拆开 emoji、代理对或链接
+
+    Args:
+        text: 推文内容
+        max_length: 最大加权长度
+        ellipsis: 非句末截断时追加的省略号
+        min_ratio: 句末或空白截断至少保留的长度比例
+
+    Returns:
+        截断后的推文（未超长时原样返回）
+    """
+    if weighted_length(text) <= max_length:
+        return text
+
+    text = unicodedata.normalize('NFC', text)
+    budget = max_length - weighted_length(ellipsis)
+    minimum = max_length * min_ratio
+    used = 0
+    sentence_cut = space_cut = hard_cut = 0
+    segments = segment(text)
+    for index, (part, weight, kind) in enumerate(segments):
+        if used + weight > max_length:
+            break
+        used += weight
+        if used <= budget:
+            hard_cut = index + 1
+        if kind == 'sentence' and used >= minimum:
+            sentence_cut = index + 1
+        elif kind == 'space' and used - weight >= minimum and used <= budget:
+            space_cut = index
+
+    if sentence_cut:
+        return ''.join(part for part, _, _ in segments[:sentence_cut]).rstrip()
+    cut = space_cut or hard_cut
+    return ''.join(part for part, _, _ in segments[:cut]).rstrip() + ellipsis
+
+
+def _pack_segments(segments: List[Tuple[str, int, Optional[str]]], budget: int) -> List[str]:
+    """
+    将片段按句子贪心地装入多条加权长度不超过 budget 的推文
+
+    一条推文能放下的整句不拆开；单句超过 budget 时在分句标点或空白处断开，仍然过长时在字素边界断开
+    """
+    # 按句末切分为句子
+    sentences = []
+    current = []
+    for item in segments:
+        current.append(item)
+        if item[2] == 'sentence':
+            sentences.append(current)
+            current = []
+    if current:
+        sentences.append(current)
+
+    parts = []
+    buffer = []
+    used = 0
+
+    def flush():
+        nonlocal buffer, used
+        text = ''.join(part for part, _, _ in buffer).strip()
+        if text:
+            parts.append(text)
+        buffer = []
+        used = 0
+
+    def add(items, weight):
+        nonlocal used
+        buffer.extend(items)
+        used += weight
+
+    for sentence in sentences:
+        weight = sum(item[1] for item in sentence)
+        if used + weight <= budget:
+            add(sentence, weight)
+            continue
+        flush()
+        if weight <= budget:
+            add(sentence, weight)
+            continue
+
+        # 单句过长：按分句标点和空白切分后继续装填
+        clauses = []
+        current = []
+        for item in sentence:
+            current.append(item)
+            if item[2] == 'space' or item[0] in _CLAUSE_ENDS:
+                clauses.append(current)
+                current = []
+        if current:
+            clauses.append(current)
+        for clause in clauses:
+            weight = sum(item[1] for item in clause)
+            if used + weight <= budget:
+                add(clause, weight)
+                continue
+            flush()
+            if weight <= budget:
+                add(clause, weight)
+                continue
+            for item in clause:
+                if used + item[1] > budget:
+                    flush()
+                add([item], item[1])
+    flush()
+    return parts
+
+
+def split_thread(text: str, max_length: int = MAX_WEIGHTED_LENGTH, numbering: bool = True,
+                 number_format: str = ' {index}/{total}') -> List[str]:
+    """
+    将长文本拆分为推文串（thread）
+
+    在句末拆分，每条推文都不超过加权长度限制（含编号）；单句超长时在分句标点、空白或字素边界拆分。
+    编号的宽度取决于总条数，按总条数重新拆分直到条数不再增加
+
+    Args:
+        text: 文本
+        max_length: 每条推文的最大加权长度
+        numbering: 是否在每条推文末尾添加编号（如 " 1/3"）
+        number_format: 编号格式，可使用 {index} 和 {total}
+
+    Returns:
+        推文列表，未超长时只有一条（不加编号），文本为空时为空列表
+    """
+    text = unicodedata.normalize('NFC', text).strip()
+    if not text:
+        return []
+    if weighted_length(text) <= max_length:
+        return [text]
+
+    segments = segment(text)
+    total = 2
+    while True:
+        reserve = weighted_length(number_format.format(index=total, total=total)) if numbering else 0
+        parts = _pack_segments(segments, max_length - reserve)
+        if not numbering or len(parts) <= total:
+            break
+        total = len(parts)
+
+    if numbering:
+        parts = [part + number_format.format(index=index + 1, total=len(parts)) for index, part in enumerate(parts)]
+    return parts